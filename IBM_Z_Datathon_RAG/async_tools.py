@@ -0,0 +1,189 @@
+"""
+async_tools.py
+
+Async versions of the three RAG tools (keyword search, semantic search, part reads)
+for code that runs many agent rollouts on one event loop.
+
+The tools are synchronous (BM25 over an mmap, FAISS, lxml), so each call runs on a
+bounded thread pool and the event loop stays free for other trajectories:
+  - at most max_workers calls run at once; further calls wait (cancellably) on the loop
+  - every call has a deadline; on timeout the caller gets a JSON error payload back
+  - cancelling the awaiting task cancels a call that has not started yet
+
+A worker thread cannot be interrupted, so a call that already started keeps its slot
+until it really finishes. The bound therefore holds even when callers time out.
+
+ProcessRAGTools runs keyword search and part reads in worker processes instead, so CPU-heavy
+calls of many rollouts use several cores. The BM25 and part indexes are memory-mapped files,
+so every worker maps the same pages and the corpus is held in memory once, not once per worker.
+"""
+
+import asyncio
+import json
+import multiprocessing
+import os
+import weakref
+from concurrent.futures import Executor, ProcessPoolExecutor, ThreadPoolExecutor
+from typing import Callable, Dict, Optional
+
+# importable both as IBM_Z_Datathon_RAG.async_tools (notebooks) and from inside the directory
+if __package__:
+    from .KeywordSearch import get_index, keyword_search
+    from .ReadDocumentPart import get_part_index, read_document_part
+else:
+    from KeywordSearch import get_index, keyword_search
+    from ReadDocumentPart import get_part_index, read_document_part
+
+
+class AsyncRAGTools:
+    def __init__(self, xml_file: str = "./normalized_enhanced.xml", max_workers: int = 8,
+                 timeout: Optional[float] = 30.0, chroma_path: str = "./eunomia_db"):
+        """
+        Args:
+            xml_file: Corpus XML behind keyword search and part reads
+            max_workers: Most tool calls running at the same time
+            timeout: Default per-call deadline in seconds, including time spent waiting for a worker (None = no deadline)
+            chroma_path: ChromaDB directory behind semantic search
+        """
+        self.xml_file = xml_file
+        self.max_workers = max_workers
+        self.timeout = timeout
+        self.chroma_path = chroma_path
+        self._pool = self._create_pool()
+        # one semaphore per event loop, created on first use inside it: an asyncio.Semaphore is bound to the loop
+        # it is first awaited on, and notebooks / training scripts call asyncio.run() once per step
+        self._slots: "weakref.WeakKeyDictionary" = weakref.WeakKeyDictionary()  # event loop -> asyncio.Semaphore
+        self.stats: Dict[str, int] = {"calls": 0, "errors": 0, "timeouts": 0, "cancelled": 0, "running": 0}
+
+    # ---------- tools ----------
+    async def keyword_search(self, query: str, n: int = 5, timeout: Optional[float] = None) -> str:
+        """BM25 keyword search (KeywordSearch.keyword_search) off the event loop"""
+        return await self.run(keyword_search, self.xml_file, query, n, timeout=timeout)
+
+    async def semantic_search(self, query: str, n: int = 5, timeout: Optional[float] = None) -> str:
+        """FAISS semantic search off the event loop (shared searcher, see semantic_search.get_searcher)"""
+        def semantic_search() -> str:
+            return self.searcher().search(query, n)
+        return await self.run(semantic_search, timeout=timeout)
+
+    async def read_document_part(self, part_id: str, timeout: Optional[float] = None) -> str:
+        """Read a document part by id (ReadDocumentPart.read_document_part) off the event loop"""
+        return await self.run(read_document_part, self.xml_file, part_id, timeout=timeout)
+
+    def searcher(self):
+        """The process-wide searcher behind semantic_search (imported lazily: it needs chromadb and faiss)"""
+        if __package__:
+            from .semantic_search import get_searcher
+        else:
+            from semantic_search import get_searcher
+        return get_searcher(chroma_path=self.chroma_path)
+
+    # ---------- execution ----------
+    def _create_pool(self) -> Executor:
+        return ThreadPoolExecutor(max_workers=self.max_workers, thread_name_prefix="rag-tool")
+
+    async def run(self, fn: Callable[..., str], *args, timeout: Optional[float] = None) -> str:
+        """
+        Run fn(*args) on the pool within the deadline.
+        Returns its result, or a JSON error payload if it raised or ran out of time.
+        """
+        timeout = self.timeout if timeout is None else timeout
+        name = getattr(fn, "__name__", "tool")
+        self.stats["calls"] += 1
+        try:
+            return await asyncio.wait_for(self._submit(fn, args), timeout)
+        except asyncio.TimeoutError:
+            self.stats["timeouts"] += 1
+            return json.dumps({"error": f"{name} timed out after {timeout}s"})
+        except asyncio.CancelledError:
+            self.stats["cancelled"] += 1
+            raise
+        except Exception as e:
+            self.stats["errors"] += 1
+            return json.dumps({"error": str(e)})
+
+    async def _submit(self, fn: Callable[..., str], args: tuple) -> str:
+        loop = asyncio.get_running_loop()
+        slots = self._slots.get(loop)
+        if slots is None:
+            slots = self._slots[loop] = asyncio.Semaphore(self.max_workers)
+        await slots.acquire()
+        try:
+            future = self._pool.submit(fn, *args)
+        except BaseException:
+            slots.release()
+            raise
+        self.stats["running"] += 1
+        future.add_done_callback(lambda _: self._done(loop, slots))
+        return await asyncio.wrap_future(future)
+
+    def _done(self, loop: asyncio.AbstractEventLoop, slots: asyncio.Semaphore):
+        # worker thread: hand the slot back on the loop, unless the loop was closed while the call ran
+        if not loop.is_closed():
+            try:
+                loop.call_soon_threadsafe(self._release, slots)
+                return
+            except RuntimeError:  # closed in the meantime
+                pass
+        self.stats["running"] -= 1  # the loop and its semaphore are gone, there is nothing to release
+
+    def _release(self, slots: asyncio.Semaphore):
+        # called on the loop once the worker is really done (finished, failed or cancelled before starting)
+        self.stats["running"] -= 1
+        slots.release()
+
+    def close(self):
+        """Stop accepting calls; calls already running finish in the background"""
+        self._pool.shutdown(wait=False, cancel_futures=True)
+
+
+# ---------- process pool ----------
+def open_indexes(xml_file: str):
+    """
+    Open (building on first use) the memory-mapped BM25 and part indexes of xml_file in this process.
+    Used as the worker initializer, so the first tool call of a worker does not pay for it.
+    """
+    try:
+        get_index(xml_file)
+        get_part_index(xml_file)
+    except Exception as e:
+        print(f"[WARNING] Could not open indexes for {xml_file}: {e}")
+
+
+class ProcessRAGTools(AsyncRAGTools):
+    """
+    AsyncRAGTools with keyword search and part reads running in worker processes.
+
+    Semantic search stays in this process, on a small thread pool. Its searcher holds the embedding
+    model and an in-memory FAISS index, so one copy is shared instead of one per worker process.
+    """
+
+    def __init__(self, xml_file: str = "./normalized_enhanced.xml", max_workers: Optional[int] = None,
+                 timeout: Optional[float] = 30.0, chroma_path: str = "./eunomia_db",
+                 semantic_workers: int = 4, mp_context: str = "spawn"):
+        """
+        Args:
+            xml_file: Corpus XML behind keyword search and part reads
+            max_workers: Worker processes (default: one per core)
+            timeout: Default per-call deadline in seconds (None = no deadline)
+            chroma_path: ChromaDB directory behind semantic search
+            semantic_workers: Threads serving semantic search in this process
+            mp_context: Start method of the workers; "spawn" is safe next to threads, torch and notebooks
+        """
+        self.mp_context = mp_context
+        # build missing index files here, once, rather than in every worker at the same time
+        open_indexes(xml_file)
+        super().__init__(xml_file, max_workers or os.cpu_count() or 1, timeout, chroma_path)
+        self.semantic_tools = AsyncRAGTools(xml_file, semantic_workers, timeout, chroma_path)
+
+    def _create_pool(self) -> Executor:
+        return ProcessPoolExecutor(max_workers=self.max_workers, mp_context=multiprocessing.get_context(self.mp_context),
+                                   initializer=open_indexes, initargs=(self.xml_file,))
+
+    async def semantic_search(self, query: str, n: int = 5, timeout: Optional[float] = None) -> str:
+        """FAISS semantic search on a thread of this process (see class docstring)"""
+        return await self.semantic_tools.semantic_search(query, n, timeout=timeout)
+
+    def close(self):
+        super().close()
+        self.semantic_tools.close()
@@ -0,0 +1,142 @@
+import asyncio
+import json
+import os
+import threading
+import time
+
+from async_tools import AsyncRAGTools, ProcessRAGTools
+from KeywordSearch import keyword_search
+from ReadDocumentPart import read_document_part
+
+SAMPLE_XML = """<?xml version='1.0' encoding='utf-8'?>
+<Corpus>
+  <section id="A:facts">
+    <p id="A:facts:p1">The defendant was charged with assault and battery.</p>
+    <p id="A:facts:p2">The court adjourned the hearing without notice to the parties.</p>
+  </section>
+</Corpus>
+"""
+
+
+def write_sample(tmp_path) -> str:
+    path = tmp_path / "sample.xml"
+    path.write_text(SAMPLE_XML, encoding="utf-8")
+    return str(path)
+
+
+def test_async_tools_match_sync_tools(tmp_path):
+    xml = write_sample(tmp_path)
+    tools = AsyncRAGTools(xml_file=xml, max_workers=4)
+
+    async def main():
+        return await asyncio.gather(tools.keyword_search("assault", 2), tools.read_document_part("A:facts:p2"))
+
+    found, part = asyncio.run(main())
+    assert found == keyword_search(xml, "assault", 2)
+    assert part == read_document_part(xml, "A:facts:p2")
+    tools.close()
+
+
+def test_bounded_concurrency_timeout_and_cancellation():
+    tools = AsyncRAGTools(max_workers=2, timeout=5)
+    running, peak, release = [0], [0], threading.Event()
+    lock = threading.Lock()
+
+    def slow(tag: str) -> str:
+        with lock:
+            running[0] += 1
+            peak[0] = max(peak[0], running[0])
+        release.wait(5)
+        with lock:
+            running[0] -= 1
+        return tag
+
+    async def main():
+        calls = [asyncio.ensure_future(tools.run(slow, str(i))) for i in range(5)]
+        timed_out = await tools.run(slow, "late", timeout=0.2)  # waits behind the others, then gives up
+        await asyncio.sleep(0.1)
+        calls[4].cancel()  # still queued: never starts
+        release.set()
+        results = await asyncio.gather(*calls, return_exceptions=True)
+        return timed_out, results
+
+    started = time.monotonic()
+    timed_out, results = asyncio.run(main())
+    assert time.monotonic() - started < 5
+    assert "timed out" in json.loads(timed_out)["error"]
+    assert results[:4] == ["0", "1", "2", "3"]
+    assert isinstance(results[4], asyncio.CancelledError)
+    assert peak[0] <= 2
+    assert tools.stats["timeouts"] == 1 and tools.stats["cancelled"] == 1 and tools.stats["running"] == 0
+    tools.close()
+
+
+def worker_pid() -> str:
+    return str(os.getpid())
+
+
+def test_process_tools_match_sync_tools(tmp_path):
+    xml = write_sample(tmp_path)
+    tools = ProcessRAGTools(xml_file=xml, max_workers=2)
+    assert os.path.isdir(xml + ".bm25")  # index built once up front, workers only map it
+
+    async def main():
+        return await asyncio.gather(tools.keyword_search("hearing", 2), tools.read_document_part("A:facts:p1"),
+                                    tools.read_document_part("missing"), tools.run(worker_pid))
+
+    found, part, missing, pid = asyncio.run(main())
+    assert found == keyword_search(xml, "hearing", 2)
+    assert part == read_document_part(xml, "A:facts:p1")
+    assert "error" in json.loads(missing)
+    assert pid != str(os.getpid())
+    tools.close()
+
+
+def test_tool_errors_become_payloads(tmp_path):
+    tools = AsyncRAGTools(xml_file=str(tmp_path / "missing.xml"))
+    result = asyncio.run(tools.read_document_part("A:facts:p1"))
+    assert "error" in json.loads(result)
+    tools.close()
+
+
+
+def test_tools_work_across_event_loops():
+    tools = AsyncRAGTools(max_workers=1, timeout=5)
+
+    async def main():  # more calls than slots, so each run waits on its loop's semaphore
+        return await asyncio.gather(*(tools.run(str, i) for i in range(3)))
+
+    for _ in range(3):  # e.g. one asyncio.run() per training step
+        assert asyncio.run(main()) == ["0", "1", "2"]
+    assert tools.stats["running"] == 0
+    tools.close()
+
+
+def test_call_finishing_after_its_loop_closed(caplog):
+    tools = AsyncRAGTools(max_workers=1, timeout=0.1)
+    release = threading.Event()
+    finished = threading.Event()
+
+    def slow() -> str:
+        release.wait(5)
+        return "late"
+
+    timed_out = asyncio.run(tools.run(slow))  # the loop closes while slow() still runs
+    assert "timed out" in json.loads(timed_out)["error"]
+    tools._pool.submit(finished.set)  # queued behind slow(): runs once its callbacks are done
+    release.set()
+    assert finished.wait(5)
+    assert tools.stats["running"] == 0
+    assert "exception calling callback" not in caplog.text
+    tools.close()
+
+
+if __name__ == "__main__":
+    import pathlib, tempfile
+    with tempfile.TemporaryDirectory() as d:
+        test_async_tools_match_sync_tools(pathlib.Path(d))
+        test_bounded_concurrency_timeout_and_cancellation()
+        test_process_tools_match_sync_tools(pathlib.Path(d))
+        test_tool_errors_become_payloads(pathlib.Path(d))
+        test_tools_work_across_event_loops()
+    print("ok")
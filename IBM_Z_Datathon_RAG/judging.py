@@ -0,0 +1,158 @@
+"""
+judging.py
+
+LLM-judge scoring of trajectory groups for the RL loop (relative, RULER-style: the judge sees
+every response of a group and returns one score per response).
+
+GroupJudge scores groups concurrently, with a bound on requests in flight and retries with
+exponential backoff. Pass judge.score_group as after_each to art.gather_trajectory_groups: each
+group is then judged as soon as its own rollouts finish, while the other groups are still rolling out:
+
+    judge = GroupJudge()
+    judged_groups = await art.gather_trajectory_groups(groups, after_each=judge.score_group)
+
+The judge is any OpenAI-compatible chat completions endpoint (OpenRouter by default; a
+mock_servers.MockJudgeServer for offline runs and tests).
+"""
+
+import asyncio
+import json
+import os
+import random
+import re
+import weakref
+from typing import Callable, Dict, List, Optional
+
+DEFAULT_JUDGE_BASE_URL = "https://openrouter.ai/api/v1"
+DEFAULT_JUDGE_MODEL = "google/gemini-2.5-flash"
+RESPONSE_CHARS = 500  # per response in the prompt, to stay within API limits
+
+SCORES = re.compile(r"\[[\d\.,\s]+\]")
+
+
+def final_response(trajectory) -> str:
+    """Content of the last message of a trajectory (its answer, or the final tool result)"""
+    messages = trajectory.messages()
+    return str(messages[-1].get("content") or "") if messages else ""
+
+
+def build_judge_prompt(responses: List[str]) -> str:
+    comparison_text = "\n\n".join(
+        f"**Response {i + 1}:**\n{resp[:RESPONSE_CHARS]}" for i, resp in enumerate(responses)
+    )
+    return f"""Compare these {len(responses)} legal research responses and rank them.
+
+Criteria:
+1. Correctness and accuracy (most important)
+2. Proper citation of sources with part_ids
+3. Completeness of answer
+
+Responses:
+{comparison_text}
+
+Return ONLY a JSON array of scores from 0.0 to 2.0, one score per response in order.
+Higher scores = better responses.
+Example: [2.0, 0.5, 1.5]
+
+Your scores:"""
+
+
+def parse_scores(text: str, n: int) -> List[float]:
+    """The judge's JSON array of scores; ValueError unless it has exactly n numbers"""
+    match = SCORES.search(text)
+    scores = json.loads(match.group() if match else text.strip())
+    if not isinstance(scores, list) or len(scores) != n:
+        raise ValueError(f"Judge returned {scores!r}, expected {n} scores")
+    return [float(s) for s in scores]
+
+
+class GroupJudge:
+    def __init__(self, model: str = DEFAULT_JUDGE_MODEL, base_url: Optional[str] = None,
+                 api_key: Optional[str] = None, max_concurrency: int = 4, max_retries: int = 3,
+                 backoff: float = 1.0, timeout: float = 60.0, max_tokens: int = 100,
+                 fallback: Optional[Callable] = None):
+        """
+        Args:
+            model: Judge model name at the endpoint
+            base_url: OpenAI-compatible endpoint (default: $JUDGE_BASE_URL, else OpenRouter)
+            api_key: Endpoint key (default: $JUDGE_API_KEY, else $OPENROUTER_API_KEY)
+            max_concurrency: Most judge requests in flight at once
+            max_retries: Retries per group after the first attempt (errors, timeouts, unparsable scores)
+            backoff: Base delay in seconds; attempt k waits backoff * 2**k plus jitter
+            timeout: Per-request timeout in seconds
+            max_tokens: Completion budget of the judge
+            fallback: Called with the group when every attempt failed, to set rewards some other way
+                      (default: every reward 0.0, i.e. no learning signal from the group)
+        """
+        from openai import AsyncOpenAI
+
+        self.model = model
+        self.base_url = base_url or os.environ.get("JUDGE_BASE_URL", DEFAULT_JUDGE_BASE_URL)
+        self.max_retries = max_retries
+        self.backoff = backoff
+        self.max_tokens = max_tokens
+        self.fallback = fallback
+        self.client = AsyncOpenAI(
+            base_url=self.base_url,
+            api_key=api_key or os.environ.get("JUDGE_API_KEY") or os.environ.get("OPENROUTER_API_KEY", "none"),
+            timeout=timeout,
+            max_retries=0,  # retries (and their backoff) are handled here
+        )
+        self.max_concurrency = max_concurrency
+        self._slots: "weakref.WeakKeyDictionary" = weakref.WeakKeyDictionary()  # event loop -> asyncio.Semaphore
+        self.stats: Dict[str, int] = {"groups": 0, "requests": 0, "retries": 0, "failed": 0, "in_flight": 0}
+
+    async def judge(self, responses: List[str]) -> List[float]:
+        """One judge request: a score per response"""
+        loop = asyncio.get_running_loop()
+        slots = self._slots.get(loop)
+        if slots is None:  # a semaphore is bound to the loop it is first used in
+            slots = self._slots[loop] = asyncio.Semaphore(self.max_concurrency)
+        async with slots:
+            self.stats["requests"] += 1
+            self.stats["in_flight"] += 1
+            try:
+                response = await self.client.chat.completions.create(
+                    model=self.model,
+                    messages=[{"role": "user", "content": build_judge_prompt(responses)}],
+                    max_tokens=self.max_tokens,
+                )
+            finally:
+                self.stats["in_flight"] -= 1
+        return parse_scores(response.choices[0].message.content or "", len(responses))
+
+    async def score_group(self, group):
+        """Set trajectory.reward for every trajectory of the group from the judge; returns the group"""
+        trajectories = group.trajectories
+        self.stats["groups"] += 1
+        if len(trajectories) <= 1:  # nothing to compare against
+            for traj in trajectories:
+                traj.reward = 0.0
+            return group
+
+        responses = [final_response(traj) for traj in trajectories]
+        for attempt in range(self.max_retries + 1):
+            try:
+                scores = await self.judge(responses)
+                break
+            except Exception as e:
+                if attempt == self.max_retries:
+                    print(f"  Error in judge (giving up after {attempt + 1} attempts): {e}")
+                    self.stats["failed"] += 1
+                    if self.fallback is not None:
+                        self.fallback(group)
+                    else:
+                        for traj in trajectories:
+                            traj.reward = 0.0
+                    return group
+                self.stats["retries"] += 1
+                await asyncio.sleep(self.backoff * 2 ** attempt + random.uniform(0, self.backoff))
+
+        for traj, score in zip(trajectories, scores):
+            traj.reward = score
+        print(f"  Scores: {scores}")
+        return group
+
+    async def score_groups(self, groups: List) -> List:
+        """Judge already finished groups concurrently (bounded by max_concurrency); keeps their order"""
+        return list(await asyncio.gather(*(self.score_group(g) for g in groups)))
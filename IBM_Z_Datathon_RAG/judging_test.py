@@ -0,0 +1,105 @@
+import asyncio
+import time
+
+import pytest
+
+pytest.importorskip("openai")
+from judging import GroupJudge, build_judge_prompt, parse_scores
+from mock_servers import MockJudgeServer
+
+CITED = "answer='Assault charge' source_ids=['A:facts:p1']"
+UNCITED = "The defendant was charged."
+IDK = "I don't know anything about this legal question."
+
+
+class Trajectory:
+    def __init__(self, content: str):
+        self.reward = None
+        self._messages = [{"role": "user", "content": "q"}, {"role": "assistant", "content": content}]
+
+    def messages(self):
+        return self._messages
+
+
+class Group:
+    def __init__(self, *contents: str):
+        self.trajectories = [Trajectory(c) for c in contents]
+
+
+def rewards(group):
+    return [t.reward for t in group.trajectories]
+
+
+def test_parse_scores():
+    assert parse_scores("Scores: [2.0, 0.5, 1]", 3) == [2.0, 0.5, 1.0]
+    with pytest.raises(ValueError):
+        parse_scores("[1.0]", 2)
+    assert build_judge_prompt(["a", "b"]).count("**Response") == 2
+
+
+def test_concurrent_judging_is_bounded():
+    groups = [Group(CITED, UNCITED, IDK) for _ in range(6)]
+    with MockJudgeServer(latency=0.2) as server:
+        judge = GroupJudge(model="mock", base_url=server.base_url, api_key="mock", max_concurrency=3)
+        started = time.monotonic()
+        judged = asyncio.run(judge.score_groups(groups))
+        elapsed = time.monotonic() - started
+    assert judged == groups
+    assert all(rewards(g) == [2.0, 1.0, 0.0] for g in groups)
+    assert server.max_in_flight == 3
+    assert elapsed < 6 * 0.2
+
+
+def test_judge_works_across_event_loops():
+    with MockJudgeServer(latency=0.05) as server:
+        judge = GroupJudge(model="mock", base_url=server.base_url, api_key="mock", max_concurrency=1)
+        for _ in range(2):  # e.g. one asyncio.run per training step
+            groups = asyncio.run(judge.score_groups([Group(CITED, IDK) for _ in range(3)]))
+            assert [rewards(g) for g in groups] == [[2.0, 0.0]] * 3
+    assert server.max_in_flight == 1 and judge.stats["retries"] == 0  # no "bound to a different event loop" errors
+
+
+def test_retries_with_backoff_then_fallback():
+    with MockJudgeServer(fail_first=2) as server:
+        judge = GroupJudge(model="mock", base_url=server.base_url, api_key="mock", max_retries=2, backoff=0.01)
+        group = asyncio.run(judge.score_group(Group(CITED, IDK)))
+    assert rewards(group) == [2.0, 0.0]
+    assert judge.stats["retries"] == 2 and judge.stats["failed"] == 0
+
+    marked = []
+    with MockJudgeServer(fail_first=10) as server:
+        judge = GroupJudge(model="mock", base_url=server.base_url, api_key="mock", max_retries=1, backoff=0.01,
+                           fallback=marked.append)
+        group = asyncio.run(judge.score_group(Group(CITED, IDK)))
+    assert marked == [group] and len(server.requests) == 2 and judge.stats["failed"] == 1
+
+
+def test_judging_overlaps_with_rollouts():
+    """Mirrors art.gather_trajectory_groups(groups, after_each=judge.score_group)"""
+    events = []
+
+    async def rollouts(i: int, seconds: float) -> Group:
+        await asyncio.sleep(seconds)
+        events.append(("rolled out", i))
+        return Group(CITED, UNCITED)
+
+    async def main(judge):
+        async def forward(i, group):
+            judged = await judge.score_group(await group)
+            events.append(("judged", i))
+            return judged
+        return await asyncio.gather(*(forward(i, rollouts(i, s)) for i, s in enumerate([0.05, 0.6])))
+
+    with MockJudgeServer(latency=0.1) as server:
+        judged = asyncio.run(main(GroupJudge(model="mock", base_url=server.base_url, api_key="mock")))
+    assert events.index(("judged", 0)) < events.index(("rolled out", 1))
+    assert [rewards(g) for g in judged] == [[2.0, 1.0]] * 2
+
+
+if __name__ == "__main__":
+    test_parse_scores()
+    test_concurrent_judging_is_bounded()
+    test_judge_works_across_event_loops()
+    test_retries_with_backoff_then_fallback()
+    test_judging_overlaps_with_rollouts()
+    print("ok")
@@ -6,7 +6,7 @@ from transformers import AutoModelForCausalLM, AutoTokenizer
 import torch
 
 # Import the three tool functions
-from semantic_search import FAISSSemanticSearch
+from semantic_search import get_searcher
 from KeywordSearch import keyword_search
 from ReadDocumentPart import read_document_part
 
@@ -19,7 +19,7 @@ class RAGSystem:
         
         # Initialize tools
         try:
-            self.semantic_search_engine = FAISSSemanticSearch()
+            self.semantic_search_engine = get_searcher()
         except Exception as e:
             print(f"[WARNING] Could not initialize semantic search: {e}")
             self.semantic_search_engine = None
@@ -0,0 +1,185 @@
+"""
+mock_servers.py
+
+Local stand-ins for the HTTP services the RL notebook talks to, so rollouts can run offline
+(tests, smoke runs of the training loop without a GPU or network):
+  - MockInferenceServer: OpenAI-compatible /v1/chat/completions, in place of model.inference_base_url
+  - MockJudgeServer: the same API answering judge prompts (judging.GroupJudge) with scores
+
+Servers run on a free localhost port in a background thread:
+
+    with MockInferenceServer() as server:
+        client = AsyncOpenAI(base_url=server.base_url, api_key="mock")
+"""
+
+import json
+import re
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Callable, Dict, List, Optional
+
+PART_ID = re.compile(r'\bid="([^"]+)"')
+
+
+class MockServer:
+    """Base class: a ThreadingHTTPServer answering POST <path> with self.respond(body) as JSON"""
+    path = "/"
+
+    def __init__(self, latency: float = 0.0, fail_first: int = 0):
+        """
+        Args:
+            latency: Seconds each response is delayed by (to exercise concurrency and timeouts)
+            fail_first: Answer this many requests with HTTP 503 first (to exercise retries)
+        """
+        self.latency = latency
+        self.fail_first = fail_first
+        self.requests: List[Dict] = []  # request bodies, in arrival order
+        self.max_in_flight = 0  # most requests being answered at the same time
+        self._in_flight = 0
+        self._lock = threading.Lock()
+        self._server: Optional[ThreadingHTTPServer] = None
+
+    @property
+    def base_url(self) -> str:
+        return f"http://127.0.0.1:{self._server.server_port}/v1"
+
+    def respond(self, body: Dict) -> Dict:
+        raise NotImplementedError
+
+    def start(self) -> "MockServer":
+        mock = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_POST(self):
+                if self.path.rstrip("/") != "/v1" + mock.path:
+                    self.send_error(404)
+                    return
+                body = json.loads(self.rfile.read(int(self.headers["Content-Length"])))
+                with mock._lock:
+                    mock.requests.append(body)
+                    fail = len(mock.requests) <= mock.fail_first
+                    mock._in_flight += 1
+                    mock.max_in_flight = max(mock.max_in_flight, mock._in_flight)
+                try:
+                    if mock.latency:
+                        time.sleep(mock.latency)
+                    if fail:
+                        status, payload = 503, {"error": {"message": "injected failure", "type": "unavailable"}}
+                    else:
+                        status, payload = 200, mock.respond(body)
+                except Exception as e:
+                    status, payload = 500, {"error": {"message": str(e), "type": "server_error"}}
+                finally:
+                    with mock._lock:
+                        mock._in_flight -= 1
+                data = json.dumps(payload).encode()
+                self.send_response(status)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(data)))
+                self.end_headers()
+                self.wfile.write(data)
+
+            def log_message(self, *args):
+                pass
+
+        self._server = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+        self._server.daemon_threads = True
+        threading.Thread(target=self._server.serve_forever, daemon=True).start()
+        return self
+
+    def stop(self):
+        if self._server is not None:
+            self._server.shutdown()
+            self._server.server_close()
+            self._server = None
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc):
+        self.stop()
+
+
+# ---------- inference ----------
+def research_policy(body: Dict) -> Dict:
+    """
+    Scripted agent for the rollout's tools: search for the question first, then answer citing the
+    part ids found in the tool results. Without tools it answers in the <answer>/<sources> format.
+    Returns an assistant message.
+    """
+    messages = body["messages"]
+    tools = [t["function"]["name"] for t in body.get("tools", [])]
+    question = next((m["content"] for m in reversed(messages) if m["role"] == "user"), "")
+    found = [i for m in messages if m["role"] == "tool" for i in PART_ID.findall(str(m["content"]))][:3]
+    answer = f"Based on the retrieved parts: {question}"
+
+    search = next((t for t in tools if "search" in t), None)
+    if search and not any(m["role"] == "tool" for m in messages):
+        return tool_call_message(search, {"query": question, "num": 3})
+    if "return_final_answer" in tools:
+        return tool_call_message("return_final_answer", {"answer": answer, "source_ids": found})
+    sources = "".join(f"<source>{i}</source>" for i in found)
+    return {"role": "assistant", "content": f"<answer>\n{answer}\n<sources>{sources}</sources>\n</answer>"}
+
+
+def tool_call_message(name: str, args: Dict) -> Dict:
+    return {"role": "assistant", "content": None,
+            "tool_calls": [{"id": f"call_{name}_{int(time.time() * 1e6)}", "type": "function",
+                            "function": {"name": name, "arguments": json.dumps(args)}}]}
+
+
+class MockInferenceServer(MockServer):
+    """OpenAI-compatible chat completions (non-streaming) driven by a policy function"""
+    path = "/chat/completions"
+
+    def __init__(self, policy: Callable[[Dict], Dict] = research_policy, latency: float = 0.0, fail_first: int = 0):
+        """
+        Args:
+            policy: request body -> assistant message ({"role", "content", optional "tool_calls"})
+            latency: Seconds each completion is delayed by
+            fail_first: Answer this many requests with HTTP 503 first
+        """
+        super().__init__(latency, fail_first)
+        self.policy = policy
+
+    def respond(self, body: Dict) -> Dict:
+        message = self.policy(body)
+        return {
+            "id": f"chatcmpl-mock-{len(self.requests)}",
+            "object": "chat.completion",
+            "created": int(time.time()),
+            "model": body.get("model", "mock"),
+            "choices": [{"index": 0, "message": message, "logprobs": None,
+                         "finish_reason": "tool_calls" if message.get("tool_calls") else "stop"}],
+            "usage": {"prompt_tokens": 0, "completion_tokens": 0, "total_tokens": 0},
+        }
+
+
+# ---------- judge ----------
+RESPONSE = re.compile(r"\*\*Response \d+:\*\*\n(.*?)(?=\n\n\*\*Response \d+:\*\*|\n\nReturn ONLY)", re.S)
+CITATION = re.compile(r"<source>[^<]+</source>|source_ids=\[\s*'")
+
+
+def citation_judge(body: Dict) -> Dict:
+    """
+    Scores the responses of a judging.build_judge_prompt prompt: 2.0 if a response cites part ids
+    (source_ids / <source>), 1.0 if it at least answers, 0.0 if it is empty or "I don't know".
+    """
+    responses = RESPONSE.findall(body["messages"][-1]["content"])
+    scores = []
+    for response in responses:
+        if CITATION.search(response):
+            scores.append(2.0)
+        elif response.strip() and "don't know" not in response.lower():
+            scores.append(1.0)
+        else:
+            scores.append(0.0)
+    return {"role": "assistant", "content": json.dumps(scores)}
+
+
+class MockJudgeServer(MockInferenceServer):
+    """Chat completions answering judge prompts with a JSON array of scores"""
+
+    def __init__(self, policy: Callable[[Dict], Dict] = citation_judge, latency: float = 0.0, fail_first: int = 0):
+        super().__init__(policy, latency, fail_first)
@@ -0,0 +1,57 @@
+import asyncio
+import json
+
+import pytest
+
+openai = pytest.importorskip("openai")
+from async_tools import ProcessRAGTools
+from async_tools_test import write_sample
+from mock_servers import MockInferenceServer
+
+
+async def offline_rollout(client, tools: ProcessRAGTools, question: str, max_turns: int = 4) -> list:
+    """The notebook's rollout loop, minus art: returns the message list"""
+    async def search_keyword_tool(query: str, num: int = 5) -> str:
+        return await tools.keyword_search(query, num)
+
+    async def read_document_part_tool(part_id: str) -> str:
+        return await tools.read_document_part(part_id)
+
+    schemas = [{"type": "function", "function": {"name": name, "parameters": {"type": "object"}}}
+               for name in ("search_keyword_tool", "read_document_part_tool", "return_final_answer")]
+    tools_by_name = {"search_keyword_tool": search_keyword_tool, "read_document_part_tool": read_document_part_tool}
+    messages = [{"role": "system", "content": "You are a legal research assistant."}, {"role": "user", "content": question}]
+    for _ in range(max_turns):
+        response = await client.chat.completions.create(model="mock", messages=messages, tools=schemas)
+        message = response.choices[0].message
+        messages.append(message.model_dump(exclude_none=True))
+        for tool_call in message.tool_calls or []:
+            args = json.loads(tool_call.function.arguments)
+            if tool_call.function.name == "return_final_answer":
+                return messages + [{"role": "tool", "tool_call_id": tool_call.id, "content": json.dumps(args)}]
+            result = await tools_by_name[tool_call.function.name](**args)
+            messages.append({"role": "tool", "tool_call_id": tool_call.id, "content": result})
+    return messages
+
+
+def test_offline_rollouts_against_mock_inference(tmp_path):
+    tools = ProcessRAGTools(xml_file=write_sample(tmp_path), max_workers=2)
+
+    async def main(base_url):
+        client = openai.AsyncOpenAI(base_url=base_url, api_key="mock")
+        return await asyncio.gather(*(offline_rollout(client, tools, q) for q in ["assault", "hearing"] * 3))
+
+    with MockInferenceServer(latency=0.05) as server:
+        rollouts = asyncio.run(main(server.base_url))
+    assert len(server.requests) == 12  # search turn + answer turn per rollout
+    for messages, expected in zip(rollouts, ["A:facts:p1", "A:facts:p2"] * 3):
+        final = json.loads(messages[-1]["content"])
+        assert final["source_ids"][0] == expected
+    tools.close()
+
+
+if __name__ == "__main__":
+    import pathlib, tempfile
+    with tempfile.TemporaryDirectory() as d:
+        test_offline_rollouts_against_mock_inference(pathlib.Path(d))
+    print("ok")
@@ -0,0 +1,164 @@
+"""
+rewards.py
+
+Deterministic, local rewards for RL trajectories, as a fast alternative to (or blend with) the LLM judge.
+Scores a whole group in one pass (numpy over the group), in milliseconds and without network access:
+  - format:     the trajectory ends in a final answer, either a return_final_answer tool call or an
+                <answer>...<sources><source>id</source></sources></answer> block
+  - sources:    F1 of the cited part ids against LegalScenario.gold_part_ids
+  - similarity: cosine of term counts against LegalScenario.gold_answer, plus embedding
+                cosine if an embed function is given (e.g. SentenceTransformer.encode)
+
+Rewards share the judge's range: 0.0 to 2.0 for a well-formed answer, format_penalty
+(default -2.0) for a trajectory without one.
+
+    local = LocalReward({s.id: s for s in training_scenarios})
+    group = local.score_group(group)  # sets trajectory.reward
+"""
+
+import json
+import re
+from collections import Counter
+from typing import Callable, Dict, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+if __package__:
+    from .KeywordSearch import tok
+else:
+    from KeywordSearch import tok
+
+ANSWER = re.compile(r"<answer>(.*?)</answer>", re.S)
+SOURCES = re.compile(r"<sources>(.*?)</sources>", re.S)
+SOURCE = re.compile(r"<source>\s*(.*?)\s*</source>", re.S)
+
+
+def parse_final_answer(messages: List[Dict]) -> Optional[Tuple[str, List[str]]]:
+    """
+    (answer, source ids) of the final answer in a message list, or None if there is none / it is malformed.
+    The last return_final_answer tool call wins; otherwise the last assistant <answer> block.
+    """
+    for message in reversed(messages):
+        if message.get("role") != "assistant":
+            continue
+        for call in reversed(message.get("tool_calls") or []):
+            function = call.get("function") or {}
+            if function.get("name") != "return_final_answer":
+                continue
+            try:
+                args = json.loads(function.get("arguments") or "")
+            except json.JSONDecodeError:
+                return None
+            answer, source_ids = args.get("answer"), args.get("source_ids")
+            if not isinstance(answer, str) or not isinstance(source_ids, list):
+                return None
+            return answer, [str(s) for s in source_ids]
+        content = message.get("content") or ""
+        match = ANSWER.search(content) if isinstance(content, str) else None
+        if match:
+            sources = SOURCES.search(match.group(1))
+            if sources is None:
+                return None
+            answer = SOURCES.sub("", match.group(1)).strip()
+            return answer, SOURCE.findall(sources.group(1))
+        return None  # the last assistant turn is not a final answer
+    return None
+
+
+def source_f1(predicted: Sequence[str], gold: Sequence[str]) -> float:
+    predicted, gold = {p.strip() for p in predicted if p.strip()}, {g.strip() for g in gold if g.strip()}
+    hits = len(predicted & gold)
+    if not hits:
+        return 0.0
+    precision, recall = hits / len(predicted), hits / len(gold)
+    return 2 * precision * recall / (precision + recall)
+
+
+def lexical_similarity(answers: List[str], reference: str) -> np.ndarray:
+    """Cosine similarity of term-count vectors (KeywordSearch.tok terms), one per answer"""
+    counts = [Counter(tok(a)) for a in answers]
+    ref = Counter(tok(reference))
+    vocab = {t: i for i, t in enumerate(set(ref).union(*counts))}
+    if not vocab:
+        return np.zeros(len(answers))
+    matrix = np.zeros((len(answers) + 1, len(vocab)))
+    for row, c in enumerate([ref] + counts):
+        for t, n in c.items():
+            matrix[row, vocab[t]] = n
+    return _cosine(matrix[1:], matrix[0])
+
+
+def embedding_similarity(answers: List[str], reference: str, embed: Callable[[List[str]], np.ndarray]) -> np.ndarray:
+    """Cosine similarity of embeddings (one embed call for the whole group), clipped to [0, 1]"""
+    vectors = np.asarray(embed([reference] + answers), dtype=np.float32)
+    return np.clip(_cosine(vectors[1:], vectors[0]), 0.0, 1.0)
+
+
+def _cosine(rows: np.ndarray, ref: np.ndarray) -> np.ndarray:
+    norms = np.linalg.norm(rows, axis=1) * np.linalg.norm(ref)
+    return np.divide(rows @ ref, norms, out=np.zeros(len(rows)), where=norms > 0)
+
+
+def blend(judge_rewards: Sequence[float], local_rewards: Sequence[float], judge_weight: float = 0.5) -> np.ndarray:
+    """judge_weight * judge + (1 - judge_weight) * local, element-wise"""
+    return judge_weight * np.asarray(judge_rewards, dtype=float) + (1 - judge_weight) * np.asarray(local_rewards, dtype=float)
+
+
+class LocalReward:
+    def __init__(self, scenarios: Optional[Dict[str, object]] = None, source_weight: float = 1.0,
+                 lexical_weight: float = 1.0, embedding_weight: float = 1.0,
+                 embed: Optional[Callable[[List[str]], np.ndarray]] = None, format_penalty: float = -2.0):
+        """
+        Args:
+            scenarios: Scenario id -> LegalScenario, to find the gold data of a trajectory via
+                       trajectory.metadata["scenario_id"] (as set by the rollout)
+            source_weight: Weight of source-id F1
+            lexical_weight: Weight of term-count cosine to the gold answer
+            embedding_weight: Weight of embedding cosine to the gold answer (only used with embed)
+            embed: list of texts -> array of embeddings, e.g. SentenceTransformer(...).encode
+            format_penalty: Reward of a trajectory without a well-formed final answer
+        """
+        self.scenarios = scenarios or {}
+        self.source_weight = source_weight
+        self.lexical_weight = lexical_weight
+        self.embedding_weight = embedding_weight
+        self.embed = embed
+        self.format_penalty = format_penalty
+
+    def score(self, messages: List[List[Dict]], gold_answer: Optional[str] = None,
+              gold_part_ids: Optional[List[str]] = None) -> np.ndarray:
+        """Rewards for the message lists of one scenario's trajectories"""
+        parsed = [parse_final_answer(m) for m in messages]
+        valid = np.array([p is not None for p in parsed])
+        answers = [p[0] if p else "" for p in parsed]
+
+        # weighted mean of the components the scenario has gold data for
+        total = np.zeros(len(messages))
+        weight = 0.0
+        if gold_part_ids:
+            total += self.source_weight * np.array([source_f1(p[1], gold_part_ids) if p else 0.0 for p in parsed])
+            weight += self.source_weight
+        if gold_answer:
+            total += self.lexical_weight * lexical_similarity(answers, gold_answer)
+            weight += self.lexical_weight
+            if self.embed is not None:
+                total += self.embedding_weight * embedding_similarity(answers, gold_answer, self.embed)
+                weight += self.embedding_weight
+        quality = total / weight if weight else np.ones(len(messages))
+        return np.where(valid, 2.0 * quality, self.format_penalty)
+
+    def score_group(self, group, scenario=None):
+        """
+        Set trajectory.reward for every trajectory of the group; returns the group.
+        scenario defaults to the one registered for the group's metadata["scenario_id"].
+        """
+        trajectories = group.trajectories
+        if not trajectories:
+            return group
+        if scenario is None:
+            scenario = self.scenarios.get(trajectories[0].metadata.get("scenario_id"))
+        rewards = self.score([t.messages() for t in trajectories],
+                             getattr(scenario, "gold_answer", None), getattr(scenario, "gold_part_ids", None))
+        for traj, reward in zip(trajectories, rewards):
+            traj.reward = float(reward)
+        return group
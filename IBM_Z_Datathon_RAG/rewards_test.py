@@ -0,0 +1,81 @@
+import json
+import time
+
+import numpy as np
+
+from rewards import LocalReward, blend, lexical_similarity, parse_final_answer, source_f1
+
+GOLD_ANSWER = "The court may adjourn without notice to the parties."
+GOLD_IDS = ["A:facts:p2", "A:facts:p3"]
+
+
+class Trajectory:
+    def __init__(self, messages, scenario_id: str):
+        self.reward = None
+        self.metadata = {"scenario_id": scenario_id}
+        self._messages = messages
+
+    def messages(self):
+        return self._messages
+
+
+class Group:
+    def __init__(self, trajectories):
+        self.trajectories = trajectories
+
+
+def final_call(answer, source_ids):
+    call = {"id": "c", "type": "function",
+            "function": {"name": "return_final_answer", "arguments": json.dumps({"answer": answer, "source_ids": source_ids})}}
+    return [{"role": "user", "content": "q"}, {"role": "assistant", "content": None, "tool_calls": [call]},
+            {"role": "tool", "tool_call_id": "c", "content": "answer=... source_ids=[...]"}]
+
+
+def final_text(content):
+    return [{"role": "user", "content": "q"}, {"role": "assistant", "content": content}]
+
+
+def test_parse_final_answer():
+    assert parse_final_answer(final_call("yes", ["a"])) == ("yes", ["a"])
+    text = "<think>x</think>\n<answer>\nyes\n<sources>\n<source>a</source>\n<source> b </source>\n</sources>\n</answer>"
+    assert parse_final_answer(final_text(text)) == ("yes", ["a", "b"])
+    assert parse_final_answer(final_text("<answer>no sources block</answer>")) is None
+    assert parse_final_answer(final_text('<tool>{"name": "keyword_search"}</tool>')) is None
+
+
+def test_component_scores():
+    assert source_f1(["A:facts:p2"], GOLD_IDS) == 2 / 3
+    assert source_f1([], GOLD_IDS) == 0.0
+    sims = lexical_similarity([GOLD_ANSWER, "court adjourn notice", "", "banana"], GOLD_ANSWER)
+    assert np.isclose(sims[0], 1.0) and 0 < sims[1] < 1 and sims[2] == 0 and sims[3] == 0
+    assert blend([2.0, 0.0], [1.0, 1.0], judge_weight=0.25).tolist() == [1.25, 0.75]
+
+
+def test_local_reward_ranks_group_deterministically():
+    scenario = type("Scenario", (), {"id": "7", "gold_answer": GOLD_ANSWER, "gold_part_ids": GOLD_IDS})
+    group = Group([Trajectory(messages, "7") for messages in [
+        final_call(GOLD_ANSWER, GOLD_IDS),                              # right answer, right sources
+        final_call("The court may adjourn.", ["A:facts:p2"]),           # partly right
+        final_call("I don't know", []),
+        final_text("<answer>\nI don't know\n<sources></sources>\n</answer>"),
+        final_text('<tool>{"name": "keyword_search"}</tool>'),           # ran out of turns
+    ]])
+    local = LocalReward({"7": scenario})
+    started = time.perf_counter()
+    rewards = [t.reward for t in local.score_group(group).trajectories]
+    assert time.perf_counter() - started < 0.1
+    assert rewards[0] == 2.0 and 1.0 < rewards[1] < 2.0
+    assert rewards[2] == rewards[3] < 1.0
+    assert rewards[4] == -2.0
+    assert [t.reward for t in local.score_group(group).trajectories] == rewards
+
+    embed = lambda texts: np.array([[len(t) > 0, 1.0] for t in texts], dtype=float)
+    with_embedding = LocalReward({"7": scenario}, embed=embed).score([final_call(GOLD_ANSWER, GOLD_IDS)], GOLD_ANSWER, GOLD_IDS)
+    assert np.isclose(with_embedding[0], 2.0)
+
+
+if __name__ == "__main__":
+    test_parse_final_answer()
+    test_component_scores()
+    test_local_reward_ranks_group_deterministically()
+    print("ok")
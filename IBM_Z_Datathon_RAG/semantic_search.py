@@ -2,6 +2,11 @@
 # !curl https://ollama.ai/install.sh | sh
 # !ollama serve &  # runs in background
 
+import inspect
+import json
+import os
+import threading
+import time
 import numpy as np
 import faiss
 import requests
@@ -9,7 +14,7 @@ import xml.etree.ElementTree as ET
 import sqlite3
 import struct
 from chromadb import PersistentClient
-from typing import List, Tuple
+from typing import Dict, List, Tuple
 
 class FAISSSemanticSearch:
     def __init__(self, chroma_path: str = "./eunomia_db", collection_name: str = "all_XML", 
@@ -154,6 +159,64 @@ class FAISSSemanticSearch:
         return xml_string
 
 
+# ---------- shared searchers ----------
+# Building a searcher (Chroma connection, SQLite read, Ollama embeddings, FAISS index) costs seconds,
+# so tool code and RAGSystem share one per process and configuration instead of constructing their own.
+_SEARCHERS: Dict[str, FAISSSemanticSearch] = {}
+_BUILD_LOCKS: Dict[str, threading.Lock] = {}
+_SEARCHERS_LOCK = threading.Lock()
+
+
+def _reset_searchers():
+    # a forked child must not reuse the parent's Chroma/HTTP handles or locks held at fork time
+    global _SEARCHERS_LOCK
+    _SEARCHERS.clear()
+    _BUILD_LOCKS.clear()
+    _SEARCHERS_LOCK = threading.Lock()
+
+
+if hasattr(os, "register_at_fork"):
+    os.register_at_fork(after_in_child=_reset_searchers)
+
+
+def _searcher_key(kwargs: Dict) -> str:
+    # bind against the constructor so get_searcher() and get_searcher(chroma_path="./eunomia_db") match
+    bound = inspect.signature(FAISSSemanticSearch).bind(**kwargs)
+    bound.apply_defaults()
+    return json.dumps(bound.arguments, sort_keys=True, default=repr)
+
+
+def get_searcher(**kwargs) -> FAISSSemanticSearch:
+    """
+    The shared FAISSSemanticSearch of this process for the given constructor arguments, built on first use.
+
+    Thread-safe: concurrent first callers wait for a single build. A failed build raises and is
+    retried on the next call. Each process (including forked workers) builds its own.
+    """
+    key = _searcher_key(kwargs)
+    searcher = _SEARCHERS.get(key)
+    if searcher is not None:
+        return searcher
+    with _SEARCHERS_LOCK:
+        build_lock = _BUILD_LOCKS.setdefault(key, threading.Lock())
+    with build_lock:
+        if key not in _SEARCHERS:
+            _SEARCHERS[key] = FAISSSemanticSearch(**kwargs)
+        return _SEARCHERS[key]
+
+
+def warmup(query: str = "warmup", **kwargs) -> FAISSSemanticSearch:
+    """
+    Build the shared searcher now and run one query through it (loads the embedding model on the Ollama side),
+    so the first real tool call does not pay for it. Call once at startup, before rollouts or requests.
+    """
+    start = time.perf_counter()
+    searcher = get_searcher(**kwargs)
+    searcher.search(query, 1)
+    print(f"✓ Semantic search warmed up in {time.perf_counter() - start:.1f}s")
+    return searcher
+
+
 # Example usage
 if __name__ == "__main__":
     # Local usage (Ollama running on localhost)
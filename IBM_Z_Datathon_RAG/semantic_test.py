@@ -1,4 +1,11 @@
-from semantic_search import FAISSSemanticSearch
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import pytest
+
+# semantic_search needs faiss, chromadb and requests at import time: skip rather than fail collection without them
+semantic_search = pytest.importorskip("semantic_search")
+from semantic_search import FAISSSemanticSearch, get_searcher, warmup
 
 def test_semantic_search():
     ss = FAISSSemanticSearch()
@@ -7,5 +14,28 @@ def test_semantic_search():
     # assert results.count("<result>") <= 2
     print(results)
     
+def test_get_searcher_builds_once_per_configuration(monkeypatch):
+    builds = []
+
+    class FakeSearch:
+        def __init__(self, chroma_path: str = "./eunomia_db", collection_name: str = "all_XML", ollama_url: str = None):
+            builds.append(chroma_path)
+            time.sleep(0.05)  # wide window for racing first callers
+
+        def search(self, query: str, n: int = 3) -> str:
+            return "<results />"
+
+    monkeypatch.setattr(semantic_search, "FAISSSemanticSearch", FakeSearch)
+    monkeypatch.setattr(semantic_search, "_SEARCHERS", {})
+    monkeypatch.setattr(semantic_search, "_BUILD_LOCKS", {})
+    with ThreadPoolExecutor(max_workers=8) as pool:
+        searchers = list(pool.map(lambda _: get_searcher(), range(8)))
+    assert all(s is searchers[0] for s in searchers)
+    assert get_searcher(chroma_path="./eunomia_db") is searchers[0]  # defaults spelled out: same searcher
+    assert warmup(chroma_path="./other_db") is get_searcher(chroma_path="./other_db")
+    assert builds == ["./eunomia_db", "./other_db"]
+    semantic_search._reset_searchers()  # what a forked child sees
+    assert get_searcher() is not searchers[0]
+    
 if __name__ == "__main__":  
     test_semantic_search()
\ No newline at end of file
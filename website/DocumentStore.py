@@ -0,0 +1,153 @@
+"""
+DocumentStore.py
+
+One long-lived, in-process view of the corpus XML, shared by the RAG tools.
+
+The XML is parsed only when its indexes are (re)built; afterwards everything is
+served from the two on-disk indexes, both memory-mapped:
+  - the BM25 inverted index (KeywordSearch.BM25Index) for keyword search, part text and snippets
+  - the byte-offset part index (ReadDocumentPart.PartIndex) for reading parts
+
+The only heap the store grows at run time is an LRU of rendered parts, capped
+by memory_budget_mb. memory_usage() reports what the store holds.
+"""
+
+import os
+import sys
+import threading
+from collections import OrderedDict
+from typing import Dict, Optional
+
+import KeywordSearch
+import ReadDocumentPart
+
+
+class DocumentStore:
+    def __init__(self, xml_file: str = "./normalized_enhanced.xml", memory_budget_mb: float = 64):
+        """
+        Open (building on first use) the indexes of xml_file.
+
+        Args:
+            xml_file: Path to the corpus XML
+            memory_budget_mb: Upper bound for the cache of rendered document parts
+        """
+        if not os.path.exists(xml_file):
+            raise FileNotFoundError(f"Corpus XML not found: {xml_file}")
+        self.xml_file = xml_file
+        self.memory_budget_bytes = int(memory_budget_mb * 1024 * 1024)
+        self._lock = threading.Lock()
+        self._parts: "OrderedDict[tuple, str]" = OrderedDict()
+        self._parts_bytes = 0
+        self._stamp = self._source_stamp()
+        self.bm25 = KeywordSearch.get_index(xml_file)
+        self.part_index = ReadDocumentPart.get_part_index(xml_file)
+        print(f"✓ Document store ready: {len(self.bm25.ids)} searchable parts from {xml_file}")
+
+    def _source_stamp(self):
+        st = os.stat(self.xml_file)
+        return st.st_mtime_ns, st.st_size
+
+    def refresh(self) -> bool:
+        """
+        Re-open the indexes if the XML changed on disk. Returns True if it did.
+        Runs before every tool call, so an unchanged file costs a single os.stat.
+        The old indexes are not closed: a call that already holds them finishes on
+        them, and they are unmapped once the last such reference goes.
+        """
+        with self._lock:
+            stamp = self._source_stamp()
+            if stamp == self._stamp:
+                return False
+            bm25 = KeywordSearch.get_index(self.xml_file)
+            part_index = ReadDocumentPart.get_part_index(self.xml_file)
+            self._stamp = stamp
+            if bm25 is self.bm25 and part_index is self.part_index:  # touched, same content
+                return False
+            self.bm25, self.part_index = bm25, part_index
+            self._parts.clear()
+            self._parts_bytes = 0
+        return True
+
+    def version(self) -> str:
+        """Content hash of the XML the indexes were built from (changes when the corpus changes)."""
+        self.refresh()
+        return self.bm25.meta["source"]["sha256"]
+
+    # ----- tools -----
+    def keyword_search(self, query: str, n: int = 3, backend: str = "index") -> str:
+        """BM25 keyword search, same output as KeywordSearch.keyword_search."""
+        self.refresh()
+        if backend != "index":
+            return KeywordSearch.keyword_search(self.xml_file, query, n=n, backend=backend)
+        bm25 = self.bm25  # one index for the whole call, even if a refresh swaps it meanwhile
+        return KeywordSearch.format_results(bm25.search(query, topk=n), bm25, query)
+
+    def read_part(self, part_id: str, wrap: bool = True) -> str:
+        """Read a part by id, same output as ReadDocumentPart.read_document_part."""
+        self.refresh()
+        key = (part_id, wrap)
+        with self._lock:
+            if key in self._parts:
+                self._parts.move_to_end(key)
+                return self._parts[key]
+            part_index = self.part_index
+        try:
+            result = ReadDocumentPart.read_document_part_indexed(self.xml_file, part_id, wrap=wrap, index=part_index)
+        except Exception as e:  # same errors as read_document_part
+            raise Exception(f"[ERROR] {e}")
+        size = sys.getsizeof(result)
+        with self._lock:
+            # not cached if a refresh swapped the index while reading: the result is from the old XML
+            if size <= self.memory_budget_bytes and key not in self._parts and part_index is self.part_index:
+                self._parts[key] = result
+                self._parts_bytes += size
+                while self._parts_bytes > self.memory_budget_bytes:
+                    _, evicted = self._parts.popitem(last=False)
+                    self._parts_bytes -= sys.getsizeof(evicted)
+        return result
+
+    def text(self, part_id: str) -> str:
+        """Normalized plain text of a part ("" if unknown)."""
+        return self.bm25.text(part_id)
+
+    def snippet(self, part_id: str, query: str, win: int = 160) -> str:
+        return KeywordSearch.snippet(self.text(part_id), query, win=win)
+
+    # ----- accounting -----
+    def memory_usage(self) -> Dict[str, int]:
+        """
+        Bytes held by the store:
+          cache_bytes / budget_bytes  rendered parts (heap, bounded)
+          mapped_bytes                memory-mapped index files + XML (page cache, shared between processes)
+          index_entries               terms + part ids kept in dicts
+        """
+        bm25_dir = self.bm25.index_dir
+        mapped = sum(os.path.getsize(os.path.join(bm25_dir, f)) for f in os.listdir(bm25_dir) if f.endswith(".bin"))
+        mapped += os.path.getsize(self.xml_file)
+        return {
+            "cache_bytes": self._parts_bytes,
+            "budget_bytes": self.memory_budget_bytes,
+            "mapped_bytes": mapped,
+            "index_entries": len(self.bm25.lexicon) + len(self.bm25.ids) + len(self.part_index.parts),
+        }
+
+
+# one store per XML file per process
+_STORES: Dict[str, DocumentStore] = {}
+_STORES_LOCK = threading.Lock()
+
+
+def get_store(xml_file: str = "./normalized_enhanced.xml", memory_budget_mb: Optional[float] = None) -> DocumentStore:
+    key = os.path.abspath(xml_file)
+    with _STORES_LOCK:
+        if key not in _STORES:
+            kwargs = {} if memory_budget_mb is None else {"memory_budget_mb": memory_budget_mb}
+            _STORES[key] = DocumentStore(xml_file, **kwargs)
+        return _STORES[key]
+
+
+if __name__ == "__main__":
+    store = get_store("./normalized_enhanced.xml")
+    print(store.keyword_search("assault", 3))
+    print(store.read_part("Marbury_v_Madison.Facts.p002"))
+    print(store.memory_usage())
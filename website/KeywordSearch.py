@@ -5,14 +5,27 @@ legal_xml_search.py
 - Keyword search (BM25) over a SINGLE XML file.
 - Each XML element with an `id` attribute is a searchable unit.
 - Outputs slide-style XML-like results.
+- The corpus is indexed once into an on-disk inverted index (a sidecar
+  directory next to the XML) that is memory-mapped at query time.
 
-No external dependencies. Windows/macOS/Linux compatible.
+No external dependencies (the optional SparseBM25 backend needs numpy + scipy).
+Windows/macOS/Linux compatible.
 """
 
-import math, re, sys
-from typing import Dict, List, Tuple
+import hashlib, json, math, mmap, os, re, shutil, sys, threading
+from array import array
+from contextlib import contextmanager
+from bisect import bisect_left
+from heapq import heappush, heapreplace
+from typing import Dict, List, Optional, Tuple
 from xml.etree import ElementTree as ET
 
+try:
+    import numpy as np
+    from scipy import sparse
+except ImportError:  # only SparseBM25 needs them
+    np = sparse = None
+
 # ---------- tiny utils ----------
 TOK = re.compile(r"[A-Za-z0-9_]+")
 
@@ -58,22 +71,149 @@ def load_id2text(xml_path: str) -> Dict[str, str]:
     return id2text
 
 # ---------- BM25 ----------
+def bm25_term_score(f: int, dl: int, idf: float, avgdl: float, k1: float, b: float) -> float:
+    """Contribution of one query term occurring f times in a doc of length dl (same arithmetic as BM25.score)."""
+    denom = f + k1 * (1 - b + b * dl / (avgdl + 1e-12))
+    return idf * ((f * (k1 + 1)) / (denom + 1e-12))
+
+def term_upper_bound(docs, tfs, doclen, idf: float, avgdl: float, k1: float, b: float) -> float:
+    """Largest contribution a term can make to any doc (never below 0: docs without the term get 0)."""
+    ub = 0.0
+    for doc, f in zip(docs, tfs):
+        ub = max(ub, bm25_term_score(f, doclen[doc], idf, avgdl, k1, b))
+    return ub
+
+# ---------- top-k with MaxScore pruning ----------
+PRUNE_SLACK = 1e-9  # bounds are compared with a little slack so float rounding never drops a true top-k doc
+
+def maxscore_topk(q: List[str], terms: Dict[str, Tuple], doclen, avgdl: float,
+                  k1: float, b: float, topk: int) -> List[Tuple[int, float]]:
+    """
+    Document-at-a-time BM25 top-k over postings lists, with MaxScore pruning.
+
+    Args:
+        q: query tokens; repeated tokens count repeatedly, as in BM25.score
+        terms: term -> (docs, tfs, idf, upper_bound) for the query terms present in
+               the corpus; docs are ascending doc numbers, tfs aligned with them
+        doclen: token count per doc number
+
+    Returns:
+        [(doc, score)] with score > 0, best first, ties broken by doc number.
+        Scores are bit-identical to BM25.score: every surviving doc is re-scored
+        by summing the term contributions in query order.
+
+    Terms are sorted by upper bound. Once the heap holds topk docs, the terms whose
+    bounds add up to less than the k-th score are "non-essential": docs that only
+    contain those terms are never visited, and candidates are dropped as soon as
+    their partial score plus the remaining bounds cannot reach the k-th score.
+    """
+    if topk <= 0:
+        return []
+    uniq = [w for w in dict.fromkeys(q) if w in terms]
+    if not uniq:
+        return []
+    mult = {w: q.count(w) for w in uniq}
+    order = sorted(uniq, key=lambda w: mult[w] * terms[w][3])
+    bounds = [mult[w] * terms[w][3] for w in order]
+    prefix, acc = [], 0.0
+    for ub in bounds:
+        acc += ub
+        prefix.append(acc)
+    docs_of = [terms[w][0] for w in order]
+    tfs_of = [terms[w][1] for w in order]
+    sizes = [len(d) for d in docs_of]
+    pos = [0] * len(order)
+
+    heap: List[Tuple[float, int]] = []  # (score, -doc): heap[0] is the current k-th best
+    threshold = 0.0
+    first_essential = 0
+    while True:
+        # next candidate: smallest current doc among the essential terms
+        cand = None
+        for i in range(first_essential, len(order)):
+            if pos[i] < sizes[i]:
+                d = docs_of[i][pos[i]]
+                if cand is None or d < cand:
+                    cand = d
+        if cand is None:
+            break
+
+        found: Dict[int, int] = {}
+        partial = 0.0
+        dl = doclen[cand]
+        for i in range(first_essential, len(order)):
+            if pos[i] < sizes[i] and docs_of[i][pos[i]] == cand:
+                f = tfs_of[i][pos[i]]
+                found[i] = f
+                partial += mult[order[i]] * bm25_term_score(f, dl, terms[order[i]][2], avgdl, k1, b)
+                pos[i] += 1
+
+        pruned = False
+        for i in range(first_essential - 1, -1, -1):
+            if partial + prefix[i] < threshold:
+                pruned = True
+                break
+            j = bisect_left(docs_of[i], cand, pos[i], sizes[i])
+            pos[i] = j
+            if j < sizes[i] and docs_of[i][j] == cand:
+                f = tfs_of[i][j]
+                found[i] = f
+                partial += mult[order[i]] * bm25_term_score(f, dl, terms[order[i]][2], avgdl, k1, b)
+        if pruned or (len(heap) == topk and partial < threshold):
+            continue
+
+        tf = {order[i]: f for i, f in found.items()}
+        s = 0.0
+        for w in q:
+            f = tf.get(w, 0)
+            if f == 0:
+                continue
+            s += bm25_term_score(f, dl, terms[w][2], avgdl, k1, b)
+        if s <= 0:
+            continue
+        item = (s, -cand)
+        if len(heap) < topk:
+            heappush(heap, item)
+        elif item > heap[0]:
+            heapreplace(heap, item)
+        else:
+            continue
+        if len(heap) == topk:
+            threshold = heap[0][0] * (1 - PRUNE_SLACK)
+            while first_essential < len(order) and prefix[first_essential] < threshold:
+                first_essential += 1
+
+    return [(-neg, sc) for sc, neg in sorted(heap, key=lambda x: (-x[0], -x[1]))]
+
 class BM25:
     def __init__(self, id2text: Dict[str, str], k1: float = 1.5, b: float = 0.75):
         self.id2text = id2text
         self.k1, self.b = k1, b
         self.id2toks: Dict[str, List[str]] = {}
         self.df: Dict[str, int] = {}
+        self.ids: List[str] = []
+        self.doclen: List[int] = []
+        self.postings: Dict[str, Tuple[List[int], List[int]]] = {}
         total = 0
         for pid, txt in id2text.items():
             dt = tok(txt)
             self.id2toks[pid] = dt
             total += len(dt)
-            for w in set(dt):
+            tf: Dict[str, int] = {}
+            for t in dt:
+                tf[t] = tf.get(t, 0) + 1
+            doc = len(self.ids)
+            self.ids.append(pid)
+            self.doclen.append(len(dt))
+            for w, f in tf.items():
                 self.df[w] = self.df.get(w, 0) + 1
+                self.postings.setdefault(w, ([], []))
+                self.postings[w][0].append(doc)
+                self.postings[w][1].append(f)
         self.N = max(1, len(id2text))
         self.avgdl = total / self.N
         self.idf = {w: math.log((self.N - d + 0.5) / (d + 0.5) + 1e-12) for w, d in self.df.items()}
+        self._ub: Dict[str, float] = {}
 
     def score(self, q: List[str], d: List[str]) -> float:
         if not q or not d:
@@ -88,11 +228,24 @@ class BM25:
             if f == 0:
                 continue
             idf = self.idf.get(w, 0.0)
-            denom = f + self.k1 * (1 - self.b + self.b * dl / (self.avgdl + 1e-12))
-            s += idf * ((f * (self.k1 + 1)) / (denom + 1e-12))
+            s += bm25_term_score(f, dl, idf, self.avgdl, self.k1, self.b)
         return float(s)
 
+    def upper_bound(self, w: str) -> float:
+        if w not in self._ub:
+            docs, tfs = self.postings[w]
+            self._ub[w] = term_upper_bound(docs, tfs, self.doclen, self.idf[w], self.avgdl, self.k1, self.b)
+        return self._ub[w]
+
     def search(self, query: str, topk: int = 3) -> List[Tuple[str, float]]:
+        """Top-k over the postings of the query terms only (MaxScore), same result as search_exhaustive."""
+        q = tok(query)
+        terms = {w: (*self.postings[w], self.idf[w], self.upper_bound(w)) for w in set(q) if w in self.postings}
+        hits = maxscore_topk(q, terms, self.doclen, self.avgdl, self.k1, self.b, topk)
+        return [(self.ids[doc], s) for doc, s in hits]
+
+    def search_exhaustive(self, query: str, topk: int = 3) -> List[Tuple[str, float]]:
+        """Reference implementation: score every document."""
         q = tok(query)
         scored: List[Tuple[str, float]] = []
         for pid, dt in self.id2toks.items():
@@ -102,33 +255,459 @@ class BM25:
         scored.sort(key=lambda x: x[1], reverse=True)
         return scored[:topk]
 
+# ---------- on-disk inverted index ----------
+INDEX_VERSION = 2
+INDEX_SUFFIX = ".bm25"
+
+def default_index_dir(xml_path: str) -> str:
+    """Sidecar directory holding the index, e.g. normalized_enhanced.xml.bm25/"""
+    return os.path.abspath(xml_path) + INDEX_SUFFIX
+
+def file_sha256(path: str, chunk: int = 1 << 20) -> str:
+    h = hashlib.sha256()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(chunk), b""):
+            h.update(block)
+    return h.hexdigest()
+
+def source_stamp(xml_path: str) -> Dict[str, object]:
+    st = os.stat(xml_path)
+    return {"mtime_ns": st.st_mtime_ns, "size": st.st_size, "sha256": file_sha256(xml_path)}
+
+@contextmanager
+def build_lock(index_dir: str):
+    """
+    Exclusive lock on index_dir + ".lock", held while an index is (re)built, so concurrent
+    builders (threads, worker processes) take turns instead of replacing each other's output.
+    """
+    with open(index_dir + ".lock", "a+b") as f:
+        if os.name == "nt":
+            import msvcrt
+            f.seek(0)
+            while True:
+                try:
+                    msvcrt.locking(f.fileno(), msvcrt.LK_LOCK, 1)  # gives up after ~10 s; keep waiting
+                    break
+                except OSError:
+                    continue
+        else:
+            import fcntl
+            fcntl.flock(f.fileno(), fcntl.LOCK_EX)
+        try:
+            yield
+        finally:
+            if os.name == "nt":
+                f.seek(0)
+                msvcrt.locking(f.fileno(), msvcrt.LK_UNLCK, 1)
+            else:
+                fcntl.flock(f.fileno(), fcntl.LOCK_UN)
+
+def _map_array(path: str, typecode: str):
+    """Memory-map a flat binary array file (read-only). Returns (mmap or None, memoryview)."""
+    if os.path.getsize(path) == 0:
+        return None, memoryview(array(typecode))
+    with open(path, "rb") as f:
+        mm = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+    return mm, memoryview(mm).cast("B").cast(typecode)
+
+class BM25Index:
+    """
+    Persistent BM25 inverted index for a single XML file.
+
+    Layout of the sidecar directory:
+      meta.json      source stamp (mtime/size/sha256), N, total tokens, k1/b
+      lexicon.json   term -> [postings offset, df, idf, max contribution under k1/b]
+      docs.bin       uint32 doc numbers, postings of all terms back to back
+      tfs.bin        uint32 term frequencies, aligned with docs.bin
+      doclen.bin     uint32 token count per doc
+      ids.json       doc number -> part id
+      text.bin       normalized text of every doc (utf-8), sliced via textoff.bin (uint64)
+
+    The binary files are memory-mapped, so a query only touches the pages of
+    the postings of its own terms and the text of the returned hits.
+    """
+
+    FILES = ("meta.json", "lexicon.json", "docs.bin", "tfs.bin", "doclen.bin", "ids.json", "text.bin", "textoff.bin")
+
+    def __init__(self, index_dir: str, k1: float = 1.5, b: float = 0.75):
+        self.index_dir = index_dir
+        self.k1, self.b = k1, b
+        with open(os.path.join(index_dir, "meta.json"), "r", encoding="utf-8") as f:
+            self.meta = json.load(f)
+        with open(os.path.join(index_dir, "lexicon.json"), "r", encoding="utf-8") as f:
+            self.lexicon: Dict[str, List] = json.load(f)
+        with open(os.path.join(index_dir, "ids.json"), "r", encoding="utf-8") as f:
+            self.ids: List[str] = json.load(f)
+        self.pid2doc = {pid: i for i, pid in enumerate(self.ids)}
+        self._maps = []
+        self.docs = self._map("docs.bin", "I")
+        self.tfs = self._map("tfs.bin", "I")
+        self.doclen = self._map("doclen.bin", "I")
+        self.textoff = self._map("textoff.bin", "Q")
+        self._text_mm, self._text = _map_array(os.path.join(index_dir, "text.bin"), "B")
+        self._maps.append(self._text_mm)
+        self.N = self.meta["N"]
+        self.avgdl = self.meta["total"] / self.N
+
+    def _map(self, name: str, typecode: str) -> memoryview:
+        mm, view = _map_array(os.path.join(self.index_dir, name), typecode)
+        self._maps.append(mm)
+        return view
+
+    # ----- build -----
+    @staticmethod
+    def build(xml_path: str, index_dir: Optional[str] = None, k1: float = 1.5, b: float = 0.75,
+              force: bool = True) -> str:
+        """
+        Tokenize the XML once and write the index files. Returns the index directory.
+        Builders are serialized by build_lock; with force=False the build is skipped if the
+        index turned fresh while waiting for the lock (another process built it).
+        """
+        index_dir = index_dir or default_index_dir(xml_path)
+        with build_lock(index_dir):
+            if not force:
+                status = BM25Index.source_status(xml_path, index_dir)
+                if status == "touched":
+                    BM25Index._restamp(xml_path, index_dir)
+                if status != "stale":
+                    return index_dir
+            BM25Index._build(xml_path, index_dir, k1, b)
+        return index_dir
+
+    @staticmethod
+    def _restamp(xml_path: str, index_dir: str):
+        """Record the XML's current mtime in meta.json (content unchanged); caller holds build_lock."""
+        meta_path = os.path.join(index_dir, "meta.json")
+        with open(meta_path, "r", encoding="utf-8") as f:
+            meta = json.load(f)
+        st = os.stat(xml_path)
+        meta["source"] = {"mtime_ns": st.st_mtime_ns, "size": st.st_size, "sha256": meta["source"]["sha256"]}
+        tmp_path = f"{meta_path}.tmp-{os.getpid()}"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump(meta, f)
+        os.replace(tmp_path, meta_path)  # readers see the old or the new file, never a partial one
+
+    @staticmethod
+    def _build(xml_path: str, index_dir: str, k1: float, b: float):
+        stamp = source_stamp(xml_path)
+        id2text = load_id2text(xml_path)
+
+        ids: List[str] = []
+        doclen = array("I")
+        textoff = array("Q", [0])
+        postings: Dict[str, Tuple[array, array]] = {}
+        tmp_dir = f"{index_dir}.tmp-{os.getpid()}"
+        shutil.rmtree(tmp_dir, ignore_errors=True)
+        os.makedirs(tmp_dir)
+        total = 0
+        with open(os.path.join(tmp_dir, "text.bin"), "wb") as text_f:
+            for doc, (pid, txt) in enumerate(id2text.items()):
+                dt = tok(txt)
+                ids.append(pid)
+                doclen.append(len(dt))
+                total += len(dt)
+                tf: Dict[str, int] = {}
+                for t in dt:
+                    tf[t] = tf.get(t, 0) + 1
+                for w, f in tf.items():
+                    if w not in postings:
+                        postings[w] = (array("I"), array("I"))
+                    postings[w][0].append(doc)
+                    postings[w][1].append(f)
+                raw = txt.encode("utf-8")
+                text_f.write(raw)
+                textoff.append(textoff[-1] + len(raw))
+
+        N = max(1, len(ids))
+        avgdl = total / N
+        lexicon: Dict[str, List] = {}
+        offset = 0
+        with open(os.path.join(tmp_dir, "docs.bin"), "wb") as docs_f, \
+             open(os.path.join(tmp_dir, "tfs.bin"), "wb") as tfs_f:
+            for w in sorted(postings):
+                docs, tfs = postings[w]
+                d = len(docs)
+                idf = math.log((N - d + 0.5) / (d + 0.5) + 1e-12)
+                lexicon[w] = [offset, d, idf, term_upper_bound(docs, tfs, doclen, idf, avgdl, k1, b)]
+                docs.tofile(docs_f)
+                tfs.tofile(tfs_f)
+                offset += d
+        with open(os.path.join(tmp_dir, "doclen.bin"), "wb") as f:
+            doclen.tofile(f)
+        with open(os.path.join(tmp_dir, "textoff.bin"), "wb") as f:
+            textoff.tofile(f)
+        with open(os.path.join(tmp_dir, "ids.json"), "w", encoding="utf-8") as f:
+            json.dump(ids, f, ensure_ascii=False)
+        with open(os.path.join(tmp_dir, "lexicon.json"), "w", encoding="utf-8") as f:
+            json.dump(lexicon, f, ensure_ascii=False)
+        meta = {"version": INDEX_VERSION, "source": stamp, "N": N, "total": total, "k1": k1, "b": b}
+        with open(os.path.join(tmp_dir, "meta.json"), "w", encoding="utf-8") as f:
+            json.dump(meta, f)
+
+        # swap in: move the old index aside, rename the new one into place, then delete the old one.
+        # Readers that still map the old files keep them until they close (POSIX unlink semantics).
+        old_dir = f"{index_dir}.old-{os.getpid()}"
+        try:
+            os.replace(index_dir, old_dir)
+        except FileNotFoundError:
+            old_dir = None
+        try:
+            os.replace(tmp_dir, index_dir)
+        except OSError:  # a builder outside the lock (e.g. another host on shared storage) got there first
+            shutil.rmtree(tmp_dir, ignore_errors=True)
+        if old_dir:
+            shutil.rmtree(old_dir, ignore_errors=True)
+        print(f"[INDEX] Built BM25 index for {len(ids)} parts, {len(lexicon)} terms -> {index_dir}", file=sys.stderr)
+
+    @staticmethod
+    def source_status(xml_path: str, index_dir: str) -> str:
+        """
+        "fresh" if the index at index_dir carries the current mtime+size of xml_path,
+        "touched" if those moved but the content hash still matches, else "stale".
+        Read-only: refreshing the stamp of a touched index is left to build().
+        """
+        meta_path = os.path.join(index_dir, "meta.json")
+        if not all(os.path.exists(os.path.join(index_dir, n)) for n in BM25Index.FILES):
+            return "stale"
+        try:
+            with open(meta_path, "r", encoding="utf-8") as f:
+                meta = json.load(f)
+        except (OSError, ValueError):
+            return "stale"
+        if meta.get("version") != INDEX_VERSION:
+            return "stale"
+        old = meta.get("source", {})
+        st = os.stat(xml_path)
+        if old.get("mtime_ns") == st.st_mtime_ns and old.get("size") == st.st_size:
+            return "fresh"
+        if old.get("size") != st.st_size or old.get("sha256") != file_sha256(xml_path):
+            return "stale"
+        return "touched"
+
+    @staticmethod
+    def is_fresh(xml_path: str, index_dir: str) -> bool:
+        """True if the index at index_dir was built from the current content of xml_path."""
+        return BM25Index.source_status(xml_path, index_dir) != "stale"
+
+    @classmethod
+    def open(cls, xml_path: str, index_dir: Optional[str] = None, **kw) -> "BM25Index":
+        """Open the index for xml_path, (re)building it first if missing or stale."""
+        index_dir = index_dir or default_index_dir(xml_path)
+        if cls.source_status(xml_path, index_dir) != "fresh":
+            cls.build(xml_path, index_dir, force=False, **kw)  # rebuilds, or only restamps a touched XML
+        return cls(index_dir, **kw)
+
+    def still_matches_source(self, xml_path: str) -> bool:
+        """
+        Cheap per-query check: one os.stat against the stamp in meta.json as loaded.
+        The XML is re-hashed only if its mtime moved while its size stayed the same.
+        """
+        old = self.meta["source"]
+        st = os.stat(xml_path)
+        if st.st_size != old.get("size"):
+            return False
+        if st.st_mtime_ns == old.get("mtime_ns"):
+            return True
+        if file_sha256(xml_path) != old.get("sha256"):
+            return False
+        old["mtime_ns"] = st.st_mtime_ns  # touched, not changed: skip the hash next time
+        return True
+
+    def close(self):
+        """Unmap the index files now; only for an index no other thread is using (see get_index)."""
+        for view in (self.docs, self.tfs, self.doclen, self.textoff, self._text):
+            view.release()
+        for mm in self._maps:
+            if mm is not None:
+                mm.close()
+        self._maps = []
+
+    # ----- query -----
+    def text(self, pid: str) -> str:
+        doc = self.pid2doc.get(pid)
+        if doc is None:
+            return ""
+        return bytes(self._text[self.textoff[doc]:self.textoff[doc + 1]]).decode("utf-8")
+
+    def postings(self, w: str) -> Optional[Tuple[memoryview, memoryview, float, float]]:
+        """(docs, tfs, idf, upper bound) for term w, or None if w is not in the corpus."""
+        entry = self.lexicon.get(w)
+        if entry is None:
+            return None
+        offset, df, idf, ub = entry
+        docs, tfs = self.docs[offset:offset + df], self.tfs[offset:offset + df]
+        if (self.k1, self.b) != (self.meta["k1"], self.meta["b"]):
+            ub = term_upper_bound(docs, tfs, self.doclen, idf, self.avgdl, self.k1, self.b)
+        return docs, tfs, idf, ub
+
+    def search(self, query: str, topk: int = 3) -> List[Tuple[str, float]]:
+        """BM25 top-k reading only the postings of the query terms (same scores as BM25.search)."""
+        q = tok(query)
+        terms = {}
+        for w in set(q):
+            p = self.postings(w)
+            if p is not None:
+                terms[w] = p
+        hits = maxscore_topk(q, terms, self.doclen, self.avgdl, self.k1, self.b, topk)
+        return [(self.ids[doc], s) for doc, s in hits]
+
+# one open index per XML file per process; re-validated against the file on every use
+_INDEXES: Dict[str, BM25Index] = {}
+_INDEXES_LOCK = threading.Lock()
+
+def get_index(xml_file: str) -> BM25Index:
+    key = os.path.abspath(xml_file)
+    with _INDEXES_LOCK:
+        index = _INDEXES.get(key)
+        if index is not None and index.still_matches_source(xml_file):
+            return index
+        # A replaced index is dropped, not closed: other threads may still be reading its postings
+        # (closing an mmap with live slices raises BufferError). Its files are unmapped once the
+        # last reference goes.
+        index = _INDEXES[key] = BM25Index.open(xml_file)
+        return index
+
+# ---------- vectorized backend (numpy/scipy) ----------
+class SparseBM25:
+    """
+    BM25 over a CSR term-document matrix holding the precomputed BM25 weight of
+    every (term, doc) pair. A query (or a batch of queries) is a sparse
+    term-count matrix, so scoring is one sparse product plus argpartition.
+
+    Drop-in alternative to BM25 (same constructor and search signature); scores
+    match BM25 up to float summation order.
+    """
+
+    def __init__(self, id2text: Optional[Dict[str, str]] = None, k1: float = 1.5, b: float = 0.75):
+        if sparse is None:
+            raise ImportError("SparseBM25 needs numpy and scipy: pip install numpy scipy")
+        self.k1, self.b = k1, b
+        self.ids: List[str] = []
+        self.vocab: Dict[str, int] = {}
+        self.W = None
+        if id2text is None:
+            return
+        bm25 = BM25(id2text, k1=k1, b=b)
+        self.ids = bm25.ids
+        terms = sorted(bm25.postings)
+        indptr = np.zeros(len(terms) + 1, dtype=np.int64)
+        for i, w in enumerate(terms):
+            indptr[i + 1] = indptr[i] + len(bm25.postings[w][0])
+        docs = np.fromiter((d for w in terms for d in bm25.postings[w][0]), dtype=np.int32, count=indptr[-1])
+        tfs = np.fromiter((f for w in terms for f in bm25.postings[w][1]), dtype=np.float64, count=indptr[-1])
+        idf = np.array([bm25.idf[w] for w in terms], dtype=np.float64)
+        self._set_matrix(terms, indptr, docs, tfs, idf, np.array(bm25.doclen, dtype=np.float64), bm25.avgdl)
+
+    @classmethod
+    def from_index(cls, index: "BM25Index") -> "SparseBM25":
+        """Build the matrix straight from an on-disk BM25Index (no re-tokenizing)."""
+        self = cls(None, k1=index.k1, b=index.b)
+        self.ids = index.ids
+        terms = list(index.lexicon)
+        entries = np.array([index.lexicon[w][:3] for w in terms], dtype=np.float64).reshape(-1, 3)
+        offsets = entries[:, 0].astype(np.int64)
+        order = np.argsort(offsets, kind="stable")
+        terms = [terms[i] for i in order]
+        indptr = np.append(offsets[order], len(index.docs))
+        docs = np.frombuffer(index.docs, dtype=np.uint32).astype(np.int32)
+        tfs = np.frombuffer(index.tfs, dtype=np.uint32).astype(np.float64)
+        doclen = np.frombuffer(index.doclen, dtype=np.uint32).astype(np.float64)
+        self._set_matrix(terms, indptr, docs, tfs, entries[order, 2], doclen, index.avgdl)
+        return self
+
+    def _set_matrix(self, terms, indptr, docs, tfs, idf, doclen, avgdl):
+        k1, b = self.k1, self.b
+        row_idf = np.repeat(idf, np.diff(indptr))
+        denom = tfs + k1 * (1 - b + b * doclen[docs] / (avgdl + 1e-12))
+        weights = row_idf * ((tfs * (k1 + 1)) / (denom + 1e-12))
+        self.vocab = {w: i for i, w in enumerate(terms)}
+        self.W = sparse.csr_matrix((weights, docs, indptr), shape=(len(terms), len(self.ids)))
+
+    def _query_matrix(self, queries: List[str]):
+        rows, cols = [], []
+        for r, query in enumerate(queries):
+            for w in tok(query):
+                col = self.vocab.get(w)
+                if col is not None:
+                    rows.append(r)
+                    cols.append(col)
+        data = np.ones(len(rows), dtype=np.float64)  # duplicates are summed: repeated terms count repeatedly
+        return sparse.csr_matrix((data, (rows, cols)), shape=(len(queries), len(self.vocab)))
+
+    def _topk(self, cols, vals, topk: int) -> List[Tuple[str, float]]:
+        keep = vals > 0
+        cols, vals = cols[keep], vals[keep]
+        if topk <= 0 or len(vals) == 0:
+            return []
+        if len(vals) > topk:
+            kth = vals[np.argpartition(-vals, topk - 1)[topk - 1]]
+            sel = vals >= kth  # keep ties at the boundary so they are broken by doc order below
+            cols, vals = cols[sel], vals[sel]
+        order = np.lexsort((cols, -vals))[:topk]
+        return [(self.ids[c], float(v)) for c, v in zip(cols[order], vals[order])]
+
+    def search_batch(self, queries: List[str], topk: int = 3) -> List[List[Tuple[str, float]]]:
+        """Score all queries with one sparse product. Returns one hit list per query."""
+        scores = (self._query_matrix(queries) @ self.W).tocsr()
+        return [
+            self._topk(scores.indices[scores.indptr[r]:scores.indptr[r + 1]],
+                       scores.data[scores.indptr[r]:scores.indptr[r + 1]], topk)
+            for r in range(len(queries))
+        ]
+
+    def search(self, query: str, topk: int = 3) -> List[Tuple[str, float]]:
+        return self.search_batch([query], topk)[0]
+
+_SPARSE: Dict[str, Tuple[BM25Index, SparseBM25]] = {}
+
+def get_sparse(xml_file: str) -> SparseBM25:
+    index = get_index(xml_file)
+    key = os.path.abspath(xml_file)
+    cached = _SPARSE.get(key)
+    if cached is None or cached[0] is not index:
+        cached = _SPARSE[key] = (index, SparseBM25.from_index(index))
+    return cached[1]
+
 # ---------- Main search function ----------
-def keyword_search(xml_file: str, keywords: str, n: int = 3) -> str:
+BACKENDS = ("index", "sparse")
+
+def format_results(hits: List[Tuple[str, float]], index: BM25Index, keywords: str) -> str:
+    # slide-style XML output
+    lines = [f'<results num="{len(hits)}">']
+    for pid, score in hits:
+        lines += [
+            f'  <result id="{pid}" score="{score:.3f}">',
+            f"    {xml_escape(snippet(index.text(pid), keywords))}",
+            "  </result>",
+        ]
+    lines.append("</results>")
+    return "\n".join(lines)
+
+def keyword_search(xml_file: str, keywords: str, n: int = 3, backend: str = "index") -> str:
     """
     Perform BM25 keyword search on an XML file.
+    The inverted index is built on first use and reused until the XML changes.
     
     Args:
         xml_file: Path to XML file (e.g., "./normalized_enhanced.xml")
         keywords: Search query string (e.g., "assault")
         n: Number of top results to return (default: 3)
+        backend: "index" (pure-Python postings, default) or "sparse" (numpy/scipy matrix)
     
     Returns:
         XML-formatted results as a string
     """
-    id2text = load_id2text(xml_file)
-    bm25 = BM25(id2text)
-    hits = bm25.search(keywords, topk=n)
+    if backend not in BACKENDS:
+        raise ValueError(f"Unknown keyword search backend: {backend} (expected one of {BACKENDS})")
+    index = get_index(xml_file)
+    searcher = get_sparse(xml_file) if backend == "sparse" else index
+    return format_results(searcher.search(keywords, topk=n), index, keywords)
 
-    # slide-style XML output
-    lines = [f'<results num="{len(hits)}">']
-    for pid, score in hits:
-        lines += [
-            f'  <result id="{pid}" score="{score:.3f}">',
-            f"    {xml_escape(snippet(id2text.get(pid, ''), keywords))}",
-            "  </result>",
-        ]
-    lines.append("</results>")
-    return "\n".join(lines)
+def keyword_search_batch(xml_file: str, queries: List[str], n: int = 3) -> List[str]:
+    """Like keyword_search for many queries at once, scored together by the sparse backend."""
+    index = get_index(xml_file)
+    hits = get_sparse(xml_file).search_batch(queries, topk=n)
+    return [format_results(h, index, q) for h, q in zip(hits, queries)]
 
 if __name__ == "__main__":
     # Example usage:
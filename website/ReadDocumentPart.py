@@ -5,11 +5,20 @@ read_document_part.py
 
 Retrieve a specific part of an XML document by ID.
 Supports both DOM parsing (fast, for small/medium files) and streaming (memory-efficient for huge files).
+By default a sidecar byte-offset index (id -> byte span) is built once, so a read is a
+seek into the memory-mapped XML plus a parse of just that fragment.
 """
 
+import hashlib
+import html
+import json
+import mmap
+import os
+import re
 import sys
+import threading
 from copy import deepcopy
-from typing import Optional
+from typing import Dict, List, Optional, Tuple
 from lxml import etree
 
 
@@ -139,6 +148,198 @@ def read_document_part_stream(xml_path: str, part_id: str, wrap: bool = True) ->
     return etree.tostring(built_root, encoding="unicode", pretty_print=True)
 
 
+# ------------------------------
+# Indexed version (seek + fragment parse)
+# ------------------------------
+PART_INDEX_VERSION = 1
+PART_INDEX_SUFFIX = ".parts.json"
+
+# Markup tokens of an XML file. Comments, CDATA, PIs and the DOCTYPE are matched
+# first so that tags inside them are never mistaken for elements.
+_MARKUP = re.compile(
+    rb"<!--.*?-->|<!\[CDATA\[.*?\]\]>|<\?.*?\?>|<!DOCTYPE(?:[^\[>]|\[.*?\])*>"
+    rb"|<(/?)([^\s/>!?]+)((?:[^>\"']|\"[^\"]*\"|'[^']*')*?)(/?)>",
+    re.S,
+)
+_ATTR = re.compile(rb"""([^\s=]+)\s*=\s*(?:"([^"]*)"|'([^']*)')""")
+_ENCODING = re.compile(rb"""^<\?xml[^>]*encoding\s*=\s*["']([A-Za-z0-9._-]+)["']""")
+
+
+def _file_sha256(path: str, chunk: int = 1 << 20) -> str:
+    h = hashlib.sha256()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(chunk), b""):
+            h.update(block)
+    return h.hexdigest()
+
+
+def _attrs(raw: bytes, encoding: str) -> Dict[str, str]:
+    return {
+        m.group(1).decode(encoding): html.unescape((m.group(2) if m.group(2) is not None else m.group(3)).decode(encoding))
+        for m in _ATTR.finditer(raw)
+    }
+
+
+class PartIndex:
+    """
+    Sidecar index mapping every `id` attribute to the byte span of its element.
+
+    The index is a JSON file next to the XML (normalized_enhanced.xml.parts.json):
+        {"source": {mtime_ns, size, sha256}, "encoding": ..., "case_doc_id": ...,
+         "parts": {part_id: [start, end, tail_end]}}
+    [start, end) is the element itself, [end, tail_end) its tail text.
+    It is rebuilt when the XML's mtime/size change and its content hash differs.
+    """
+
+    def __init__(self, xml_path: str, index_path: Optional[str] = None):
+        self.xml_path = xml_path
+        self.index_path = index_path or os.path.abspath(xml_path) + PART_INDEX_SUFFIX
+        if not self.is_fresh(xml_path, self.index_path):
+            self.build(xml_path, self.index_path)
+        with open(self.index_path, "r", encoding="utf-8") as f:
+            data = json.load(f)
+        self.source: Dict[str, object] = data["source"]  # stamp of the XML the spans were taken from
+        self.encoding: str = data["encoding"]
+        self.case_doc_id: Optional[str] = data["case_doc_id"]
+        self.parts: Dict[str, List[int]] = data["parts"]
+        with open(xml_path, "rb") as f:
+            self._mm = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+
+    @staticmethod
+    def build(xml_path: str, index_path: str) -> None:
+        """Scan the raw bytes once and record where each id'd element starts and ends."""
+        st = os.stat(xml_path)
+        source = {"mtime_ns": st.st_mtime_ns, "size": st.st_size, "sha256": _file_sha256(xml_path)}
+        parts: Dict[str, List[int]] = {}
+        case_doc_id = None
+        with open(xml_path, "rb") as f, mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+            m = _ENCODING.match(mm[:200])
+            encoding = m.group(1).decode("ascii").lower() if m else "utf-8"
+            stack: List[Tuple[int, Optional[str]]] = []  # (start offset, id) of open elements
+
+            def record(pid: Optional[str], start: int, end: int):
+                if pid is None:
+                    return
+                # keep the first element in document order, like the XPath lookup
+                if pid not in parts or start < parts[pid][0]:
+                    tail_end = mm.find(b"<", end)
+                    parts[pid] = [start, end, tail_end if tail_end != -1 else len(mm)]
+
+            for tag in _MARKUP.finditer(mm):
+                name = tag.group(2)
+                if name is None:  # comment / CDATA / PI / DOCTYPE
+                    continue
+                if tag.group(1):  # end tag
+                    start, pid = stack.pop()
+                    record(pid, start, tag.end())
+                    continue
+                attrs = _attrs(tag.group(3), encoding) if tag.group(3) else {}
+                if case_doc_id is None and name == b"Case" and stack:
+                    for key in ("name", "title", "id"):
+                        if attrs.get(key):
+                            case_doc_id = attrs[key].replace(" ", "_")
+                            break
+                if tag.group(4):  # self-closing
+                    record(attrs.get("id"), tag.start(), tag.end())
+                else:
+                    stack.append((tag.start(), attrs.get("id")))
+        if stack:
+            raise ValueError(f"Unbalanced XML, cannot index: {xml_path}")
+
+        tmp_path = f"{index_path}.tmp-{os.getpid()}"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump({"version": PART_INDEX_VERSION, "source": source, "encoding": encoding,
+                       "case_doc_id": case_doc_id, "parts": parts}, f, ensure_ascii=False)
+        os.replace(tmp_path, index_path)
+        print(f"[INDEX] Indexed byte offsets of {len(parts)} parts -> {index_path}", file=sys.stderr)
+
+    @staticmethod
+    def is_fresh(xml_path: str, index_path: str) -> bool:
+        try:
+            with open(index_path, "r", encoding="utf-8") as f:
+                data = json.load(f)
+        except (OSError, ValueError):
+            return False
+        if data.get("version") != PART_INDEX_VERSION:
+            return False
+        old = data.get("source", {})
+        st = os.stat(xml_path)
+        if old.get("mtime_ns") == st.st_mtime_ns and old.get("size") == st.st_size:
+            return True
+        return old.get("size") == st.st_size and old.get("sha256") == _file_sha256(xml_path)
+
+    def still_matches_source(self) -> bool:
+        """
+        Checked on every read, so it must stay cheap: one os.stat against the stamp loaded with the index.
+        The file is re-hashed only if its mtime moved while its size stayed the same.
+        """
+        st = os.stat(self.xml_path)
+        if st.st_size != self.source.get("size") or len(self._mm) != st.st_size:
+            return False
+        if st.st_mtime_ns == self.source.get("mtime_ns"):
+            return True
+        if _file_sha256(self.xml_path) != self.source.get("sha256"):
+            return False
+        self.source["mtime_ns"] = st.st_mtime_ns  # touched, not changed: skip the hash next time
+        return True
+
+    def close(self):
+        """Unmap the XML now; only for an index no other thread is using (see get_part_index)."""
+        self._mm.close()
+
+    def element(self, part_id: str) -> etree._Element:
+        """Parse just the bytes of the part (plus its tail text) into an element."""
+        span = self.parts.get(part_id)
+        if span is None:
+            raise KeyError(f"part_id not found: {part_id}")
+        start, end, tail_end = span
+        parser = etree.XMLParser(remove_blank_text=True, encoding=self.encoding)
+        node = etree.fromstring(self._mm[start:end], parser)
+        tail = self._mm[end:tail_end]
+        if tail.strip():
+            node.tail = etree.fromstring(b"<t>" + tail + b"</t>", parser).text
+        return node
+
+
+# one part index per XML file per process
+_PART_INDEXES: Dict[str, PartIndex] = {}
+_PART_INDEXES_LOCK = threading.Lock()
+
+
+def get_part_index(xml_path: str) -> PartIndex:
+    key = os.path.abspath(xml_path)
+    with _PART_INDEXES_LOCK:
+        index = _PART_INDEXES.get(key)
+        if index is not None and index.still_matches_source():
+            return index
+        # dropped, not closed: a read in another thread may still be slicing its mmap
+        index = _PART_INDEXES[key] = PartIndex(xml_path)
+        return index
+
+
+def read_document_part_indexed(xml_path: str, part_id: str, wrap: bool = True,
+                               index: Optional[PartIndex] = None) -> str:
+    """
+    Look the part up in the byte-offset index (default: get_part_index(xml_path)) and parse only its fragment.
+    Falls back to the DOM version if the fragment cannot be parsed on its own
+    (e.g. it relies on namespace prefixes or entities declared further up).
+    Output matches the DOM version, except that a whitespace-only tail inside
+    mixed content is dropped (pretty-printing only).
+    """
+    index = index or get_part_index(xml_path)
+    try:
+        node = index.element(part_id)
+    except etree.XMLSyntaxError:
+        return read_document_part_dom(xml_path, part_id, wrap=wrap)
+
+    if wrap:
+        doc_id = part_id.split(".", 1)[0] if "." in part_id else (index.case_doc_id or "unknown_doc")
+        wrapped = wrap_subtree(node, part_id, doc_id)
+        return etree.tostring(wrapped, encoding="unicode", pretty_print=True)
+
+    return etree.tostring(node, encoding="unicode", pretty_print=True)
+
+
 # ------------------------------
 # Main function
 # ------------------------------
@@ -146,7 +347,8 @@ def read_document_part(
     xml_file: str,
     part_id: str,
     wrap: bool = True,
-    stream: bool = False
+    stream: bool = False,
+    use_index: bool = True
 ) -> str:
     """
     Retrieve a specific part of an XML document by its ID.
@@ -155,7 +357,9 @@ def read_document_part(
         xml_file: Path to the XML file (e.g., "./normalized_enhanced.xml")
         part_id: The ID of the element to retrieve (e.g., "Marbury_v_Madison.Facts.p002")
         wrap: Whether to wrap the result in a legalDocument/part envelope (default: True)
-        stream: Use streaming parser for large files (slower but memory-efficient). Default: False (fast DOM parsing)
+        stream: Use streaming parser for large files (slower but memory-efficient). Default: False
+        use_index: Seek via the byte-offset index (built on first use). Default: True.
+                   With use_index=False and stream=False the whole file is DOM-parsed.
     
     Returns:
         XML-formatted result as a Unicode string
@@ -167,6 +371,8 @@ def read_document_part(
     try:
         if stream:
             return read_document_part_stream(xml_file, part_id, wrap=wrap)
+        elif use_index:
+            return read_document_part_indexed(xml_file, part_id, wrap=wrap)
         else:
             return read_document_part_dom(xml_file, part_id, wrap=wrap)
     except Exception as e:
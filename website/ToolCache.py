@@ -0,0 +1,97 @@
+"""
+ToolCache.py
+
+Memoizes RAG tool results (semantic_search, keyword_search, read_document_part)
+across chat sessions and RL rollouts.
+
+Entries are keyed on (tool name, canonical JSON of the args, version stamp).
+The version stamp identifies the data the tool answered from (corpus XML hash,
+FAISS index fingerprint), so when the XML or the Chroma store changes the key
+changes and stale entries are never served; they simply age out of the LRU.
+Eviction is LRU, bounded both by entry count and by total bytes, plus a TTL.
+"""
+
+import json
+import sys
+import threading
+import time
+from collections import OrderedDict
+from typing import Callable, Dict, Optional, Tuple
+
+
+class ToolResultCache:
+    def __init__(self, max_bytes: int = 64 * 1024 * 1024, max_entries: int = 4096,
+                 ttl_seconds: Optional[float] = 3600):
+        """
+        Args:
+            max_bytes: Upper bound on the memory held by cached results
+            max_entries: Upper bound on the number of cached results
+            ttl_seconds: Entries older than this are dropped (None = no expiry)
+        """
+        self.max_bytes = max_bytes
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+        self.hits = 0
+        self.misses = 0
+        self.bytes = 0
+        self._entries: "OrderedDict[str, Tuple[float, int, str]]" = OrderedDict()  # key -> (stored_at, size, result)
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def make_key(tool_name: str, args: dict, version: str) -> str:
+        return json.dumps([tool_name, args, version], sort_keys=True, separators=(",", ":"), ensure_ascii=False)
+
+    def _drop(self, key: str):
+        _, size, _ = self._entries.pop(key)
+        self.bytes -= size
+
+    def get(self, tool_name: str, args: dict, version: str) -> Optional[str]:
+        key = self.make_key(tool_name, args, version)
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and self.ttl_seconds is not None and time.monotonic() - entry[0] > self.ttl_seconds:
+                self._drop(key)
+                entry = None
+            if entry is None:
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return entry[2]
+
+    def put(self, tool_name: str, args: dict, version: str, result: str):
+        key = self.make_key(tool_name, args, version)
+        size = sys.getsizeof(key) + sys.getsizeof(result)
+        if size > self.max_bytes:
+            return
+        with self._lock:
+            if key in self._entries:
+                self._drop(key)
+            self._entries[key] = (time.monotonic(), size, result)
+            self.bytes += size
+            while self.bytes > self.max_bytes or len(self._entries) > self.max_entries:
+                self._drop(next(iter(self._entries)))
+
+    def get_or_compute(self, tool_name: str, args: dict, version: str, compute: Callable[[], str]) -> str:
+        """Return the cached result, or run compute() and cache it unless it is an error payload."""
+        result = self.get(tool_name, args, version)
+        if result is not None:
+            return result
+        result = compute()
+        if not result.startswith('{"error"'):
+            self.put(tool_name, args, version, result)
+        return result
+
+    def stats(self) -> Dict[str, float]:
+        total = self.hits + self.misses
+        return {"hits": self.hits, "misses": self.misses, "entries": len(self._entries),
+                "bytes": self.bytes, "hit_rate": self.hits / total if total else 0.0}
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self.bytes = 0
+
+
+# shared by every RAGSystem in the process
+DEFAULT_TOOL_CACHE = ToolResultCache()
@@ -1,11 +1,17 @@
 import streamlit as st
+import json
 import re
+import time
 from openai import OpenAI
-from main import RAGSystem
+from main import RAGSystem, load_resources
 
 # Set OpenAI API key from Streamlit secrets
 client = OpenAI(api_key=st.secrets["OPENAI_API_KEY"])
 
+# Chat model behind the RAG agent: the [llm] table of secrets.toml (e.g. backend = "openai",
+# base_url = "http://localhost:8000/v1"), or the local transformers model when absent
+LLM_CONFIG = dict(st.secrets["llm"]) if "llm" in st.secrets else None
+
 # Set a default model
 if "openai_model" not in st.session_state:
     st.session_state["openai_model"] = "gpt-3.5-turbo"
@@ -66,6 +72,27 @@ def format_llm_output(text: str) -> str:
     """
     return styled_html
 
+# Least time between two redraws of the streaming draft: a rerender per token is slower than generation
+DRAFT_REFRESH_SECONDS = 0.1
+
+def render_trace(placeholder, trace: list):
+    # --- Tool calls so far: redrawn only when the trace changes (tool_call / tool_result / turn) ---
+    with placeholder.container():
+        for line in trace:
+            st.caption(line)
+
+def render_draft(placeholder, draft: str):
+    # --- The turn being generated: a single text element, updated in place ---
+    if draft:
+        placeholder.text(draft)
+    else:
+        placeholder.empty()
+
+@st.cache_resource(show_spinner="Loading model and indexes...")
+def load_shared_resources():
+    # --- Model, semantic search and document store: loaded once per server process, shared by all sessions ---
+    return load_resources(backend=LLM_CONFIG, xml_file="./normalized_enhanced.xml")
+
 def login_screen():
     st.header("this app is private. you may only log in as a pre-approved user.")
     st.subheader("please log in")
@@ -101,8 +128,10 @@ Do not include any other text outside these tags.
 if not st.user.is_logged_in:
     login_screen()
 else:
-    rag = RAGSystem(max_turns=5, xml_file="./normalized_enhanced.xml") if "rag" not in st.session_state else st.session_state["rag"]
-    st.session_state["rag"] = rag
+    load_shared_resources()
+    # Per-session conversation state only; the heavy resources above are shared
+    if "rag" not in st.session_state:
+        st.session_state["rag"] = RAGSystem(max_turns=5, xml_file="./normalized_enhanced.xml", backend=LLM_CONFIG)
     st.header(f"Welcome, {st.user.name}")
     st.button("Log Out", on_click=st.logout)
 
@@ -124,12 +153,33 @@ else:
         ]
 
         with st.chat_message("assistant"):
-            # Pass chat history to RAG system
-            response = st.session_state["rag"].query(
+            # Pass chat history to RAG system and render its turns as they stream in
+            placeholder = st.empty()
+            with placeholder.container():
+                trace_box, draft_box = st.empty(), st.empty()
+            trace, draft, response, drawn_at = [], "", "", 0.0
+            for event in st.session_state["rag"].query_stream(
                 user_query=prompt,
                 chat_history=chat_history_for_rag
-            )
-            st.html(format_llm_output(response))
+            ):
+                if event["type"] == "token":
+                    draft += event["text"]
+                    if time.monotonic() - drawn_at >= DRAFT_REFRESH_SECONDS:
+                        render_draft(draft_box, draft)
+                        drawn_at = time.monotonic()
+                    continue
+                if event["type"] == "turn":
+                    draft = ""
+                elif event["type"] == "tool_call":
+                    trace.append(f"Calling {event['name']} {json.dumps(event['args'], ensure_ascii=False)}")
+                elif event["type"] == "tool_result":
+                    trace.append(f"{event['name']} returned {len(event['result'])} characters")
+                elif event["type"] == "final":
+                    response = event["text"]
+                    continue
+                render_draft(draft_box, draft)  # flush the tokens the throttle held back
+                render_trace(trace_box, trace)
+            placeholder.html(format_llm_output(response))
 
         st.session_state.messages.append({"role": "assistant", "content": response})
     
@@ -0,0 +1,42 @@
+import pytest
+
+
+class CharTokenizer:
+    """Chat template over characters; token id -> one letter on decode (enough for stop strings)"""
+    eos_token_id = 1
+
+    def apply_chat_template(self, messages, tokenize=True, add_generation_prompt=False, return_tensors="pt", return_dict=True):
+        import torch
+
+        text = "".join(f"<{m['role']}>{m['content']}|" for m in messages) + ("<assistant>" if add_generation_prompt else "")
+        return {"input_ids": torch.tensor([[2 + ord(c) % 250 for c in text]])}
+
+    def decode(self, ids, skip_special_tokens=True):
+        return "".join(chr(97 + int(i) % 26) for i in ids if not (skip_special_tokens and int(i) == self.eos_token_id))
+
+    def batch_decode(self, rows, skip_special_tokens=True):
+        return [self.decode(row, skip_special_tokens) for row in rows]
+
+
+def make_tiny_model(hidden_size: int = 64):
+    """Random two-layer Qwen2 with greedy decoding, the same weights on every call"""
+    torch = pytest.importorskip("torch")
+    transformers = pytest.importorskip("transformers")
+    torch.manual_seed(0)
+    config = transformers.Qwen2Config(vocab_size=256, hidden_size=hidden_size, intermediate_size=2 * hidden_size,
+                                      num_hidden_layers=2, num_attention_heads=4, num_key_value_heads=2,
+                                      max_position_embeddings=2048)
+    model = transformers.Qwen2ForCausalLM(config).eval()
+    model.generation_config.do_sample = False
+    return model
+
+
+@pytest.fixture
+def char_tokenizer():
+    return CharTokenizer()
+
+
+@pytest.fixture
+def tiny_model():
+    """Factory: tiny_model(hidden_size=64) -> a fresh make_tiny_model()"""
+    return make_tiny_model
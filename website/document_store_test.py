@@ -0,0 +1,111 @@
+import os
+import sys
+import threading
+
+import DocumentStore
+from DocumentStore import DocumentStore as Store
+from KeywordSearch import keyword_search
+from ReadDocumentPart import read_document_part
+
+SAMPLE_XML = """<?xml version="1.0" encoding="utf-8"?>
+<Corpus>
+  <Case name="Marbury v Madison">
+{parts}
+  </Case>
+</Corpus>
+"""
+
+
+def write_corpus(path, words=("assault", "hearing", "notice", "court")):
+    parts = "\n".join(f'    <p id="p{i}">The {w} clause, part {i}, {"lorem ipsum " * 20}</p>' for i, w in enumerate(words))
+    path.write_text(SAMPLE_XML.format(parts=parts), encoding="utf-8")
+    return str(path)
+
+
+def test_store_matches_tools_and_skips_reopening(tmp_path, monkeypatch):
+    xml = write_corpus(tmp_path / "corpus.xml")
+    store = Store(xml)
+    assert store.keyword_search("hearing notice", 2) == keyword_search(xml, "hearing notice", 2)
+    assert store.read_part("p1") == read_document_part(xml, "p1")
+    opened = []
+    monkeypatch.setattr(DocumentStore.KeywordSearch, "get_index", lambda f: opened.append(f))
+    monkeypatch.setattr(DocumentStore.ReadDocumentPart, "get_part_index", lambda f: opened.append(f))
+    store.keyword_search("court", 1)
+    store.read_part("p2")
+    store.version()
+    assert opened == []  # unchanged file: refresh is a stat, the opened indexes are reused
+
+
+def test_part_cache_honours_memory_budget(tmp_path):
+    xml = write_corpus(tmp_path / "corpus.xml", words=["w"] * 20)
+    part_bytes = sys.getsizeof(read_document_part(xml, "p0"))
+    store = Store(xml, memory_budget_mb=3.5 * part_bytes / (1024 * 1024))
+    for i in range(20):
+        store.read_part(f"p{i}")
+        assert store.memory_usage()["cache_bytes"] <= store.memory_budget_bytes
+    assert list(store._parts) == [(f"p{i}", True) for i in (17, 18, 19)]  # least recently used evicted
+    store.read_part("p17")
+    store.read_part("p0")
+    assert [k for k, _ in store._parts] == ["p19", "p17", "p0"]
+
+
+def test_source_change_invalidates_cache(tmp_path):
+    path = tmp_path / "corpus.xml"
+    xml = write_corpus(path)
+    store = Store(xml)
+    old_version, old_part = store.version(), store.read_part("p0")
+    assert store._parts
+    write_corpus(path, words=("battery", "hearing", "notice", "court", "appeal"))
+    assert store.version() != old_version  # refresh re-opened the indexes
+    assert not store._parts
+    assert store.read_part("p0") != old_part and "battery" in store.read_part("p0")
+    assert 'id="p4"' in store.keyword_search("appeal", 1)
+
+
+def test_concurrent_calls_reopen_once_after_a_change(tmp_path, monkeypatch):
+    path = tmp_path / "corpus.xml"
+    xml = write_corpus(path)
+    store = Store(xml)
+    opened = []
+    real_get_index = DocumentStore.KeywordSearch.get_index
+    monkeypatch.setattr(DocumentStore.KeywordSearch, "get_index", lambda f: opened.append(f) or real_get_index(f))
+    write_corpus(tmp_path / "new.xml", words=("battery", "hearing", "notice", "court", "appeal"))
+    os.replace(tmp_path / "new.xml", path)
+    start = threading.Barrier(8)
+    results, errors = [], []
+
+    def call(i):
+        start.wait()
+        try:
+            results.append(store.keyword_search("appeal", 1) if i % 2 else store.read_part("p0"))
+        except Exception as e:
+            errors.append(e)
+
+    threads = [threading.Thread(target=call, args=(i,)) for i in range(8)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    assert errors == [] and len(opened) == 1  # the other calls waited for the first refresh
+    assert all('id="p4"' in r or "battery" in r for r in results)
+
+
+def test_memory_usage(tmp_path):
+    xml = write_corpus(tmp_path / "corpus.xml")
+    store = Store(xml, memory_budget_mb=1)
+    usage = store.memory_usage()
+    assert usage["cache_bytes"] == 0 and usage["budget_bytes"] == 1024 * 1024
+    assert usage["mapped_bytes"] > (tmp_path / "corpus.xml").stat().st_size
+    assert usage["index_entries"] == len(store.bm25.lexicon) + 2 * 4  # terms + 4 ids in each index
+    store.read_part("p0")
+    assert store.memory_usage()["cache_bytes"] == sys.getsizeof(store.read_part("p0"))
+
+
+if __name__ == "__main__":
+    import pathlib, tempfile
+    with tempfile.TemporaryDirectory() as d:
+        test_part_cache_honours_memory_budget(pathlib.Path(d))
+        test_memory_usage(pathlib.Path(d))
+    with tempfile.TemporaryDirectory() as d:
+        test_source_change_invalidates_cache(pathlib.Path(d))
+    print("ok")
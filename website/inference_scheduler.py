@@ -0,0 +1,379 @@
+"""
+inference_scheduler.py
+
+Continuous (in-flight) batching for the chat model, shared by all chat sessions.
+
+Requests from every session go into one queue. A single scheduler thread owns the
+model and repeats:
+  1. admit queued requests while the batch has room: each one is prefilled on its own
+     and its KV cache is merged into the running batch (left-padded to a common length)
+  2. run ONE decode step for all active sequences together
+  3. retire the sequences that hit EOS, a stop string or max_new_tokens, or were cancelled
+
+A new request therefore starts decoding on the next step instead of waiting for the
+current ones to finish, and every forward pass is shared by the whole batch.
+metrics() reports throughput and queue depth.
+"""
+
+import queue
+import threading
+import time
+from collections import deque
+from typing import Dict, Iterator, List, Optional, Sequence, Union
+
+import torch
+from transformers import DynamicCache
+
+
+# ---------- KV cache helpers ----------
+def _layers(cache) -> List[tuple]:
+    """(keys, values) of every layer, each [batch, kv_heads, seq, head_dim]"""
+    if hasattr(cache, "layers"):
+        return [(layer.keys, layer.values) for layer in cache.layers]
+    return list(zip(cache.key_cache, cache.value_cache))
+
+
+def _cache_from_layers(layers: List[tuple]) -> DynamicCache:
+    cache = DynamicCache()
+    for i, (keys, values) in enumerate(layers):
+        cache.update(keys, values, i)
+    return cache
+
+
+def _left_pad(t: torch.Tensor, length: int, dim: int) -> torch.Tensor:
+    pad = length - t.shape[dim]
+    if pad <= 0:
+        return t
+    shape = list(t.shape)
+    shape[dim] = pad
+    return torch.cat([t.new_zeros(shape), t], dim=dim)
+
+
+def _sample(logits: torch.Tensor, temperature: float, top_p: float, generator: Optional[torch.Generator]) -> int:
+    """Next token from a [vocab] logits row: greedy for temperature <= 0, else temperature + nucleus sampling"""
+    if temperature <= 0:
+        return int(torch.argmax(logits))
+    probs = torch.softmax(logits.float().cpu() / temperature, dim=-1)
+    if top_p < 1.0:
+        sorted_probs, order = torch.sort(probs, descending=True)
+        keep = torch.cumsum(sorted_probs, dim=-1) - sorted_probs < top_p  # always keeps the top token
+        probs = torch.zeros_like(probs).scatter_(0, order[keep], sorted_probs[keep])
+    return int(torch.multinomial(probs, 1, generator=generator))
+
+
+class GenerationRequest:
+    """One generation request; tokens are published through stream() as they are decoded."""
+
+    def __init__(self, input_ids: Sequence[int], max_new_tokens: int, temperature: float = 0.0, top_p: float = 1.0,
+                 stop_strings: Sequence[str] = (), eos_token_ids: Sequence[int] = (), seed: Optional[int] = None):
+        if not len(input_ids):
+            raise ValueError("input_ids must not be empty")
+        self.input_ids = [int(t) for t in input_ids]
+        self.max_new_tokens = max_new_tokens
+        self.temperature = temperature
+        self.top_p = top_p
+        self.stop_strings = tuple(stop_strings)
+        self.eos_token_ids = set(eos_token_ids)
+        self.generator = torch.Generator().manual_seed(seed) if seed is not None else None
+        self.tokens: List[int] = []
+        self.finish_reason: Optional[str] = None  # "eos" | "stop" | "length" | "cancelled" | "error"
+        self.error: Optional[BaseException] = None
+        self.submitted_at = time.monotonic()
+        self.first_token_at: Optional[float] = None
+        self.finished_at: Optional[float] = None
+        self._events: "queue.Queue[Optional[int]]" = queue.Queue()
+        self._done = threading.Event()
+        self._cancelled = threading.Event()
+
+    @property
+    def done(self) -> bool:
+        return self._done.is_set()
+
+    def cancel(self):
+        """Stop generating at the next step (no-op once finished)"""
+        self._cancelled.set()
+
+    def wait(self, timeout: Optional[float] = None) -> List[int]:
+        """Block until finished and return the generated token ids"""
+        if not self._done.wait(timeout):
+            raise TimeoutError("generation did not finish in time")
+        if self.error is not None:
+            raise self.error
+        return self.tokens
+
+    def stream(self) -> Iterator[int]:
+        """Generated token ids, as they are produced"""
+        while True:
+            token = self._events.get()
+            if token is None:
+                break
+            yield token
+        if self.error is not None:
+            raise self.error
+
+    def stream_text(self, tokenizer) -> Iterator[str]:
+        """Newly decoded text, as tokens are produced (holds back incomplete multi-byte characters)"""
+        tokens, sent = [], ""
+        for token in self.stream():
+            tokens.append(token)
+            text = tokenizer.decode(tokens, skip_special_tokens=True)
+            if text.endswith("�") or len(text) <= len(sent):
+                continue
+            yield text[len(sent):]
+            sent = text
+
+    def _emit(self, token: int):
+        if self.first_token_at is None:
+            self.first_token_at = time.monotonic()
+        self.tokens.append(token)
+        self._events.put(token)
+
+    def _finish(self, reason: str, error: Optional[BaseException] = None):
+        self.finish_reason = reason
+        self.error = error
+        self.finished_at = time.monotonic()
+        self._events.put(None)
+        self._done.set()
+
+
+class ContinuousBatchingScheduler:
+    def __init__(self, model, tokenizer=None, max_batch_size: int = 8, max_new_tokens: int = 1024,
+                 lock: Optional[threading.Lock] = None, stop_window: int = 16):
+        """
+        Args:
+            model: A transformers causal LM (must accept position_ids and a 2-D attention mask)
+            tokenizer: Needed only for stop strings
+            max_batch_size: Most sequences decoded together; the rest wait in the queue
+            max_new_tokens: Default generation budget per request
+            lock: Held around every forward pass (share it with other users of the model)
+            stop_window: Trailing tokens decoded per step to look for stop strings
+        """
+        self.model = model
+        self.tokenizer = tokenizer
+        self.max_batch_size = max_batch_size
+        self.max_new_tokens = max_new_tokens
+        self.lock = lock or threading.Lock()
+        self.stop_window = stop_window
+
+        self._queue: "deque[GenerationRequest]" = deque()
+        self._cv = threading.Condition()
+        self._thread: Optional[threading.Thread] = None
+        self._running = False
+
+        # running batch: row i of the cache / mask belongs to self._active[i]
+        self._active: List[GenerationRequest] = []
+        self._cache: Optional[DynamicCache] = None
+        self._mask: Optional[torch.Tensor] = None  # [batch, cache_len], 0 = left padding
+        self._positions: List[int] = []  # next position id per row (= real tokens in its cache)
+
+        # metrics
+        self.submitted = 0
+        self.completed = 0
+        self.generated_tokens = 0
+        self.decode_steps = 0
+        self.batched_rows = 0
+        self.busy_seconds = 0.0
+        self.total_ttft = 0.0
+        self.started_at = time.monotonic()
+
+    # ---------- client API ----------
+    def submit(self, input_ids: Sequence[int], max_new_tokens: Optional[int] = None, temperature: float = 0.0,
+               top_p: float = 1.0, stop_strings: Sequence[str] = (),
+               eos_token_id: Union[int, Sequence[int], None] = None, seed: Optional[int] = None) -> GenerationRequest:
+        """Queue a prompt (token ids) for generation and return its request handle"""
+        if stop_strings and self.tokenizer is None:
+            raise ValueError("stop_strings need a tokenizer")
+        if eos_token_id is None:
+            eos_token_id = self.model.generation_config.eos_token_id
+        eos = [] if eos_token_id is None else [eos_token_id] if isinstance(eos_token_id, int) else list(eos_token_id)
+        request = GenerationRequest(input_ids, max_new_tokens or self.max_new_tokens, temperature, top_p,
+                                    stop_strings, eos, seed)
+        with self._cv:
+            self._queue.append(request)
+            self.submitted += 1
+            self._cv.notify()
+        return request
+
+    def generate(self, input_ids: Sequence[int], timeout: Optional[float] = None, **kwargs) -> List[int]:
+        """Submit and wait; drives the scheduler inline when no background thread is running"""
+        request = self.submit(input_ids, **kwargs)
+        if not self._running:
+            while not request.done:
+                self.step()
+        return request.wait(timeout)
+
+    def start(self) -> "ContinuousBatchingScheduler":
+        """Run the scheduling loop in a background thread"""
+        with self._cv:
+            if self._running:
+                return self
+            self._running = True
+        self._thread = threading.Thread(target=self._loop, name="inference-scheduler", daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        """Stop the loop; queued and running requests finish as cancelled"""
+        with self._cv:
+            self._running = False
+            self._cv.notify_all()
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
+        with self._cv:
+            pending, self._queue = list(self._queue), deque()
+        for request in pending + self._active:
+            request._finish("cancelled")
+        self._reset_batch()
+
+    def metrics(self) -> Dict[str, float]:
+        """Queue depth, batch occupancy and throughput since the scheduler was created"""
+        with self._cv:
+            queue_depth = len(self._queue)
+        return {
+            "queue_depth": queue_depth,
+            "active": len(self._active),
+            "submitted": self.submitted,
+            "completed": self.completed,
+            "generated_tokens": self.generated_tokens,
+            "decode_steps": self.decode_steps,
+            "mean_batch_size": self.batched_rows / self.decode_steps if self.decode_steps else 0.0,
+            "tokens_per_second": self.generated_tokens / self.busy_seconds if self.busy_seconds else 0.0,
+            "mean_time_to_first_token": self.total_ttft / self.completed if self.completed else 0.0,
+            "uptime_seconds": time.monotonic() - self.started_at,
+        }
+
+    # ---------- scheduling ----------
+    def _loop(self):
+        while True:
+            with self._cv:
+                while self._running and not self._queue and not self._active:
+                    self._cv.wait()
+                if not self._running:
+                    return
+            self.step()
+
+    def step(self) -> int:
+        """One scheduling iteration: admit queued requests, then one batched decode step. Returns the batch size."""
+        started = time.monotonic()
+        try:
+            with self.lock, torch.no_grad():
+                self._admit()
+                self._drop_finished()
+                if self._active:
+                    self._decode()
+                    self._drop_finished()
+        except Exception as e:
+            print(f"[WARNING] Inference step failed: {e}")
+            for request in self._active:
+                request._finish("error", e)
+            self._reset_batch()
+        self.busy_seconds += time.monotonic() - started
+        return len(self._active)
+
+    def _admit(self):
+        while len(self._active) < self.max_batch_size:
+            with self._cv:
+                if not self._queue:
+                    return
+                request = self._queue.popleft()
+            if request._cancelled.is_set():
+                request._finish("cancelled")
+                self._retire(request)
+                continue
+            try:
+                self._prefill(request)
+            except Exception as e:
+                request._finish("error", e)
+            if request.done:  # finished on its first token (or failed) without joining the batch
+                self._retire(request)
+
+    def _prefill(self, request: GenerationRequest):
+        device = self.model.device
+        input_ids = torch.tensor([request.input_ids], device=device)
+        output = self.model(input_ids, use_cache=True)
+        self._accept(request, _sample(output.logits[0, -1], request.temperature, request.top_p, request.generator))
+        if request.done:
+            return
+
+        # merge the new sequence into the running batch, left-padding to a common length
+        new_layers = _layers(output.past_key_values)
+        new_mask = torch.ones((1, input_ids.shape[1]), dtype=torch.long, device=device)
+        if self._cache is None:
+            layers, mask = new_layers, new_mask
+        else:
+            length = max(self._mask.shape[1], new_mask.shape[1])
+            layers = [
+                (torch.cat([_left_pad(k, length, 2), _left_pad(nk, length, 2)]),
+                 torch.cat([_left_pad(v, length, 2), _left_pad(nv, length, 2)]))
+                for (k, v), (nk, nv) in zip(_layers(self._cache), new_layers)
+            ]
+            mask = torch.cat([_left_pad(self._mask, length, 1), _left_pad(new_mask, length, 1)])
+        self._cache, self._mask = _cache_from_layers(layers), mask
+        self._active.append(request)
+        self._positions.append(len(request.input_ids))
+
+    def _decode(self):
+        device = self.model.device
+        last = torch.tensor([[request.tokens[-1]] for request in self._active], device=device)
+        mask = torch.cat([self._mask, torch.ones((len(self._active), 1), dtype=torch.long, device=device)], dim=1)
+        positions = torch.tensor([[p] for p in self._positions], device=device)
+        output = self.model(last, attention_mask=mask, position_ids=positions,
+                            past_key_values=self._cache, use_cache=True)
+        self._cache, self._mask = output.past_key_values, mask
+        self.decode_steps += 1
+        self.batched_rows += len(self._active)
+        for i, request in enumerate(self._active):
+            self._positions[i] += 1
+            if not request.done:
+                self._accept(request, _sample(output.logits[i, -1], request.temperature, request.top_p, request.generator))
+
+    def _accept(self, request: GenerationRequest, token: int):
+        """Record a sampled token and finish the request if it should stop"""
+        if request._cancelled.is_set():
+            request._finish("cancelled")
+            return
+        if token in request.eos_token_ids:
+            request._finish("eos")
+            return
+        request._emit(token)
+        self.generated_tokens += 1
+        if request.stop_strings:
+            tail = self.tokenizer.decode(request.tokens[-self.stop_window:], skip_special_tokens=True)
+            if any(stop in tail for stop in request.stop_strings):
+                request._finish("stop")
+                return
+        if len(request.tokens) >= request.max_new_tokens:
+            request._finish("length")
+
+    def _retire(self, request: GenerationRequest):
+        self.completed += 1
+        if request.first_token_at is not None:
+            self.total_ttft += request.first_token_at - request.submitted_at
+
+    def _drop_finished(self):
+        """Remove finished or cancelled rows from the batch and trim padding no row needs any more"""
+        keep = []
+        for i, request in enumerate(self._active):
+            if not request.done and request._cancelled.is_set():
+                request._finish("cancelled")
+            if request.done:
+                self._retire(request)
+            else:
+                keep.append(i)
+        if len(keep) == len(self._active):
+            return
+        if not keep:
+            self._reset_batch()
+            return
+        index = torch.tensor(keep, device=self._mask.device)
+        mask = self._mask[index]
+        start = int(mask.any(dim=0).long().argmax())  # first column some row still attends to
+        layers = [(k[index][:, :, start:], v[index][:, :, start:]) for k, v in _layers(self._cache)]
+        self._cache, self._mask = _cache_from_layers(layers), mask[:, start:]
+        self._active = [self._active[i] for i in keep]
+        self._positions = [self._positions[i] for i in keep]
+
+    def _reset_batch(self):
+        self._active, self._positions = [], []
+        self._cache = self._mask = None
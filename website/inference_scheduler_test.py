@@ -0,0 +1,78 @@
+import pytest
+
+torch = pytest.importorskip("torch")
+pytest.importorskip("transformers")
+from inference_scheduler import ContinuousBatchingScheduler
+
+PROMPTS = [[5, 17, 42], [9, 3, 3, 77, 120, 8, 61], [200], [44, 45, 46, 47, 48]]
+
+
+def greedy_reference(model, prompt, max_new_tokens):
+    tokens = list(prompt)
+    with torch.no_grad():
+        for _ in range(max_new_tokens):
+            logits = model(torch.tensor([tokens])).logits
+            tokens.append(int(logits[0, -1].argmax()))
+    return tokens[len(prompt):]
+
+
+def test_batched_greedy_matches_single_sequence(tiny_model):
+    model = tiny_model()
+    scheduler = ContinuousBatchingScheduler(model, max_batch_size=3)
+    lengths = [12, 5, 9, 7]
+    # staggered arrivals: requests join and leave the batch while others are mid-generation
+    requests = [scheduler.submit(PROMPTS[0], max_new_tokens=lengths[0], eos_token_id=[])]
+    scheduler.step()
+    scheduler.step()
+    requests += [scheduler.submit(p, max_new_tokens=n, eos_token_id=[]) for p, n in zip(PROMPTS[1:], lengths[1:])]
+    while not all(r.done for r in requests):
+        scheduler.step()
+    for request, prompt, n in zip(requests, PROMPTS, lengths):
+        assert request.finish_reason == "length"
+        assert request.tokens == greedy_reference(model, prompt, n)
+    metrics = scheduler.metrics()
+    assert metrics["completed"] == 4 and metrics["queue_depth"] == 0 and metrics["active"] == 0
+    assert metrics["generated_tokens"] == sum(lengths)
+    assert 1 < metrics["mean_batch_size"] <= 3
+
+
+def test_per_request_stopping_and_background_thread(tiny_model, char_tokenizer):
+    model = tiny_model()
+    tokenizer = char_tokenizer
+    tokenizer.eos_token_id = None  # raw token ids here: decode every one, one letter each
+    expected = greedy_reference(model, PROMPTS[1], 20)
+    stop = tokenizer.decode(expected[3:5])
+    first = tokenizer.decode(expected).index(stop)  # where the stop string first completes
+    scheduler = ContinuousBatchingScheduler(model, tokenizer, max_batch_size=4).start()
+    try:
+        stopped = scheduler.submit(PROMPTS[1], max_new_tokens=20, stop_strings=[stop], eos_token_id=[])
+        eos = scheduler.submit(PROMPTS[1], max_new_tokens=20, eos_token_id=expected[2])
+        streamed = scheduler.submit(PROMPTS[0], max_new_tokens=6, eos_token_id=[])
+        assert list(streamed.stream()) == greedy_reference(model, PROMPTS[0], 6)
+        assert stopped.wait(timeout=30) == expected[:first + 2]
+        assert stopped.finish_reason == "stop"
+        assert eos.wait(timeout=30) == expected[:2]
+        assert eos.finish_reason == "eos"
+    finally:
+        scheduler.stop()
+    assert scheduler.metrics()["tokens_per_second"] > 0
+
+
+def test_cancelled_request_leaves_the_batch(tiny_model):
+    model = tiny_model()
+    scheduler = ContinuousBatchingScheduler(model, max_batch_size=2)
+    keep = scheduler.submit(PROMPTS[0], max_new_tokens=8, eos_token_id=[])
+    cancel = scheduler.submit(PROMPTS[1], max_new_tokens=8, eos_token_id=[])
+    scheduler.step()
+    cancel.cancel()
+    scheduler.step()
+    assert cancel.done and cancel.finish_reason == "cancelled"
+    assert scheduler.metrics()["active"] == 1
+    assert scheduler.generate(PROMPTS[2], max_new_tokens=4, eos_token_id=[]) == greedy_reference(model, PROMPTS[2], 4)
+    while not keep.done:
+        scheduler.step()
+    assert keep.wait(timeout=0) == greedy_reference(model, PROMPTS[0], 8)
+
+
+if __name__ == "__main__":
+    pytest.main([__file__, "-q"])
@@ -0,0 +1,135 @@
+import os
+import threading
+import pytest
+import KeywordSearch
+from KeywordSearch import BM25, BM25Index, SparseBM25, get_index, keyword_search, load_id2text
+
+SAMPLE_XML = """<?xml version='1.0' encoding='utf-8'?>
+<Corpus>
+  <section id="A:facts">
+    <p id="A:facts:p1">The defendant was charged with assault and battery.</p>
+    <p id="A:facts:p2">The court adjourned the hearing without notice to the parties.</p>
+  </section>
+  <section id="B:holding">
+    <p id="B:holding:p1">Assault requires intent; the motion to adjourn was denied.</p>
+    <p id="B:holding:p2">Writ of certiorari granted. Judgment of the court of appeals reversed.</p>
+  </section>
+</Corpus>
+"""
+
+QUERIES = ["assault", "court adjourn notice", "certiorari court court", "intent motion", "nothing matches"]
+
+
+def write_sample(tmp_path) -> str:
+    path = tmp_path / "sample.xml"
+    path.write_text(SAMPLE_XML, encoding="utf-8")
+    return str(path)
+
+
+def test_index_matches_bm25(tmp_path):
+    xml = write_sample(tmp_path)
+    bm25 = BM25(load_id2text(xml))
+    index = BM25Index.open(xml)
+    for q in QUERIES:
+        assert index.search(q, topk=10) == bm25.search_exhaustive(q, topk=10)
+    assert index.text("A:facts:p1") == "The defendant was charged with assault and battery."
+    index.close()
+
+
+def test_maxscore_matches_exhaustive_scoring():
+    import random
+    rng = random.Random(7)
+    vocab = [f"t{i}" for i in range(40)]
+    id2text = {f"d{i}": " ".join(rng.choices(vocab, weights=range(40, 0, -1), k=rng.randint(1, 30))) for i in range(300)}
+    bm25 = BM25(id2text)
+    for _ in range(200):
+        q = " ".join(rng.choices(vocab, k=rng.randint(1, 5)))
+        for k in (1, 3, 10):
+            assert bm25.search(q, topk=k) == bm25.search_exhaustive(q, topk=k)
+
+
+def test_sparse_backend_matches_bm25(tmp_path):
+    pytest.importorskip("scipy")
+    xml = write_sample(tmp_path)
+    bm25 = BM25(load_id2text(xml))
+    backends = [SparseBM25(load_id2text(xml)), SparseBM25.from_index(get_index(xml))]
+    for sparse_bm25 in backends:
+        for q, hits in zip(QUERIES, sparse_bm25.search_batch(QUERIES, topk=10)):
+            expected = bm25.search(q, topk=10)
+            assert [pid for pid, _ in hits] == [pid for pid, _ in expected]
+            assert [s for _, s in hits] == pytest.approx([s for _, s in expected])
+    assert keyword_search(xml, "court adjourn", 2, backend="sparse") == keyword_search(xml, "court adjourn", 2)
+
+
+def test_index_rebuilt_when_xml_changes(tmp_path):
+    xml = write_sample(tmp_path)
+    assert "A:facts:p1" in keyword_search(xml, "battery", 3)
+    with open(xml, "w", encoding="utf-8") as f:
+        f.write(SAMPLE_XML.replace("battery", "robbery"))
+    os.utime(xml, ns=(0, 0))
+    assert 'num="0"' in keyword_search(xml, "battery", 3)
+    assert "A:facts:p1" in keyword_search(xml, "robbery", 3)
+
+
+def test_concurrent_builders_build_once(tmp_path, monkeypatch):
+    xml = write_sample(tmp_path)
+    parses = []
+    real_load = KeywordSearch.load_id2text
+    monkeypatch.setattr(KeywordSearch, "load_id2text", lambda path: parses.append(path) or real_load(path))
+    start = threading.Barrier(6)
+    results, errors = [], []
+
+    def open_and_search():
+        start.wait()
+        try:
+            results.append(BM25Index.open(xml).search("assault", topk=2))
+        except Exception as e:
+            errors.append(e)
+
+    threads = [threading.Thread(target=open_and_search) for _ in range(6)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    assert errors == [] and len(parses) == 1  # the others waited on the lock, then found it fresh
+    assert all(r == results[0] for r in results) and results[0]
+    BM25Index.build(xml)  # forced rebuild over an existing index swaps it in place
+    assert BM25Index.open(xml).search("assault", topk=2) == results[0]
+    assert sorted(os.listdir(tmp_path)) == ["sample.xml", "sample.xml.bm25", "sample.xml.bm25.lock"]
+
+
+def test_replaced_index_stays_readable_while_in_use(tmp_path):
+    xml = write_sample(tmp_path)
+    old = get_index(xml)
+    docs, _, _, _ = old.postings("assault")
+    held = list(docs)
+    with open(xml, "w", encoding="utf-8") as f:
+        f.write(SAMPLE_XML.replace("battery", "robbery"))
+    new = get_index(xml)  # no BufferError although a reader still holds old postings
+    assert new is not old and new.postings("robbery") is not None
+    assert list(docs) == held and old.search("assault", topk=2)
+
+
+def test_touched_xml_is_restamped_without_a_rebuild(tmp_path, monkeypatch):
+    import json
+    xml = write_sample(tmp_path)
+    index_dir = BM25Index.build(xml)
+    monkeypatch.setattr(KeywordSearch, "load_id2text", lambda path: pytest.fail("touched XML was re-parsed"))
+    st = os.stat(xml)
+    os.utime(xml, ns=(st.st_atime_ns, st.st_mtime_ns + 10**9))  # same content, new mtime
+    assert BM25Index.source_status(xml, index_dir) == "touched"
+    with open(os.path.join(index_dir, "meta.json"), encoding="utf-8") as f:
+        assert json.load(f)["source"]["mtime_ns"] == st.st_mtime_ns  # checking alone writes nothing
+    assert BM25Index.open(xml).search("assault", topk=2)
+    assert BM25Index.source_status(xml, index_dir) == "fresh"
+    assert sorted(os.listdir(index_dir)) == sorted(BM25Index.FILES)  # meta.json replaced, no temp file left
+
+
+if __name__ == "__main__":
+    import pathlib, tempfile
+    with tempfile.TemporaryDirectory() as d:
+        test_index_matches_bm25(pathlib.Path(d))
+        test_maxscore_matches_exhaustive_scoring()
+        test_sparse_backend_matches_bm25(pathlib.Path(d))
+        test_index_rebuilt_when_xml_changes(pathlib.Path(d))
+    print("ok")
@@ -0,0 +1,599 @@
+"""
+llm_backends.py
+
+The chat model behind RAGSystem, behind one small interface so the same agent loop
+runs against:
+  - "hf"         a local transformers model (prefix KV reuse, optional continuous batching,
+                 optional int8/int4 weight-only quantization for CPU-only nodes)
+  - "openai"     any OpenAI-compatible /v1/chat/completions server (vLLM, the training endpoint, a local stand-in)
+  - "llama_cpp"  a quantized GGUF model through llama-cpp-python, for CPU-only nodes
+
+Pick one with a config dict, e.g. {"backend": "openai", "base_url": "http://localhost:8000/v1"};
+get_backend() without a config reads it from the environment (see default_backend_config).
+"""
+
+import atexit
+import copy
+import json
+import os
+import sys
+import threading
+import time
+import weakref
+from typing import Dict, Iterator, Optional, Tuple
+
+import torch
+from transformers import AutoModelForCausalLM, AutoTokenizer, StoppingCriteria, StoppingCriteriaList, TextIteratorStreamer
+
+from inference_scheduler import ContinuousBatchingScheduler
+
+DEFAULT_MODEL_NAME = "Qwen/Qwen2.5-14B-Instruct"
+CPU_MODEL_NAME = "Qwen/Qwen2.5-3B-Instruct"  # default when device="cpu"
+QUANTIZATIONS = (None, "int8", "int4")
+GENERATION_DEFAULTS = {"max_new_tokens": 1024, "temperature": 0.7, "top_p": 0.9}
+STOP_TAGS = ("</tool>", "</answer>")
+
+
+class LLMBackend:
+    """
+    Streaming chat completion for the agent loop.
+
+    stream() is a generator: it yields text as it is produced and returns the full reply,
+    so callers use `reply = yield from backend.stream(messages)`.
+    """
+    name = "base"
+
+    def new_conversation(self, system_prompt: str):
+        """Per-query generation state passed back to stream() (None if the backend keeps none)"""
+        return None
+
+    def stream(self, messages: list, conversation=None) -> Iterator[str]:
+        raise NotImplementedError
+
+    def generate(self, messages: list, conversation=None) -> str:
+        stream = self.stream(messages, conversation)
+        while True:
+            try:
+                next(stream)
+            except StopIteration as done:
+                return done.value
+
+
+def close_stop_tag(text: str) -> str:
+    """
+    Closing tag a server cut off as a stop sequence ("" if none).
+    HTTP and llama.cpp servers drop the matched stop string; the agent loop needs it to parse the call.
+    """
+    for open_tag, close_tag in (("<tool>", "</tool>"), ("<answer>", "</answer>")):
+        if text.rfind(open_tag) > text.rfind(close_tag):
+            return close_tag
+    return ""
+
+
+# ---------- local transformers ----------
+class PrefixKVCache:
+    """
+    past_key_values of the last generated sequence, kept so the next turn only prefills new tokens.
+
+    Turns of one query only ever append to the conversation (assistant reply + tool result),
+    so the cache is cropped to the longest common token prefix and generate() feeds the rest.
+    """
+    def __init__(self):
+        self.token_ids = None  # 1-D tensor of the tokens the cache was built from
+        self.past_key_values = None
+
+    def reuse(self, input_ids: torch.Tensor):
+        """Cache cropped to the prefix it shares with input_ids (None if nothing is reusable)"""
+        if self.past_key_values is None:
+            return None
+        new_ids = input_ids[0]
+        n = min(len(self.token_ids), len(new_ids) - 1, self.past_key_values.get_seq_length())  # feed at least one token
+        if n <= 0:
+            return None
+        mismatch = (self.token_ids[:n] != new_ids[:n].to(self.token_ids.device)).nonzero()
+        if len(mismatch):
+            n = int(mismatch[0])
+        if n == 0:
+            self.clear()
+            return None
+        surplus = self.past_key_values.get_seq_length() - n
+        if surplus:
+            self.past_key_values.crop(-surplus)
+        return self.past_key_values
+
+    def update(self, sequence_ids: torch.Tensor, past_key_values):
+        self.token_ids = sequence_ids
+        self.past_key_values = past_key_values
+
+    def clear(self):
+        self.token_ids = None
+        self.past_key_values = None
+
+    def __len__(self) -> int:
+        return self.past_key_values.get_seq_length() if self.past_key_values is not None else 0
+
+
+class StopOnClosingTag(StoppingCriteria):
+    """
+    Ends generation as soon as the new text contains a closing </tool> or </answer> tag,
+    so a tool call is dispatched without waiting for max_new_tokens.
+
+    Only the last `window` tokens are decoded per step, which is enough to see a tag being completed.
+    """
+    STOP_TAGS = STOP_TAGS
+
+    def __init__(self, tokenizer, prompt_length: int, tags: tuple = STOP_TAGS, window: int = 16):
+        self.tokenizer = tokenizer
+        self.prompt_length = prompt_length
+        self.tags = tags
+        self.window = window
+
+    def __call__(self, input_ids: torch.LongTensor, scores: torch.FloatTensor, **kwargs) -> torch.BoolTensor:
+        start = max(self.prompt_length, input_ids.shape[1] - self.window)
+        tails = self.tokenizer.batch_decode(input_ids[:, start:], skip_special_tokens=True)
+        return torch.tensor([any(tag in tail for tag in self.tags) for tail in tails], dtype=torch.bool, device=input_ids.device)
+
+
+class StopOnEvent(StoppingCriteria):
+    """Ends generation once the event is set (the consumer of a token stream went away)"""
+    def __init__(self, event: threading.Event):
+        self.event = event
+
+    def __call__(self, input_ids: torch.LongTensor, scores: torch.FloatTensor, **kwargs) -> torch.BoolTensor:
+        return torch.full((input_ids.shape[0],), self.event.is_set(), dtype=torch.bool, device=input_ids.device)
+
+
+# Loaded models, their locks and schedulers are process-wide: every session shares them.
+_MODELS: Dict[Tuple, Tuple] = {}  # (model_name, device, quantization, attention) -> (tokenizer, model)
+_MODEL_LOCKS: "weakref.WeakKeyDictionary" = weakref.WeakKeyDictionary()  # model -> lock serializing its use
+_SCHEDULERS: "weakref.WeakKeyDictionary" = weakref.WeakKeyDictionary()  # model -> ContinuousBatchingScheduler
+_MODELS_LOCK = threading.Lock()
+
+
+def quantize_weights(model, quantization: Optional[str]):
+    """
+    Weight-only quantization of the Linear layers, in place where possible. Returns the model to use.
+
+    int8: torchao Int8WeightOnlyConfig; without torchao, stock PyTorch dynamic int8 quantization,
+          for a model on CPU only: it runs on CPU kernels and first upcasts the weights to float32,
+          so peak memory while quantizing is about twice the bfloat16 model.
+    int4: torchao Int4WeightOnlyConfig (packed kernels); on builds without them, 4-bit weights
+          stored unpacked (IntxWeightOnlyConfig), which saves less memory than packed int4.
+    """
+    if quantization not in QUANTIZATIONS:
+        raise ValueError(f"Unknown quantization {quantization!r}; expected one of {QUANTIZATIONS}")
+    if quantization is None:
+        return model
+    try:
+        from torchao.quantization import Int4WeightOnlyConfig, Int8WeightOnlyConfig, IntxWeightOnlyConfig, quantize_
+        from torchao.quantization.granularity import PerGroup
+    except ImportError:
+        if quantization == "int4":
+            raise ImportError("int4 quantization needs torchao (pip install torchao)")
+        if any(p.device.type != "cpu" for p in model.parameters()):
+            raise ImportError("int8 quantization of a model off the CPU needs torchao (pip install torchao)")
+        return torch.ao.quantization.quantize_dynamic(model.float(), {torch.nn.Linear}, dtype=torch.qint8)
+    if quantization == "int8":
+        quantize_(model, Int8WeightOnlyConfig())
+        return model
+    try:
+        quantize_(model, Int4WeightOnlyConfig(group_size=128))
+    except (ImportError, ValueError, NotImplementedError, RuntimeError) as e:
+        print(f"[WARNING] Packed int4 kernels unavailable ({e}); storing 4-bit weights unpacked")
+        quantize_(model, IntxWeightOnlyConfig(weight_dtype=torch.int4, granularity=PerGroup(32)))
+    return model
+
+
+def _tensor_bytes(t) -> int:
+    if isinstance(t, (tuple, list)):  # packed params of dynamically quantized Linear layers
+        return sum(_tensor_bytes(x) for x in t)
+    if not isinstance(t, torch.Tensor):
+        return 0
+    if type(t) is not torch.Tensor and hasattr(t, "__tensor_flatten__"):  # torchao quantized weights
+        names, _ = t.__tensor_flatten__()
+        return sum(_tensor_bytes(getattr(t, name)) for name in names)
+    return t.numel() * t.element_size()
+
+
+def model_memory_bytes(model) -> int:
+    """Bytes held by the weights and buffers of model (quantized storage counted as stored)"""
+    seen, total = set(), 0
+    for value in model.state_dict(keep_vars=True).values():
+        if id(value) not in seen:  # tied weights appear under several names
+            seen.add(id(value))
+            total += _tensor_bytes(value)
+    return total
+
+
+def peak_rss_bytes() -> Optional[int]:
+    """Peak resident set size of this process (None where there is no resource module, i.e. Windows)"""
+    try:
+        import resource
+    except ImportError:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return peak if sys.platform == "darwin" else peak * 1024  # macOS reports bytes, Linux KiB
+
+
+def benchmark_model(model, tokenizer, new_tokens: int = 32) -> Dict[str, float]:
+    """Memory footprint and greedy decode speed of a loaded model (a short generation on a fixed prompt)"""
+    input_ids = tokenizer.apply_chat_template(
+        [{"role": "user", "content": "Summarize the facts of Marbury v. Madison."}],
+        tokenize=True,
+        add_generation_prompt=True,
+        return_tensors="pt",
+        return_dict=True
+    )["input_ids"].to(model.device)
+    started = time.perf_counter()
+    with model_lock(model), torch.no_grad():
+        output = model.generate(input_ids, attention_mask=torch.ones_like(input_ids), max_new_tokens=new_tokens,
+                                min_new_tokens=new_tokens, do_sample=False)
+    seconds = time.perf_counter() - started
+    generated = output.shape[1] - input_ids.shape[1]
+    return {
+        "weights_bytes": model_memory_bytes(model),
+        "peak_rss_bytes": peak_rss_bytes(),
+        "tokens_per_second": generated / seconds if seconds else 0.0,
+    }
+
+
+def get_model(model_name: str = DEFAULT_MODEL_NAME, device: str = "auto", quantization: Optional[str] = None,
+              attn_implementation: Optional[str] = None) -> Tuple:
+    """
+    (tokenizer, model) for model_name, loaded on first use.
+
+    Args:
+        model_name: Hugging Face model id
+        device: "auto" (spread over the available GPUs) or "cpu"
+        quantization: None, "int8" or "int4" weight-only quantization (see quantize_weights)
+        attn_implementation: None = "sdpa" on CPU or when quantized, "eager" otherwise
+    """
+    if attn_implementation is None:
+        attn_implementation = "sdpa" if device == "cpu" or quantization else "eager"
+    key = (model_name, device, quantization, attn_implementation)
+    with _MODELS_LOCK:
+        if key not in _MODELS:
+            print(f"Loading {model_name} ({device}, {quantization or 'bfloat16'}, {attn_implementation} attention)...")
+            tokenizer = AutoTokenizer.from_pretrained(model_name)
+            model = AutoModelForCausalLM.from_pretrained(
+                model_name,
+                dtype=torch.bfloat16,
+                device_map=device,
+                attn_implementation=attn_implementation
+            )
+            _MODELS[key] = (tokenizer, quantize_weights(model, quantization))
+            print("✓ Model loaded successfully")
+        return _MODELS[key]
+
+
+def model_lock(model) -> threading.Lock:
+    """Lock held while a model runs, so sessions take turns on the shared weights and device memory"""
+    with _MODELS_LOCK:
+        if model not in _MODEL_LOCKS:
+            _MODEL_LOCKS[model] = threading.Lock()
+        return _MODEL_LOCKS[model]
+
+
+def get_scheduler(model, tokenizer, max_batch_size: int = 8) -> ContinuousBatchingScheduler:
+    """Continuous-batching scheduler for model, started on first use and shared by every session"""
+    lock = model_lock(model)
+    with _MODELS_LOCK:
+        if model not in _SCHEDULERS:
+            _SCHEDULERS[model] = ContinuousBatchingScheduler(model, tokenizer, max_batch_size=max_batch_size, lock=lock).start()
+            atexit.register(_SCHEDULERS[model].stop)
+        return _SCHEDULERS[model]
+
+
+# KV state of the (static) system prompt, prefilled once per loaded model and prompt text.
+# Every query starts from a deep copy, so concurrent sessions never share a mutable cache.
+_SYSTEM_PREFIXES: "weakref.WeakKeyDictionary" = weakref.WeakKeyDictionary()  # model -> {prompt: PrefixKVCache}
+_SYSTEM_PREFIXES_LOCK = threading.Lock()
+
+
+def system_prefix_cache(model, tokenizer, system_prompt: str) -> PrefixKVCache:
+    """Shared, read-only PrefixKVCache holding the prefilled system message of system_prompt"""
+    with _SYSTEM_PREFIXES_LOCK:
+        per_model = _SYSTEM_PREFIXES.setdefault(model, {})
+        if system_prompt not in per_model:
+            input_ids = tokenizer.apply_chat_template(
+                [{"role": "system", "content": system_prompt}],
+                tokenize=True,
+                return_tensors="pt",
+                return_dict=True
+            )["input_ids"].to(model.device)
+            with model_lock(model), torch.no_grad():
+                output = model(input_ids, use_cache=True)
+            prefix = PrefixKVCache()
+            prefix.update(input_ids[0], output.past_key_values)
+            per_model[system_prompt] = prefix
+            print(f"[KV] system prompt prefilled once: {input_ids.shape[1]} tokens")
+        return per_model[system_prompt]
+
+
+class HFLocalBackend(LLMBackend):
+    name = "hf"
+
+    def __init__(self, model_name: Optional[str] = None, reuse_kv_cache: bool = True, batching: bool = False,
+                 max_batch_size: int = 8, device: str = "auto", quantization: Optional[str] = None,
+                 attn_implementation: Optional[str] = None, startup_benchmark_tokens: int = 0,
+                 model=None, tokenizer=None, **generation):
+        """
+        Args:
+            model_name: Hugging Face model id, loaded once per process (see get_model);
+                        None = DEFAULT_MODEL_NAME, or the smaller CPU_MODEL_NAME when device="cpu"
+            reuse_kv_cache: Start each query from the shared system-prompt KV state and carry
+                            the KV cache between its turns
+            batching: Decode through the shared continuous-batching scheduler instead
+                      (prefix KV reuse does not apply on that path)
+            max_batch_size: Scheduler batch size when batching
+            device: "auto" (GPUs) or "cpu"
+            quantization: None, "int8" or "int4" weight-only quantization (e.g. for CPU-only nodes)
+            attn_implementation: None = "sdpa" on CPU or when quantized, "eager" otherwise
+            startup_benchmark_tokens: Also decode this many tokens after loading to report tokens/sec
+                                      (0 = skip; e.g. to check a quantized CPU setup). The weights
+                                      and peak RSS are always reported.
+            model, tokenizer: An already loaded model to use instead of model_name
+            **generation: Overrides for GENERATION_DEFAULTS
+        """
+        if model_name is None and model is not None:
+            model_name = model.config.name_or_path or type(model).__name__
+        elif model_name is None:
+            model_name = CPU_MODEL_NAME if device == "cpu" else DEFAULT_MODEL_NAME
+        if model is None:
+            tokenizer, model = get_model(model_name, device, quantization, attn_implementation)
+        self.model_name = model_name
+        self.tokenizer, self.model = tokenizer, model
+        self.lock = model_lock(model)
+        self.reuse_kv_cache = reuse_kv_cache
+        self.generation = {**GENERATION_DEFAULTS, **generation}
+        self.scheduler = get_scheduler(model, tokenizer, max_batch_size) if batching else None
+
+        if startup_benchmark_tokens:
+            self.startup_report = benchmark_model(model, tokenizer, startup_benchmark_tokens)
+        else:
+            self.startup_report = {"weights_bytes": model_memory_bytes(model), "peak_rss_bytes": peak_rss_bytes()}
+        peak = self.startup_report["peak_rss_bytes"]
+        speed = self.startup_report.get("tokens_per_second")
+        print(f"[LLM] {model_name} ({quantization or 'unquantized'}): "
+              f"weights {self.startup_report['weights_bytes'] / 2**30:.2f} GiB, "
+              f"peak RSS {f'{peak / 2**30:.2f} GiB' if peak is not None else 'n/a'}"
+              + (f", {speed:.1f} tokens/sec" if speed is not None else ""))
+
+    def new_conversation(self, system_prompt: str) -> Optional[PrefixKVCache]:
+        """Private copy of the shared system-prompt KV state"""
+        if not self.reuse_kv_cache or self.scheduler is not None:
+            return None
+        return copy.deepcopy(system_prefix_cache(self.model, self.tokenizer, system_prompt))
+
+    def stream(self, messages: list, conversation: Optional[PrefixKVCache] = None) -> Iterator[str]:
+        """Generate the reply to messages; with a conversation, only tokens added since its last turn are prefilled"""
+        input_ids = self.tokenizer.apply_chat_template(
+            messages,
+            tokenize=True,
+            add_generation_prompt=True,
+            return_tensors="pt",
+            return_dict=True
+        )["input_ids"].to(self.model.device)
+
+        if self.scheduler is not None:
+            return (yield from self._stream_batched(input_ids))
+
+        past_key_values = conversation.reuse(input_ids) if conversation is not None else None
+        if past_key_values is not None:
+            print(f"[KV] reusing {len(conversation)} cached tokens, prefilling {input_ids.shape[1] - len(conversation)}")
+
+        # generate() runs in a worker thread and hands decoded text over through the streamer
+        streamer = TextIteratorStreamer(self.tokenizer, skip_prompt=True, skip_special_tokens=True)
+        cancelled = threading.Event()
+        result = {}
+
+        def run():
+            try:
+                with self.lock, torch.no_grad():
+                    result["output"] = self.model.generate(
+                        input_ids,
+                        attention_mask=torch.ones_like(input_ids),
+                        past_key_values=past_key_values,
+                        max_new_tokens=self.generation["max_new_tokens"],
+                        temperature=self.generation["temperature"],
+                        top_p=self.generation["top_p"],
+                        eos_token_id=self.tokenizer.eos_token_id,
+                        stopping_criteria=StoppingCriteriaList([
+                            StopOnClosingTag(self.tokenizer, input_ids.shape[1]),
+                            StopOnEvent(cancelled)
+                        ]),
+                        streamer=streamer,
+                        return_dict_in_generate=True
+                    )
+            except Exception as e:
+                result["error"] = e
+                streamer.end()
+
+        worker = threading.Thread(target=run, daemon=True)
+        worker.start()
+        try:
+            for text in streamer:
+                if text:
+                    yield text
+        finally:
+            cancelled.set()  # no-op if generation already finished
+            worker.join()
+
+        if "error" in result:
+            raise result["error"]
+        output = result["output"]
+        if conversation is not None:
+            conversation.update(output.sequences[0], output.past_key_values)
+
+        # Decode just the new tokens (the assistant's response part)
+        return self.tokenizer.decode(output.sequences[0, input_ids.shape[1]:], skip_special_tokens=True).strip()
+
+    def _stream_batched(self, input_ids: torch.Tensor) -> Iterator[str]:
+        """stream() through the shared scheduler: this sequence joins the running batch"""
+        request = self.scheduler.submit(
+            input_ids[0].tolist(),
+            max_new_tokens=self.generation["max_new_tokens"],
+            temperature=self.generation["temperature"],
+            top_p=self.generation["top_p"],
+            stop_strings=STOP_TAGS,
+            eos_token_id=self.tokenizer.eos_token_id
+        )
+        try:
+            yield from request.stream_text(self.tokenizer)
+        finally:
+            request.cancel()  # no-op if generation already finished
+        return self.tokenizer.decode(request.wait(), skip_special_tokens=True).strip()
+
+
+# ---------- OpenAI-compatible HTTP ----------
+class OpenAICompatibleBackend(LLMBackend):
+    name = "openai"
+
+    def __init__(self, base_url: str = "http://localhost:8000/v1", model: str = DEFAULT_MODEL_NAME,
+                 api_key: str = "EMPTY", timeout: float = 120.0, **generation):
+        """
+        Args:
+            base_url: Server root including /v1 (vLLM, llama.cpp server, the training endpoint, ...)
+            model: Model name the server knows the model by
+            api_key: Bearer token ("EMPTY" for local servers)
+            timeout: Per-request timeout in seconds
+            **generation: Overrides for GENERATION_DEFAULTS
+        """
+        from openai import OpenAI
+        self.client = OpenAI(base_url=base_url, api_key=api_key, timeout=timeout)
+        self.model = model
+        self.generation = {**GENERATION_DEFAULTS, **generation}
+
+    def stream(self, messages: list, conversation=None) -> Iterator[str]:
+        response = self.client.chat.completions.create(
+            model=self.model,
+            messages=messages,
+            stream=True,
+            stop=list(STOP_TAGS),
+            max_tokens=self.generation["max_new_tokens"],
+            temperature=self.generation["temperature"],
+            top_p=self.generation["top_p"]
+        )
+        parts, finish_reason = [], None
+        try:
+            for chunk in response:
+                if not chunk.choices:
+                    continue
+                choice = chunk.choices[0]
+                if choice.delta.content:
+                    parts.append(choice.delta.content)
+                    yield choice.delta.content
+                finish_reason = choice.finish_reason or finish_reason
+        finally:
+            response.close()
+        text = "".join(parts)
+        tag = close_stop_tag(text) if finish_reason == "stop" else ""
+        if tag:
+            yield tag
+        return (text + tag).strip()
+
+
+# ---------- llama.cpp ----------
+class LlamaCppBackend(LLMBackend):
+    name = "llama_cpp"
+
+    def __init__(self, model_path: str, n_ctx: int = 8192, n_threads: Optional[int] = None, n_gpu_layers: int = 0,
+                 chat_format: Optional[str] = None, **generation):
+        """
+        Args:
+            model_path: Quantized GGUF file (e.g. a Q4_K_M build of the agent model)
+            n_ctx: Context window in tokens
+            n_threads: CPU threads (None = llama.cpp default)
+            n_gpu_layers: Layers to offload to a GPU (0 = CPU only)
+            chat_format: Override the chat template stored in the GGUF
+            **generation: Overrides for GENERATION_DEFAULTS
+        """
+        from llama_cpp import Llama, LlamaRAMCache
+        self.llm = Llama(model_path=model_path, n_ctx=n_ctx, n_threads=n_threads, n_gpu_layers=n_gpu_layers,
+                         chat_format=chat_format, verbose=False)
+        self.llm.set_cache(LlamaRAMCache())  # reuses the KV state of the longest matching prompt prefix
+        self.lock = threading.Lock()  # one llama.cpp context serves one request at a time
+        self.generation = {**GENERATION_DEFAULTS, **generation}
+
+    def stream(self, messages: list, conversation=None) -> Iterator[str]:
+        parts, finish_reason = [], None
+        with self.lock:
+            for chunk in self.llm.create_chat_completion(
+                messages=messages,
+                stream=True,
+                stop=list(STOP_TAGS),
+                max_tokens=self.generation["max_new_tokens"],
+                temperature=self.generation["temperature"],
+                top_p=self.generation["top_p"]
+            ):
+                choice = chunk["choices"][0]
+                content = choice["delta"].get("content")
+                if content:
+                    parts.append(content)
+                    yield content
+                finish_reason = choice.get("finish_reason") or finish_reason
+        text = "".join(parts)
+        tag = close_stop_tag(text) if finish_reason == "stop" else ""
+        if tag:
+            yield tag
+        return (text + tag).strip()
+
+
+# ---------- selection ----------
+BACKENDS = {"hf": HFLocalBackend, "openai": OpenAICompatibleBackend, "llama_cpp": LlamaCppBackend}
+
+_BACKENDS: Dict[str, LLMBackend] = {}
+_BACKENDS_LOCK = threading.Lock()
+
+
+def default_backend_config() -> dict:
+    """
+    Backend config from the environment:
+      RAG_LLM_BACKEND           hf (default) | openai | llama_cpp
+      RAG_LLM_MODEL             model name (hf, openai)
+      RAG_LLM_DEVICE            auto | cpu (hf)
+      RAG_LLM_QUANTIZATION      int8 | int4 (hf)
+      RAG_LLM_BATCHING          1 = decode every session through one continuous-batching scheduler (hf)
+      RAG_LLM_MAX_BATCH_SIZE    sequences per scheduler step, default 8 (hf)
+      RAG_LLM_BENCHMARK_TOKENS  tokens to decode at startup for a tokens/sec report, default 0 = off (hf)
+      RAG_LLM_BASE_URL          server URL (openai)
+      RAG_LLM_API_KEY           bearer token (openai)
+      RAG_LLM_MODEL_PATH        GGUF file (llama_cpp)
+    """
+    backend = os.environ.get("RAG_LLM_BACKEND", "hf")
+    config = {"backend": backend}
+    if backend == "hf":
+        for option, var in (("model_name", "RAG_LLM_MODEL"), ("device", "RAG_LLM_DEVICE"), ("quantization", "RAG_LLM_QUANTIZATION")):
+            if var in os.environ:
+                config[option] = os.environ[var]
+        if "RAG_LLM_BATCHING" in os.environ:
+            config["batching"] = os.environ["RAG_LLM_BATCHING"].strip().lower() in ("1", "true", "yes", "on")
+        for option, var in (("max_batch_size", "RAG_LLM_MAX_BATCH_SIZE"), ("startup_benchmark_tokens", "RAG_LLM_BENCHMARK_TOKENS")):
+            if var in os.environ:
+                config[option] = int(os.environ[var])
+    elif backend == "openai":
+        for option, var in (("model", "RAG_LLM_MODEL"), ("base_url", "RAG_LLM_BASE_URL"), ("api_key", "RAG_LLM_API_KEY")):
+            if var in os.environ:
+                config[option] = os.environ[var]
+    elif backend == "llama_cpp":
+        config["model_path"] = os.environ.get("RAG_LLM_MODEL_PATH", "")
+    return config
+
+
+def create_backend(config: dict) -> LLMBackend:
+    """Build the backend described by config ({"backend": name, **constructor options})"""
+    options = dict(config)
+    name = options.pop("backend", "hf")
+    if name not in BACKENDS:
+        raise ValueError(f"Unknown LLM backend {name!r}; expected one of {sorted(BACKENDS)}")
+    return BACKENDS[name](**options)
+
+
+def get_backend(config: Optional[dict] = None) -> LLMBackend:
+    """Process-wide backend for config (default_backend_config() if None), created on first use"""
+    config = config if config is not None else default_backend_config()
+    key = json.dumps(config, sort_keys=True)
+    with _BACKENDS_LOCK:
+        if key not in _BACKENDS:
+            _BACKENDS[key] = create_backend(config)
+        return _BACKENDS[key]
@@ -0,0 +1,157 @@
+import json
+import sys
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import pytest
+
+torch = pytest.importorskip("torch")
+pytest.importorskip("transformers")
+from llm_backends import (HFLocalBackend, close_stop_tag, create_backend, default_backend_config, model_memory_bytes,
+                          quantize_weights)
+
+
+@pytest.fixture
+def tiny_backend(tiny_model, char_tokenizer):
+    """Factory: tiny_backend(**options) -> HFLocalBackend over a fresh tiny model"""
+    def make(**options):
+        return HFLocalBackend(model=tiny_model(), tokenizer=char_tokenizer, max_new_tokens=24, **options)
+    return make
+
+
+def drain(stream):
+    """(chunks yielded, value returned) of a backend stream"""
+    chunks = []
+    while True:
+        try:
+            chunks.append(next(stream))
+        except StopIteration as done:
+            return chunks, done.value
+
+
+def run_turns(backend, system_prompt):
+    """Three agent turns; returns (streamed text, returned reply) per turn"""
+    conversation = backend.new_conversation(system_prompt)
+    messages = [{"role": "system", "content": system_prompt}, {"role": "user", "content": "question"}]
+    turns = []
+    for i in range(3):
+        chunks, reply = drain(backend.stream(messages, conversation))
+        turns.append(("".join(chunks), reply))
+        messages += [{"role": "assistant", "content": reply}, {"role": "user", "content": f"tool result {i}"}]
+    return turns
+
+
+def test_close_stop_tag():
+    assert close_stop_tag('<think>x</think>\n<tool>\n{"name": "keyword_search"}\n') == "</tool>"
+    assert close_stop_tag("<answer>\nyes\n<sources></sources>\n") == "</answer>"
+    assert close_stop_tag("<tool>{}</tool> done") == ""
+    assert close_stop_tag("no tags") == ""
+
+
+def test_hf_backend_kv_reuse_matches_fresh_prefill(tiny_backend):
+    system_prompt = "You are a legal research assistant. " * 4
+    reused = run_turns(tiny_backend(reuse_kv_cache=True), system_prompt)
+    fresh = run_turns(tiny_backend(reuse_kv_cache=False), system_prompt)
+    assert [reply for _, reply in reused] == [reply for _, reply in fresh]
+    for streamed, reply in reused:
+        assert streamed.strip() == reply
+
+
+def test_int8_backend_reports_footprint_and_speed(tiny_model, char_tokenizer, tiny_backend):
+    full = tiny_model(hidden_size=256)
+    quantized = quantize_weights(tiny_model(hidden_size=256), "int8")
+    assert model_memory_bytes(quantized) < model_memory_bytes(full) / 2
+    backend = HFLocalBackend(model=quantized, tokenizer=char_tokenizer, max_new_tokens=8, startup_benchmark_tokens=8)
+    assert backend.startup_report["weights_bytes"] == model_memory_bytes(quantized)
+    assert backend.startup_report["tokens_per_second"] > 0
+    assert len(backend.generate([{"role": "user", "content": "q"}])) > 0
+    report = tiny_backend().startup_report
+    assert report["weights_bytes"] > 0 and "tokens_per_second" not in report  # the decode benchmark is opt-in
+
+
+def test_int8_without_torchao_is_cpu_only(tiny_model, monkeypatch):
+    monkeypatch.setitem(sys.modules, "torchao.quantization", None)  # import fails as if torchao were missing
+    quantized = quantize_weights(tiny_model(), "int8")
+    assert isinstance(quantized.model.layers[0].mlp.up_proj, torch.ao.nn.quantized.dynamic.Linear)
+    with pytest.raises(ImportError, match="torchao"):
+        quantize_weights(tiny_model().to("meta"), "int8")
+
+
+def test_hf_options_from_environment(monkeypatch):
+    monkeypatch.setenv("RAG_LLM_BACKEND", "hf")
+    for var in ("RAG_LLM_BATCHING", "RAG_LLM_MAX_BATCH_SIZE", "RAG_LLM_BENCHMARK_TOKENS"):
+        monkeypatch.delenv(var, raising=False)
+    assert default_backend_config() == {"backend": "hf"}
+    monkeypatch.setenv("RAG_LLM_BATCHING", "1")
+    monkeypatch.setenv("RAG_LLM_MAX_BATCH_SIZE", "4")
+    monkeypatch.setenv("RAG_LLM_BENCHMARK_TOKENS", "16")
+    assert default_backend_config() == {"backend": "hf", "batching": True, "max_batch_size": 4, "startup_benchmark_tokens": 16}
+
+
+def test_batching_backend_matches_unbatched_decode(tiny_backend):
+    unbatched = tiny_backend()
+    batched = tiny_backend(batching=True, max_batch_size=4, temperature=0.0)
+    assert batched.scheduler is not None and batched.new_conversation("system") is None
+    prompts = [[{"role": "user", "content": f"question {i}" * (i + 1)}] for i in range(4)]
+    expected = [unbatched.generate(p) for p in prompts]
+
+    # concurrent sessions share the scheduler's batch
+    results = [None] * len(prompts)
+
+    def session(i):
+        results[i] = drain(batched.stream(prompts[i]))
+
+    threads = [threading.Thread(target=session, args=(i,)) for i in range(len(prompts))]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join(60)
+    for (chunks, reply), reference in zip(results, expected):
+        assert reply == reference
+        assert "".join(chunks).strip() == reply
+    metrics = batched.scheduler.metrics()
+    assert metrics["submitted"] == len(prompts) and metrics["mean_batch_size"] > 1
+
+
+def test_unknown_backend_rejected():
+    with pytest.raises(ValueError):
+        create_backend({"backend": "nope"})
+
+
+class ChatCompletionsHandler(BaseHTTPRequestHandler):
+    """Streams a fixed tool call and, like real servers, drops the matched stop sequence"""
+    REPLY = ['<think>look it up</think>\n', '<tool>\n{"name": "keyword_search", ', '"args": {"query": "assault"}}\n']
+
+    def do_POST(self):
+        body = json.loads(self.rfile.read(int(self.headers["Content-Length"])))
+        assert body["stream"] and "</tool>" in body["stop"]
+        self.send_response(200)
+        self.send_header("Content-Type", "text/event-stream")
+        self.end_headers()
+        for text in self.REPLY + [None]:
+            chunk = {"id": "c", "object": "chat.completion.chunk", "created": 0, "model": body["model"],
+                     "choices": [{"index": 0, "delta": {"content": text} if text else {},
+                                  "finish_reason": None if text else "stop"}]}
+            self.wfile.write(f"data: {json.dumps(chunk)}\n\n".encode())
+        self.wfile.write(b"data: [DONE]\n\n")
+
+    def log_message(self, *args):
+        pass
+
+
+def test_openai_backend_streams_and_restores_stop_tag():
+    pytest.importorskip("openai")
+    server = ThreadingHTTPServer(("127.0.0.1", 0), ChatCompletionsHandler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    try:
+        backend = create_backend({"backend": "openai", "base_url": f"http://127.0.0.1:{server.server_port}/v1", "model": "m"})
+        chunks, reply = drain(backend.stream([{"role": "user", "content": "q"}]))
+        assert chunks[-1] == "</tool>"
+        assert reply == "".join(chunks).strip()
+        assert reply.endswith('{"query": "assault"}}\n</tool>')
+    finally:
+        server.shutdown()
+
+
+if __name__ == "__main__":
+    pytest.main([__file__, "-q"])
@@ -1,40 +1,113 @@
 import json
 import re
-import sys
-from typing import Optional
-from transformers import AutoModelForCausalLM, AutoTokenizer
-import torch
+from concurrent.futures import ThreadPoolExecutor
+from typing import Iterator, List, Optional, Union
 
 # Import the three tool functions
-from semantic_search import FAISSSemanticSearch
-from KeywordSearch import keyword_search
-from ReadDocumentPart import read_document_part
+from semantic_search import FAISSSemanticSearch, get_searcher, warmup
+from DocumentStore import get_store
+from ToolCache import DEFAULT_TOOL_CACHE
+from llm_backends import LLMBackend, get_backend
+
+
+# ---------- process-wide resources ----------
+# The LLM backend (see llm_backends), the semantic search engine and the document store are loaded
+# once per process and shared by every RAGSystem (one per chat session); only conversation state is per instance.
+
+# Tool calls of one turn run concurrently on this pool (shared by all sessions)
+TOOL_POOL = ThreadPoolExecutor(max_workers=8, thread_name_prefix="rag-tool")
+
+
+# ---------- tool arguments ----------
+TOOL_NAMES = ("semantic_search", "keyword_search", "read_document_part")
+MAX_RESULTS = 20  # most results a search tool call may ask for
+
+
+def canonical_tool_args(tool_name: str, args: dict) -> dict:
+    """
+    Validated tool args with defaults filled in and model-written values coerced (e.g. "n": "3"),
+    so {"query": "x"} and {"query": "x", "n": 3} share a cache entry.
+    Raises ValueError with a message the model can act on.
+    """
+    if not isinstance(args, dict):
+        raise ValueError(f"args must be a JSON object, got {type(args).__name__}")
+    if tool_name in ("semantic_search", "keyword_search"):
+        query = args.get("query")
+        if not isinstance(query, (str, int, float)) or isinstance(query, bool) or not str(query).strip():
+            raise ValueError('"query" must be a non-empty string')
+        n = args.get("n", 3)
+        try:
+            n = int(n) if not isinstance(n, bool) and float(n) == int(float(n)) else None
+        except (TypeError, ValueError, OverflowError):
+            n = None
+        if n is None or not 1 <= n <= MAX_RESULTS:
+            raise ValueError(f'"n" must be an integer from 1 to {MAX_RESULTS}, got {args.get("n")!r}')
+        return {"query": str(query).strip(), "n": n}
+    if tool_name == "read_document_part":
+        part_id = args.get("part_id")
+        if not isinstance(part_id, str) or not part_id.strip():
+            raise ValueError('"part_id" must be a non-empty string such as "doc_id.section.subsection"')
+        wrap = args.get("wrap", True)
+        if isinstance(wrap, str) and wrap.strip().lower() in ("true", "false"):
+            wrap = wrap.strip().lower() == "true"
+        if not isinstance(wrap, bool):
+            raise ValueError(f'"wrap" must be true or false, got {wrap!r}')
+        return {"part_id": part_id.strip(), "wrap": wrap}
+    raise ValueError(f"Unknown tool: {tool_name}")
+
+
+def get_semantic_search(chroma_path: str = "./eunomia_db", warm: bool = False) -> Optional[FAISSSemanticSearch]:
+    """Shared semantic search engine (semantic_search.get_searcher); None if it could not be initialized, retried on the next call"""
+    try:
+        return warmup(chroma_path=chroma_path) if warm else get_searcher(chroma_path=chroma_path)
+    except Exception as e:
+        print(f"[WARNING] Could not initialize semantic search: {e}")
+        return None
+
+
+def load_resources(backend: Optional[dict] = None, xml_file: str = "./normalized_enhanced.xml") -> dict:
+    """Load everything RAGSystem needs up front (e.g. once at server start) and report what is available"""
+    llm = get_backend(backend)
+    try:
+        store = get_store(xml_file)
+    except Exception as e:
+        print(f"[WARNING] Could not open document store: {e}")
+        store = None
+    return {"llm": llm, "semantic_search": get_semantic_search(warm=True), "store": store}
+
 
 class RAGSystem:
-    def __init__(self, max_turns: int = 5, xml_file: str = "./normalized_enhanced.xml"):
+    def __init__(self, max_turns: int = 5, xml_file: str = "./normalized_enhanced.xml",
+                 backend: Union[LLMBackend, dict, None] = None, max_tool_calls: int = 4):
+        """
+        Per-session conversation state on top of the process-wide LLM backend, search engine and store.
+        
+        Args:
+            max_turns: Tool-calling turns before the final answer is forced
+            xml_file: Corpus XML behind keyword search and part reads
+            backend: An LLMBackend, a backend config such as {"backend": "openai", "base_url": ...},
+                     or None for the config in the environment (local Qwen2.5-14B-Instruct by default)
+            max_tool_calls: Tool calls the model may make in one turn (they run in parallel)
+        """
         self.max_turns = max_turns
+        self.max_tool_calls = max_tool_calls
         self.xml_file = xml_file
-        self.state = ""  # Accumulated context from tool outputs
         self.tool_outputs = []
+        self.tool_cache = DEFAULT_TOOL_CACHE
+        self.conversation = None  # backend generation state (e.g. KV cache) carried between the turns of one query
         
-        # Initialize tools
+        # Initialize tools (shared across sessions)
+        self.semantic_search_engine = get_semantic_search()
+        
+        # One in-process corpus store backs keyword search and part reads
         try:
-            self.semantic_search_engine = FAISSSemanticSearch()
+            self.store = get_store(xml_file)
         except Exception as e:
-            print(f"[WARNING] Could not initialize semantic search: {e}")
-            self.semantic_search_engine = None
+            print(f"[WARNING] Could not open document store: {e}")
+            self.store = None
         
-        # Initialize Qwen2.5-14B-Instruct
-        print("Loading Qwen2.5-14B-Instruct...")
-        model_name = "Qwen/Qwen2.5-14B-Instruct"
-        self.tokenizer = AutoTokenizer.from_pretrained(model_name)
-        self.model = AutoModelForCausalLM.from_pretrained(
-            model_name,
-            dtype=torch.bfloat16,
-            device_map="auto",
-            attn_implementation="eager"
-        )
-        print("✓ Model loaded successfully")
+        # Initialize the chat model (shared across sessions)
+        self.llm = backend if isinstance(backend, LLMBackend) else get_backend(backend)
     
     def semantic_search(self, query: str, n: int = 3) -> str:
         """Semantic search using FAISS + embeddings"""
@@ -48,47 +121,83 @@ class RAGSystem:
     
     def keyword_search_tool(self, query: str, n: int = 3) -> str:
         """Keyword search using BM25"""
+        if not self.store:
+            return '{"error": "Document store not initialized"}'
         try:
-            result = keyword_search(self.xml_file, query, n=n)
+            result = self.store.keyword_search(query, n=n)
             return result
         except Exception as e:
             return json.dumps({"error": str(e)})
     
-    def read_document_part_tool(self, part_id: str, wrap: bool = True, stream: bool = False) -> str:
+    def read_document_part_tool(self, part_id: str, wrap: bool = True) -> str:
         """Read a specific document part by ID"""
+        if not self.store:
+            return '{"error": "Document store not initialized"}'
         try:
-            result = read_document_part(self.xml_file, part_id, wrap=wrap, stream=stream)
+            result = self.store.read_part(part_id, wrap=wrap)
             return result
         except Exception as e:
             return json.dumps({"error": str(e)})
     
-    def execute_tool(self, tool_name: str, args: dict) -> str:
-        """Execute the specified tool and return result"""
+    def tool_version(self, tool_name: str) -> Optional[str]:
+        """Version stamp of the data a tool answers from (None if the tool is unavailable)"""
+        if tool_name == "semantic_search":
+            return self.semantic_search_engine.index_version if self.semantic_search_engine else None
+        return self.store.version() if self.store else None
+    
+    def _run_tool(self, tool_name: str, args: dict) -> str:
         if tool_name == "semantic_search":
-            return self.semantic_search(args.get("query", ""), args.get("n", 3))
+            return self.semantic_search(args["query"], args["n"])
         elif tool_name == "keyword_search":
-            return self.keyword_search_tool(args.get("query", ""), args.get("n", 3))
-        elif tool_name == "read_document_part":
-            return self.read_document_part_tool(
-                args.get("part_id", ""),
-                args.get("wrap", True),
-                args.get("stream", False)
-            )
+            return self.keyword_search_tool(args["query"], args["n"])
         else:
+            return self.read_document_part_tool(args["part_id"], args["wrap"])
+    
+    def execute_tool(self, tool_name: str, args: dict) -> str:
+        """Execute the specified tool and return result (memoized in the shared tool cache)"""
+        if tool_name not in TOOL_NAMES:
             return json.dumps({"error": f"Unknown tool: {tool_name}"})
+        try:
+            canonical = canonical_tool_args(tool_name, args)
+        except ValueError as e:
+            return json.dumps({"error": f"Invalid call to {tool_name}: {e}"})
+        
+        version = self.tool_version(tool_name)
+        if version is None:
+            return self._run_tool(tool_name, canonical)
+        return self.tool_cache.get_or_compute(tool_name, canonical, version, lambda: self._run_tool(tool_name, canonical))
     
-    def parse_tool_call(self, response: str) -> Optional[dict]:
-        """Extract tool call from model response"""
-        tool_pattern = r'<tool>\s*({.*?})\s*</tool>'
-        match = re.search(tool_pattern, response, re.DOTALL)
-        if match:
+    def execute_tools(self, tool_calls: List[dict]) -> List[str]:
+        """Execute the tool calls of one turn concurrently; results come back in call order"""
+        def run(tool_call: dict) -> str:
             try:
-                return json.loads(match.group(1))
+                return self.execute_tool(tool_call["name"], tool_call.get("args", {}))
+            except Exception as e:
+                return json.dumps({"error": str(e)})
+        
+        if len(tool_calls) == 1:
+            return [run(tool_calls[0])]
+        return list(TOOL_POOL.map(run, tool_calls))
+    
+    def parse_tool_calls(self, response: str) -> List[dict]:
+        """Extract the tool calls from model response: one object or a JSON list of them per <tool> block"""
+        calls = []
+        for block in re.findall(r'<tool>\s*(.*?)\s*</tool>', response, re.DOTALL):
+            try:
+                payload = json.loads(block)
             except json.JSONDecodeError:
-                return None
-        return None
+                continue
+            calls.extend(payload if isinstance(payload, list) else [payload])
+        return [call for call in calls if isinstance(call, dict) and "name" in call][:self.max_tool_calls]
+    
+    def parse_tool_call(self, response: str) -> Optional[dict]:
+        """Extract the first tool call from model response"""
+        tool_calls = self.parse_tool_calls(response)
+        return tool_calls[0] if tool_calls else None
     
     def format_system_prompt(self) -> str:
+        # Kept free of per-query content so its KV state can be shared (see system_prefix_cache);
+        # tool results reach the model as message turns instead.
         return f"""You are a helpful RAG assistant specializing in legal document analysis. You have access to three tools:
 
 1. **semantic_search**: Find documents semantically similar to a query
@@ -100,9 +209,10 @@ class RAGSystem:
 3. **read_document_part**: Retrieve a specific document section by ID
    - args: {{"part_id": "doc_id.section.subsection"}}
 
-You may call one tool per turn, for up to {self.max_turns} turns, before giving your final answer.
+You may call up to {self.max_tool_calls} tools per turn, for up to {self.max_turns} turns, before giving your final answer.
+Tools called in the same turn run in parallel, so request everything you already know you need at once.
 
-In each turn, analyze what information you need and respond with EITHER a tool call OR your final answer.
+In each turn, analyze what information you need and respond with EITHER tool calls OR your final answer.
 
 For tool calls, use this format:
 <think>
@@ -112,6 +222,11 @@ For tool calls, use this format:
 {{"name": "tool_name", "args": {{"query": "search query"}}}}
 </tool>
 
+For several tool calls in one turn, put a JSON list in a single <tool> block:
+<tool>
+[{{"name": "keyword_search", "args": {{"query": "keywords"}}}}, {{"name": "read_document_part", "args": {{"part_id": "doc_id.section.subsection"}}}}]
+</tool>
+
 When you have enough information to answer the user's question, give your final answer in this format:
 
 <think>
@@ -125,25 +240,63 @@ When you have enough information to answer the user's question, give your final
 <source>doc_id_2</source>
 </sources>
 </answer>
-
-Context from previous tool calls:
-{self.state if self.state else "No prior context."}
 """
     
+    def _generate_stream(self, messages: list) -> Iterator[dict]:
+        """
+        Generate the assistant reply to messages with the LLM backend.
+        
+        Yields {"type": "token", "text": ...} events as text is decoded; returns the full reply
+        (use `response = yield from self._generate_stream(messages)`).
+        """
+        stream = self.llm.stream(messages, self.conversation)
+        try:
+            while True:
+                try:
+                    text = next(stream)
+                except StopIteration as done:
+                    return done.value
+                yield {"type": "token", "text": text}
+        finally:
+            stream.close()
+    
     def query(self, user_query: str, chat_history: list = None) -> str:
-        """Process a user query through the RAG system with optional chat history context
+        """Process a user query through the RAG system and return the final response (see query_stream)"""
+        response = ""
+        for event in self.query_stream(user_query, chat_history):
+            if event["type"] == "final":
+                response = event["text"]
+        return response
+    
+    def query_stream(self, user_query: str, chat_history: list = None) -> Iterator[dict]:
+        """Process a user query through the RAG system, yielding events as they happen
         
         Args:
             user_query: The current user question
             chat_history: List of previous messages in format [{"role": "user"/"assistant", "content": "..."}, ...]
+        
+        Yields:
+            {"type": "turn", "turn": n}                               a new model turn starts
+            {"type": "token", "text": "..."}                          newly decoded model output
+            {"type": "tool_call", "name": "...", "args": {...}}       the model called a tool
+            {"type": "tool_result", "name": "...", "result": "..."}   what the tool returned
+            {"type": "final", "text": "..."}                          the final response (always last)
         """
-        self.state = ""
+        try:
+            yield from self._query_events(user_query, chat_history)
+        finally:
+            self.conversation = None
+    
+    def _query_events(self, user_query: str, chat_history: list = None) -> Iterator[dict]:
         self.tool_outputs = []
         turn = 0
         messages = []
         
         system_prompt = self.format_system_prompt()
         
+        # Start from a private copy of the backend's state for the shared system prompt
+        self.conversation = self.llm.new_conversation(system_prompt)
+        
         # Build initial message context with chat history
         initial_messages = [{"role": "system", "content": system_prompt}]
         
@@ -163,6 +316,7 @@ Context from previous tool calls:
             print(f"\n{'='*60}")
             print(f"Turn {turn}/{self.max_turns}")
             print(f"{'='*60}")
+            yield {"type": "turn", "turn": turn}
             
             # Build messages for this turn (starting fresh with history)
             messages = initial_messages.copy()
@@ -174,54 +328,40 @@ Context from previous tool calls:
                         "role": "assistant",
                         "content": tool_output["full_response"]
                     })
+                    results = "\n\n".join(
+                        f"Tool '{tool_call['name']}' returned:\n{tool_result}"
+                        for tool_call, tool_result in zip(tool_output["tools"], tool_output["results"])
+                    )
                     messages.append({
                         "role": "user",
-                        "content": f"Tool '{tool_output['tool']['name']}' returned:\n{tool_output['result']}\n\nContinue with analysis or provide final answer if you have enough information."
+                        "content": f"{results}\n\nContinue with analysis or provide final answer if you have enough information."
                     })
             
-            # Generate response
-            input_ids = self.tokenizer.apply_chat_template(
-                messages,
-                tokenize=True,
-                add_generation_prompt=True,
-                return_tensors="pt"
-            ).to(self.model.device)
-            
-            with torch.no_grad():
-                output = self.model.generate(
-                    input_ids,
-                    max_new_tokens=1024,
-                    temperature=0.7,
-                    top_p=0.9,
-                    eos_token_id=self.tokenizer.eos_token_id
-                )
-            
-            response = self.tokenizer.decode(output[0], skip_special_tokens=True)
-            
-            # Extract just the assistant's response part
-            if "assistant" in response:
-                response = response.split("assistant")[-1].strip()
+            # Generate response (streamed; backends that keep a KV cache only prefill the new turn)
+            response = yield from self._generate_stream(messages)
             
             print(f"\nModel Output:\n{response}")
             
-            # Check for tool call
-            tool_call = self.parse_tool_call(response)
+            # Check for tool calls
+            tool_calls = self.parse_tool_calls(response)
             
-            if tool_call:
-                print(f"\n[TOOL CALL] {tool_call['name']}")
-                print(f"Arguments: {json.dumps(tool_call.get('args', {}), indent=2)}")
-                
-                tool_result = self.execute_tool(tool_call["name"], tool_call.get("args", {}))
-                print(f"\n[TOOL RESULT]\n{tool_result[:500]}{'...' if len(tool_result) > 500 else ''}")
+            if tool_calls:
+                for tool_call in tool_calls:
+                    print(f"\n[TOOL CALL] {tool_call['name']}")
+                    print(f"Arguments: {json.dumps(tool_call.get('args', {}), indent=2)}")
+                    yield {"type": "tool_call", "name": tool_call["name"], "args": tool_call.get("args", {})}
                 
-                # Append to state for context
-                self.state += f"\n\n--- Tool: {tool_call['name']} ---\nQuery/Args: {json.dumps(tool_call.get('args', {}))}\nResult: {tool_result[:1000]}"
+                # Run them in parallel; results are reported and stored in call order
+                tool_results = self.execute_tools(tool_calls)
+                for tool_call, tool_result in zip(tool_calls, tool_results):
+                    print(f"\n[TOOL RESULT] {tool_call['name']}\n{tool_result[:500]}{'...' if len(tool_result) > 500 else ''}")
+                    yield {"type": "tool_result", "name": tool_call["name"], "result": tool_result}
                 
                 # Store for next turn
                 self.tool_outputs.append({
                     "full_response": response,
-                    "tool": tool_call,
-                    "result": tool_result
+                    "tools": tool_calls,
+                    "results": tool_results
                 })
             else:
                 # Check if this is a final answer
@@ -229,7 +369,8 @@ Context from previous tool calls:
                     print(f"\n{'='*60}")
                     print("FINAL ANSWER REACHED")
                     print(f"{'='*60}")
-                    return response
+                    yield {"type": "final", "text": response}
+                    return
                 else:
                     print("\n[INFO] No tool call detected and no final answer. Continuing...")
         
@@ -243,28 +384,11 @@ Context from previous tool calls:
             "content": "I have used my available tool turns. Let me provide my final answer based on the information gathered."
         })
         
-        input_ids = self.tokenizer.apply_chat_template(
-            messages,
-            tokenize=True,
-            add_generation_prompt=True,
-            return_tensors="pt"
-        ).to(self.model.device)
-        
-        with torch.no_grad():
-            output = self.model.generate(
-                input_ids,
-                max_new_tokens=1024,
-                temperature=0.7,
-                top_p=0.9,
-                eos_token_id=self.tokenizer.eos_token_id
-            )
-        
-        response = self.tokenizer.decode(output[0], skip_special_tokens=True)
-        if "assistant" in response:
-            response = response.split("assistant")[-1].strip()
+        yield {"type": "turn", "turn": turn + 1}
+        response = yield from self._generate_stream(messages)
         
         print(f"\nFinal Response:\n{response}")
-        return response
+        yield {"type": "final", "text": response}
 
 
 
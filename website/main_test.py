@@ -0,0 +1,117 @@
+import json
+import threading
+import time
+
+import pytest
+
+import main
+from document_store_test import write_corpus
+from llm_backends import LLMBackend
+from main import RAGSystem
+from ToolCache import ToolResultCache
+
+
+class ScriptedBackend(LLMBackend):
+    """Replies with the given texts in turn"""
+    name = "scripted"
+
+    def __init__(self, *replies: str):
+        self.replies = list(replies)
+
+    def stream(self, messages, conversation=None):
+        reply = self.replies.pop(0)
+        yield reply
+        return reply
+
+
+@pytest.fixture
+def rag(tmp_path, monkeypatch):
+    monkeypatch.setattr(main, "get_semantic_search", lambda *a, **k: None)
+    system = RAGSystem(xml_file=write_corpus(tmp_path / "corpus.xml"), backend=ScriptedBackend())
+    system.tool_cache = ToolResultCache()
+    return system
+
+
+def test_cache_hit_skips_the_tool(rag, monkeypatch):
+    first = rag.execute_tool("keyword_search", {"query": "hearing", "n": 2})
+    monkeypatch.setattr(rag.store, "keyword_search", lambda *a, **k: pytest.fail("cache hit expected"))
+    started = time.perf_counter()
+    for _ in range(100):
+        assert rag.execute_tool("keyword_search", {"query": "hearing", "n": 2}) == first
+    assert (time.perf_counter() - started) / 100 < 0.005  # version lookup is a stat, not an index reload
+    assert rag.tool_cache.stats()["hits"] == 100
+
+
+def test_parse_tool_calls_mixes_blocks_and_caps():
+    rag = RAGSystem.__new__(RAGSystem)
+    rag.max_tool_calls = 4
+    response = (
+        '<think>two kinds of block</think>\n'
+        '<tool>{"name": "keyword_search", "args": {"query": "a"}}</tool>\n'
+        '<tool>[{"name": "read_document_part", "args": {"part_id": "p1"}}, {"args": {"query": "nameless"}}, '
+        '{"name": "semantic_search", "args": {"query": "b"}}]</tool>\n'
+        '<tool>not json</tool>\n'
+        '<tool>[{"name": "keyword_search", "args": {"query": "c"}}, {"name": "keyword_search", "args": {"query": "d"}}]</tool>'
+    )
+    calls = rag.parse_tool_calls(response)
+    assert [c["name"] for c in calls] == ["keyword_search", "read_document_part", "semantic_search", "keyword_search"]
+    assert calls[-1]["args"] == {"query": "c"}  # in order, cut at max_tool_calls
+    assert rag.parse_tool_call(response) == calls[0]
+    assert rag.parse_tool_calls("<answer>no tools</answer>") == []
+
+
+def test_execute_tools_keeps_call_order(rag, monkeypatch):
+    search = rag.store.keyword_search
+    first_done = threading.Event()
+
+    def keyword_search(query, n=3):
+        if query == "slow":
+            assert first_done.wait(5)  # finishes after the calls behind it
+        else:
+            first_done.set()
+        return search(query, n=n)
+
+    monkeypatch.setattr(rag.store, "keyword_search", keyword_search)
+    calls = [{"name": "keyword_search", "args": {"query": "slow"}},
+             {"name": "read_document_part", "args": {"part_id": "p0"}},
+             {"name": "keyword_search", "args": {"query": "hearing", "n": 1}}]
+    results = rag.execute_tools(calls)
+    assert results == [search("slow", n=3), rag.store.read_part("p0"), search("hearing", n=1)]
+
+
+def test_tool_args_are_coerced(rag):
+    assert rag.execute_tool("keyword_search", {"query": " hearing ", "n": "2"}) == \
+        rag.execute_tool("keyword_search", {"query": "hearing", "n": 2})
+    assert rag.tool_cache.stats()["hits"] == 1  # both spellings share a cache entry
+    assert rag.execute_tool("read_document_part", {"part_id": "p0", "wrap": "false"}) == \
+        rag.store.read_part("p0", wrap=False)
+
+
+@pytest.mark.parametrize("name, args, message", [
+    ("keyword_search", {"query": "hearing", "n": "three"}, '"n" must be an integer from 1 to 20'),
+    ("keyword_search", {"query": "hearing", "n": 500}, '"n" must be an integer from 1 to 20'),
+    ("semantic_search", {"n": 3}, '"query" must be a non-empty string'),
+    ("read_document_part", {"part_id": 7}, '"part_id" must be a non-empty string'),
+    ("read_document_part", {"part_id": "p0", "wrap": "maybe"}, '"wrap" must be true or false'),
+    ("keyword_search", ["hearing"], "args must be a JSON object"),
+    ("delete_everything", {}, "Unknown tool: delete_everything"),
+])
+def test_invalid_calls_become_error_payloads(rag, name, args, message):
+    [result] = rag.execute_tools([{"name": name, "args": args}])
+    assert message in json.loads(result)["error"]
+
+
+def test_tool_failures_become_error_payloads(rag, monkeypatch):
+    def broken(*args, **kwargs):
+        raise RuntimeError("index is corrupt")
+
+    monkeypatch.setattr(rag.store, "keyword_search", broken)
+    results = rag.execute_tools([{"name": "keyword_search", "args": {"query": "hearing"}},
+                                 {"name": "read_document_part", "args": {"part_id": "missing"}}])
+    assert json.loads(results[0]) == {"error": "index is corrupt"}
+    assert "error" in json.loads(results[1])
+    assert rag.tool_cache.stats()["entries"] == 0  # errors are not cached
+
+
+if __name__ == "__main__":
+    pytest.main([__file__, "-q"])
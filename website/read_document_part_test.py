@@ -0,0 +1,80 @@
+import os
+
+import ReadDocumentPart
+from ReadDocumentPart import read_document_part
+
+SAMPLE_XML = """<?xml version="1.0" encoding="utf-8"?>
+<!-- <p id="commented-out">not a part</p> -->
+<Corpus>
+  <Case name="Marbury v Madison" note="a > b">
+    <section id="Marbury_v_Madison.Facts">
+      <p id="Marbury_v_Madison.Facts.p001">Marbury &amp; others <i>petitioned</i> the court.</p>
+      <br id="Marbury_v_Madison.Facts.br1"/>
+    </section>
+    <section id="Marbury_v_Madison.Quotes"><p id="Marbury_v_Madison.Quotes.p001" kind='quote "x"'>Text with <![CDATA[<raw> & data]]> inside</p> tail &lt;text&gt;</section>
+    <section id="holding"><p id="holding.p1">Judicial review.</p></section>
+  </Case>
+</Corpus>
+"""
+
+PART_IDS = ["Marbury_v_Madison.Facts", "Marbury_v_Madison.Facts.p001", "Marbury_v_Madison.Facts.br1",
+            "Marbury_v_Madison.Quotes", "Marbury_v_Madison.Quotes.p001", "holding", "holding.p1"]
+
+
+def test_indexed_read_matches_dom(tmp_path):
+    xml = tmp_path / "sample.xml"
+    xml.write_text(SAMPLE_XML, encoding="utf-8")
+    for part_id in PART_IDS:
+        for wrap in (True, False):
+            expected = read_document_part(str(xml), part_id, wrap=wrap, use_index=False)
+            assert read_document_part(str(xml), part_id, wrap=wrap) == expected
+    assert 'docId="Marbury_v_Madison"' in read_document_part(str(xml), "holding")
+
+
+def test_missing_part_raises(tmp_path):
+    xml = tmp_path / "sample.xml"
+    xml.write_text(SAMPLE_XML, encoding="utf-8")
+    for part_id in ("commented-out", "nope"):
+        try:
+            read_document_part(str(xml), part_id)
+        except Exception as e:
+            assert "part_id not found" in str(e)
+        else:
+            raise AssertionError(f"{part_id} should not be found")
+
+
+def test_repeated_reads_do_not_reload_the_index(tmp_path, monkeypatch):
+    xml = tmp_path / "sample.xml"
+    xml.write_text(SAMPLE_XML, encoding="utf-8")
+    first = read_document_part(str(xml), "holding.p1")
+    loads = []
+    real_load = ReadDocumentPart.json.load
+    monkeypatch.setattr(ReadDocumentPart.json, "load", lambda f: loads.append(f.name) or real_load(f))
+    assert read_document_part(str(xml), "holding.p1") == first
+    assert read_document_part(str(xml), "holding") and loads == []
+    st = os.stat(xml)
+    os.utime(xml, ns=(st.st_atime_ns, st.st_mtime_ns + 10**9))  # touched, same content: hash, no reload
+    assert read_document_part(str(xml), "holding.p1") == first and loads == []
+    xml.write_text(SAMPLE_XML.replace("Judicial review.", "Judicial review, again."), encoding="utf-8")
+    assert "again" in read_document_part(str(xml), "holding.p1")
+    assert loads  # changed file: rebuilt and reloaded
+
+
+def test_replaced_index_stays_readable_while_in_use(tmp_path):
+    xml = tmp_path / "sample.xml"
+    xml.write_text(SAMPLE_XML, encoding="utf-8")
+    old = ReadDocumentPart.get_part_index(str(xml))
+    new_xml = tmp_path / "new.xml"
+    new_xml.write_text(SAMPLE_XML.replace("Judicial review.", "Judicial review, again."), encoding="utf-8")
+    os.replace(new_xml, xml)
+    new = ReadDocumentPart.get_part_index(str(xml))
+    assert new is not old and new.element("holding.p1").text == "Judicial review, again."
+    assert old.element("holding.p1").text == "Judicial review."  # dropped, not unmapped under a reader
+
+
+if __name__ == "__main__":
+    import pathlib, tempfile
+    with tempfile.TemporaryDirectory() as d:
+        test_indexed_read_matches_dom(pathlib.Path(d))
+        test_missing_part_raises(pathlib.Path(d))
+    print("ok")
@@ -6,24 +6,242 @@ Much faster and simpler than Ollama - no external service needed!
 
 Installation:
   pip install sentence-transformers faiss-cpu chromadb
+  (the index helpers only need faiss; FAISSSemanticSearch needs all three)
   
 For GPU support, use faiss-gpu instead of faiss-cpu
+
+Index types (index_type=...):
+  - "flat"      exact L2 search (default)
+  - "hnsw"      graph index, tune with ef_search
+  - "ivf_flat"  inverted lists, tune with nprobe
+  - "ivf_pq"    inverted lists + product quantization (smallest memory), tune with nprobe
+Use recall_report() to compare them against the flat baseline.
 """
 
+import hashlib
+import inspect
+import json
+import math
+import os
+import threading
+import time
+import unicodedata
+from collections import OrderedDict
 import numpy as np
 import faiss
 import xml.etree.ElementTree as ET
 import sqlite3
-import struct
-from chromadb import PersistentClient
-from typing import List, Tuple
-from sentence_transformers import SentenceTransformer
+from typing import Dict, List, Optional, Tuple
+
+
+# ---------- FAISS index factory ----------
+INDEX_TYPES = ("flat", "hnsw", "ivf_flat", "ivf_pq")
+
+
+def default_nlist(n_vectors: int) -> int:
+    """~4*sqrt(N) inverted lists, but keep >= 39 training points per list (FAISS's minimum)."""
+    return max(1, min(int(4 * math.sqrt(n_vectors)), n_vectors // 39))
+
+
+def index_factory_string(dimension: int, n_vectors: int, index_type: str = "flat",
+                         hnsw_m: int = 32, nlist: Optional[int] = None,
+                         pq_m: Optional[int] = None, pq_bits: int = 8) -> str:
+    """Translate an index type + parameters into a faiss.index_factory description."""
+    if index_type == "flat":
+        return "Flat"
+    if index_type == "hnsw":
+        return f"HNSW{hnsw_m}"
+    nlist = nlist or default_nlist(n_vectors)
+    if index_type == "ivf_flat":
+        return f"IVF{nlist},Flat"
+    if index_type == "ivf_pq":
+        if pq_m is None:
+            # ~8 dims per sub-quantizer; pq_m must divide the dimension
+            pq_m = max(m for m in range(1, max(1, dimension // 8) + 1) if dimension % m == 0)
+        # each PQ codebook wants >= 39 training points per centroid (2^bits centroids)
+        pq_bits = max(1, min(pq_bits, int(math.log2(max(2, n_vectors / 39)))))
+        return f"IVF{nlist},PQ{pq_m}x{pq_bits}"
+    raise ValueError(f"Unknown index_type: {index_type} (expected one of {INDEX_TYPES})")
+
+
+def build_faiss_index(embeddings: np.ndarray, index_type: str = "flat",
+                      ef_construction: int = 200, **params) -> faiss.Index:
+    """
+    Create, train (if needed) and fill an L2 index over float32 embeddings.
+
+    Args:
+        embeddings: (N, d) float32 matrix
+        index_type: one of INDEX_TYPES
+        ef_construction: HNSW build-time beam width
+        **params: hnsw_m, nlist, pq_m, pq_bits (see index_factory_string)
+    """
+    n_vectors, dimension = embeddings.shape
+    index = faiss.index_factory(dimension, index_factory_string(dimension, n_vectors, index_type, **params))
+    if index_type == "hnsw":
+        index.hnsw.efConstruction = ef_construction
+    if not index.is_trained:
+        index.train(embeddings)
+    index.add(embeddings)
+    return index
+
+
+def set_search_params(index: faiss.Index, nprobe: Optional[int] = None, ef_search: Optional[int] = None) -> None:
+    """Set query-time knobs; parameters that do not apply to the index type are ignored."""
+    ps = faiss.ParameterSpace()
+    if nprobe is not None and faiss.try_extract_index_ivf(index) is not None:
+        ps.set_index_parameter(index, "nprobe", nprobe)
+    if ef_search is not None and hasattr(index, "hnsw"):
+        ps.set_index_parameter(index, "efSearch", ef_search)
+
+
+def index_memory_bytes(index: faiss.Index) -> int:
+    return int(faiss.serialize_index(index).nbytes)
+
+
+def benchmark_indexes(embeddings: np.ndarray, queries: np.ndarray, k: int = 10,
+                      configs: Optional[List[Dict]] = None) -> List[Dict]:
+    """
+    Recall@k and latency of each index config against the exact flat baseline.
+
+    Args:
+        embeddings: (N, d) float32 corpus vectors
+        queries: (Q, d) float32 query vectors
+        configs: list of dicts with "index_type" plus build params and optional
+                 "nprobe" / "ef_search"; a default sweep is used if None
+
+    Returns:
+        One dict per config: config, recall, ms_per_query, build_s, memory_bytes
+    """
+    if configs is None:
+        configs = [{"index_type": "hnsw", "ef_search": ef} for ef in (16, 64, 128)]
+        configs += [{"index_type": t, "nprobe": p} for t in ("ivf_flat", "ivf_pq") for p in (1, 8, 32)]
+    k = min(k, len(embeddings))
+    flat = build_faiss_index(embeddings, "flat")
+    t0 = time.perf_counter()
+    _, truth = flat.search(queries, k)
+    report = [{"config": {"index_type": "flat"}, "recall": 1.0,
+               "ms_per_query": (time.perf_counter() - t0) * 1000 / len(queries),
+               "build_s": 0.0, "memory_bytes": index_memory_bytes(flat)}]
+    built: Dict[tuple, Tuple[faiss.Index, float]] = {}
+    for config in configs:
+        build_params = {key: v for key, v in config.items() if key not in ("nprobe", "ef_search")}
+        build_key = tuple(sorted(build_params.items()))
+        if build_key not in built:
+            t0 = time.perf_counter()
+            built[build_key] = (build_faiss_index(embeddings, **build_params), time.perf_counter() - t0)
+        index, build_s = built[build_key]
+        set_search_params(index, config.get("nprobe"), config.get("ef_search"))
+        t0 = time.perf_counter()
+        _, found = index.search(queries, k)
+        ms = (time.perf_counter() - t0) * 1000 / len(queries)
+        hits = sum(len(set(f[f >= 0]) & set(t)) for f, t in zip(found, truth))
+        report.append({"config": config, "recall": hits / truth.size, "ms_per_query": ms,
+                       "build_s": build_s, "memory_bytes": index_memory_bytes(index)})
+    return report
+
+
+# ---------- query embedding cache ----------
+class EmbeddingCache:
+    """
+    Bounded LRU of query embeddings keyed by (model_name, normalized query text),
+    with optional SQLite persistence so several processes (Streamlit workers,
+    RL rollouts) and later runs share the same entries.
+    
+    Normalization is NFKC + whitespace collapsing, so "Marbury v  Madison facts "
+    and "Marbury v Madison facts" share one entry; case is kept because it can
+    change the embedding of cased models.
+    """
+    
+    def __init__(self, max_entries: int = 10000, db_path: Optional[str] = None):
+        """
+        Args:
+            max_entries: In-memory LRU capacity
+            db_path: SQLite file for persistence across processes (None = memory only)
+        """
+        self.max_entries = max_entries
+        self.db_path = db_path
+        self.hits = 0
+        self.misses = 0
+        self._lru: "OrderedDict[Tuple[str, str], np.ndarray]" = OrderedDict()
+        self._lock = threading.Lock()
+        self._db = None
+        if db_path:
+            self._db = sqlite3.connect(db_path, timeout=30, check_same_thread=False)
+            self._db.execute("PRAGMA journal_mode=WAL")
+            self._db.execute("""
+                CREATE TABLE IF NOT EXISTS query_embeddings (
+                    model TEXT NOT NULL, text TEXT NOT NULL, vector BLOB NOT NULL,
+                    PRIMARY KEY (model, text))
+            """)
+            self._db.commit()
+    
+    @staticmethod
+    def normalize(text: str) -> str:
+        return " ".join(unicodedata.normalize("NFKC", text).split())
+    
+    def _remember(self, key: Tuple[str, str], vector: np.ndarray):
+        self._lru[key] = vector
+        self._lru.move_to_end(key)
+        while len(self._lru) > self.max_entries:
+            self._lru.popitem(last=False)
+    
+    def get(self, model_name: str, text: str) -> Optional[np.ndarray]:
+        """Cached embedding (read-only float32 array) or None. Counts a hit or a miss."""
+        key = (model_name, self.normalize(text))
+        with self._lock:
+            vector = self._lru.get(key)
+            if vector is None and self._db is not None:
+                row = self._db.execute(
+                    "SELECT vector FROM query_embeddings WHERE model = ? AND text = ?", key
+                ).fetchone()
+                if row:
+                    vector = np.frombuffer(row[0], dtype="<f4")
+            if vector is None:
+                self.misses += 1
+                return None
+            self.hits += 1
+            self._remember(key, vector)
+            return vector
+    
+    def put(self, model_name: str, text: str, vector: np.ndarray):
+        key = (model_name, self.normalize(text))
+        vector = np.array(vector, dtype="<f4").reshape(-1)
+        vector.setflags(write=False)
+        with self._lock:
+            self._remember(key, vector)
+            if self._db is not None:
+                self._db.execute(
+                    "INSERT OR REPLACE INTO query_embeddings (model, text, vector) VALUES (?, ?, ?)",
+                    (*key, vector.tobytes()),
+                )
+                self._db.commit()
+    
+    def stats(self) -> Dict[str, float]:
+        total = self.hits + self.misses
+        return {"hits": self.hits, "misses": self.misses, "entries": len(self._lru),
+                "hit_rate": self.hits / total if total else 0.0}
+    
+    def clear(self):
+        with self._lock:
+            self._lru.clear()
+            self.hits = self.misses = 0
+
+
+# shared by every FAISSSemanticSearch in the process unless one is passed explicitly
+DEFAULT_EMBEDDING_CACHE = EmbeddingCache()
 
 
 class FAISSSemanticSearch:
     def __init__(self, chroma_path: str = "./eunomia_db", 
                  collection_name: str = "all_XML",
-                 model_name: str = None):
+                 model_name: str = None,
+                 index_type: str = "flat",
+                 index_params: Optional[Dict] = None,
+                 nprobe: Optional[int] = None,
+                 ef_search: Optional[int] = None,
+                 use_cache: bool = True,
+                 cache_dir: Optional[str] = None,
+                 embedding_cache: Optional[EmbeddingCache] = None):
         """
         Initialize FAISS search with ChromaDB data and local embeddings.
         
@@ -35,9 +253,30 @@ class FAISSSemanticSearch:
                        - "all-MiniLM-L6-v2" (384 dims, very fast)
                        - "all-mpnet-base-v2" (768 dims, higher quality)
                        - "paraphrase-MiniLM-L6-v2" (384 dims, good balance)
+            index_type: FAISS index, one of "flat", "hnsw", "ivf_flat", "ivf_pq"
+            index_params: Build parameters (hnsw_m, ef_construction, nlist, pq_m, pq_bits)
+            nprobe: IVF lists visited per query (higher = better recall, slower)
+            ef_search: HNSW beam width per query (higher = better recall, slower)
+            use_cache: Reuse the index written by a previous run if ChromaDB has not changed
+            cache_dir: Where the index cache lives (default: <chroma_path>/faiss_cache)
+            embedding_cache: Query embedding cache (default: DEFAULT_EMBEDDING_CACHE, in-memory,
+                             shared per process); pass EmbeddingCache(db_path=...) to persist it
         """
+        if index_type not in INDEX_TYPES:
+            raise ValueError(f"Unknown index_type: {index_type} (expected one of {INDEX_TYPES})")
         self.chroma_path = chroma_path
         self.collection_name = collection_name
+        self.index_type = index_type
+        self.index_params = index_params or {}
+        self.nprobe = nprobe
+        self.ef_search = ef_search
+        self.use_cache = use_cache
+        self.cache_dir = cache_dir or os.path.join(chroma_path, "faiss_cache")
+        self.embedding_cache = embedding_cache if embedding_cache is not None else DEFAULT_EMBEDDING_CACHE
+        
+        # Imported here so the index helpers above work without chromadb / sentence-transformers installed
+        from chromadb import PersistentClient
+        from sentence_transformers import SentenceTransformer
         
         # Initialize ChromaDB first to detect dimension
         print(f"[INIT] Connecting to ChromaDB at {chroma_path}")
@@ -47,9 +286,11 @@ class FAISSSemanticSearch:
         self.index = None
         self.metadata = None
         self.embeddings = None
+        self.index_version = None  # fingerprint of the Chroma data the index was built from
         
         # Detect embedding dimension from stored embeddings
         detected_dim = self._detect_embedding_dimension()
+        self.embedding_dim = detected_dim
         print(f"[INIT] Detected embedding dimension from ChromaDB: {detected_dim}")
         
         # Auto-select model based on dimension if not specified
@@ -77,7 +318,7 @@ class FAISSSemanticSearch:
         self._build_index()
     
     def _detect_embedding_dimension(self) -> int:
-        """Detect the embedding dimension from stored vectors in ChromaDB."""
+        """Detect the embedding dimension from stored vectors in ChromaDB (BLOB length only, no decoding)."""
         try:
             db_path = f"{self.chroma_path}/chroma.sqlite3"
             conn = sqlite3.connect(db_path)
@@ -85,18 +326,15 @@ class FAISSSemanticSearch:
             
             # Get first embedding to detect dimension
             cursor.execute("""
-                SELECT vector, encoding FROM embeddings_queue 
-                WHERE vector IS NOT NULL
+                SELECT length(vector) FROM embeddings_queue 
+                WHERE vector IS NOT NULL AND encoding = 'FLOAT32'
                 LIMIT 1
             """)
             row = cursor.fetchone()
             conn.close()
             
             if row:
-                vector_blob, encoding = row
-                if encoding == "FLOAT32":
-                    num_floats = len(vector_blob) // 4
-                    return num_floats
+                return row[0] // 4
             
             return 384  # default fallback
         except Exception as e:
@@ -113,62 +351,103 @@ class FAISSSemanticSearch:
         Returns:
             Embedding as numpy array
         """
+        cached = self.embedding_cache.get(self.model_name, text)
+        if cached is not None:
+            return cached
         # SentenceTransformer returns (1, embedding_dim) for single strings
-        embedding = self.model.encode(text, convert_to_numpy=True)
-        return embedding.astype(np.float32)
+        embedding = self.model.encode(text, convert_to_numpy=True).astype(np.float32)
+        self.embedding_cache.put(self.model_name, text, embedding)
+        return embedding
     
-    def _build_index(self):
-        """Build FAISS index from ChromaDB SQLite database."""
-        db_path = f"{self.chroma_path}/chroma.sqlite3"
+    def _read_embeddings(self, batch_size: int = 4096) -> np.ndarray:
+        """
+        Load all stored FLOAT32 vectors from ChromaDB's SQLite queue.
         
+        BLOBs are fetched batch_size rows at a time and viewed with np.frombuffer
+        straight into one preallocated (N, dim) float32 matrix, so peak memory is
+        the matrix plus one batch and no Python floats are created.
+        """
+        db_path = f"{self.chroma_path}/chroma.sqlite3"
+        conn = sqlite3.connect(db_path)
         try:
-            conn = sqlite3.connect(db_path)
             cursor = conn.cursor()
-            
-            # Get all embeddings from embeddings_queue
-            cursor.execute("""
-                SELECT id, vector, encoding FROM embeddings_queue 
-                WHERE vector IS NOT NULL
-            """)
-            rows = cursor.fetchall()
-            
-            if not rows:
+            where = "WHERE vector IS NOT NULL AND encoding = 'FLOAT32'"
+            count = cursor.execute(f"SELECT COUNT(*) FROM embeddings_queue {where}").fetchone()[0]
+            if not count:
                 raise ValueError("No embeddings found in SQLite database!")
             
-            print(f"[INDEX] Found {len(rows)} pre-computed embeddings in SQLite")
-            
-            # Decode BLOB vectors
-            embeddings = []
-            ids_map = {}
-            
-            for seq_id, vector_blob, encoding in rows:
-                if encoding == "FLOAT32":
-                    num_floats = len(vector_blob) // 4
-                    vector = struct.unpack(f"{num_floats}f", vector_blob)
-                    embeddings.append(list(vector))
-                    ids_map[seq_id] = seq_id
-            
-            embeddings = np.array(embeddings, dtype=np.float32)
+            print(f"[INDEX] Found {count} pre-computed embeddings in SQLite")
             
-            # Get document info from ChromaDB
-            all_data = self.collection.get()
-            
-            if not all_data or not all_data["ids"]:
-                raise ValueError("ChromaDB collection is empty!")
-            
-            ids = all_data["ids"]
-            documents = all_data["documents"]
-            metadatas = all_data["metadatas"] if all_data["metadatas"] else [{}] * len(ids)
-            
-            # Store metadata for retrieval
-            self.metadata = [
-                {
-                    "id": id_,
-                    "document": doc,
-                    "meta": meta
-                }
-                for id_, doc, meta in zip(ids, documents, metadatas)
-            ]
+            dim = self.embedding_dim
+            embeddings = np.empty((count, dim), dtype=np.float32)
+            # rowid = seq_id (Chroma's INTEGER PRIMARY KEY), but also present if a schema lacks that column
+            cursor.execute(f"SELECT vector FROM embeddings_queue {where} ORDER BY rowid")
+            row = 0
+            while row < count:
+                batch = cursor.fetchmany(batch_size)
+                if not batch:
+                    break
+                batch = batch[:count - row]
+                # per row: a short and a long BLOB in one batch would otherwise add up to the right size
+                bad = [vector for (vector,) in batch if not isinstance(vector, bytes) or len(vector) != dim * 4]
+                if bad:
+                    raise ValueError(f"Stored vectors are not all {dim}-dimensional float32 BLOBs "
+                                     f"(found a {type(bad[0]).__name__} of length {len(bad[0])})")
+                blob = b"".join(vector for (vector,) in batch)
+                embeddings[row:row + len(batch)] = np.frombuffer(blob, dtype="<f4").reshape(len(batch), dim)
+                row += len(batch)
+        finally:
+            conn.close()
+        
+        return embeddings[:row]
+    
+    def _read_metadata(self) -> List[Dict]:
+        """Get document info from ChromaDB."""
+        all_data = self.collection.get()
+        
+        if not all_data or not all_data["ids"]:
+            raise ValueError("ChromaDB collection is empty!")
+        
+        ids = all_data["ids"]
+        documents = all_data["documents"]
+        metadatas = all_data["metadatas"] if all_data["metadatas"] else [{}] * len(ids)
+        
+        return [
+            {
+                "id": id_,
+                "document": doc,
+                "meta": meta
+            }
+            for id_, doc, meta in zip(ids, documents, metadatas)
+        ]
+    
+    def _embed_texts(self, texts: List[str]) -> np.ndarray:
+        """
+        Embed a list of texts; cache misses go through one SentenceTransformer batch.
+        Returns (len(texts), dim) float32.
+        """
+        cached = [self.embedding_cache.get(self.model_name, t) for t in texts]
+        missing: Dict[str, List[int]] = {}  # normalized text -> positions, so duplicates are encoded once
+        for i, vector in enumerate(cached):
+            if vector is None:
+                missing.setdefault(EmbeddingCache.normalize(texts[i]), []).append(i)
+        if missing:
+            fresh = self.model.encode([texts[pos[0]] for pos in missing.values()], convert_to_numpy=True)
+            fresh = np.asarray(fresh, dtype=np.float32).reshape(len(missing), -1)
+            for pos, vector in zip(missing.values(), fresh):
+                self.embedding_cache.put(self.model_name, texts[pos[0]], vector)
+                for i in pos:
+                    cached[i] = vector
+        return np.stack(cached).astype(np.float32, copy=False)
+    
+    def _build_index(self):
+        """Load the FAISS index from the on-disk cache, or build it from ChromaDB SQLite database."""
+        if self.use_cache and self._load_cached_index():
+            return
+        
+        try:
+            embeddings = self._read_embeddings()
+            self.metadata = self._read_metadata()
             
             # Trim embeddings and metadata to match
             min_len = min(len(embeddings), len(self.metadata))
@@ -178,16 +457,168 @@ class FAISSSemanticSearch:
             self.embeddings = embeddings
             
             # Create FAISS index (L2 distance)
-            dimension = embeddings.shape[1]
-            self.index = faiss.IndexFlatL2(dimension)
-            self.index.add(embeddings)
+            self.index = build_faiss_index(embeddings, self.index_type, **self.index_params)
+            self.set_search_params(self.nprobe, self.ef_search)
             
-            conn.close()
-            print(f"✓ FAISS index built with {len(self.metadata)} documents")
+            print(f"✓ FAISS {self.index_type} index built with {len(self.metadata)} documents")
+            
+            stamp = self._chroma_stamp()
+            self.index_version = json.dumps(stamp, sort_keys=True) if stamp else f"built-{time.time_ns()}"
             
         except Exception as e:
             print(f"[ERROR] Failed to build index: {e}")
             raise
+        
+        if self.use_cache:
+            self._save_index_cache()
+    
+    # ---------- on-disk index cache ----------
+    def _cache_paths(self) -> Tuple[str, str]:
+        """<cache_dir>/<collection>.<index_type>.<params hash>.faiss / .meta.json"""
+        params = json.dumps(self.index_params, sort_keys=True)
+        tag = hashlib.sha1(params.encode("utf-8")).hexdigest()[:10]
+        base = os.path.join(self.cache_dir, f"{self.collection_name}.{self.index_type}.{tag}")
+        return base + ".faiss", base + ".meta.json"
+    
+    def _chroma_stamp(self) -> Optional[Dict]:
+        """
+        Cheap fingerprint of the Chroma data: row count and last sequence id of the
+        embeddings queue (every add/update/delete appends a row). None if unreadable
+        (no database, or a Chroma version without that table / column): the index is then rebuilt.
+        """
+        db_path = f"{self.chroma_path}/chroma.sqlite3"
+        if not os.path.exists(db_path):  # sqlite3.connect would create an empty file
+            print(f"[WARNING] No ChromaDB database at {db_path}, index cache disabled")
+            return None
+        try:
+            conn = sqlite3.connect(db_path)
+            try:
+                count, max_seq_id = conn.execute(
+                    "SELECT COUNT(*), MAX(seq_id) FROM embeddings_queue"
+                ).fetchone()
+            finally:
+                conn.close()
+        except sqlite3.Error as e:
+            print(f"[WARNING] Could not fingerprint ChromaDB, index cache disabled: {e}")
+            return None
+        return {"collection": self.collection_name, "count": count, "max_seq_id": max_seq_id}
+    
+    def _load_cached_index(self) -> bool:
+        """Load index + metadata written by a previous run, if they match the current Chroma data."""
+        index_path, meta_path = self._cache_paths()
+        if not (os.path.exists(index_path) and os.path.exists(meta_path)):
+            return False
+        stamp = self._chroma_stamp()
+        if stamp is None:
+            return False
+        try:
+            with open(meta_path, "r", encoding="utf-8") as f:
+                cached = json.load(f)
+        except (OSError, ValueError):
+            return False
+        if cached.get("stamp") != stamp or not isinstance(cached.get("metadata"), list):
+            print("[INDEX] ChromaDB changed since the index was cached, rebuilding")
+            return False
+        
+        try:
+            try:
+                # mmap keeps the vectors in the page cache instead of the process heap
+                index = faiss.read_index(index_path, faiss.IO_FLAG_MMAP | faiss.IO_FLAG_READ_ONLY)
+            except RuntimeError:
+                index = faiss.read_index(index_path)
+        except RuntimeError as e:
+            print(f"[WARNING] Could not read cached FAISS index, rebuilding: {e}")
+            return False
+        self.index = index
+        self.metadata = cached["metadata"]
+        self.index_version = json.dumps(stamp, sort_keys=True)
+        self.set_search_params(self.nprobe, self.ef_search)
+        print(f"✓ FAISS {self.index_type} index loaded from cache with {len(self.metadata)} documents")
+        return True
+    
+    def _save_index_cache(self):
+        stamp = self._chroma_stamp()
+        if stamp is None:
+            return
+        index_path, meta_path = self._cache_paths()
+        try:
+            os.makedirs(self.cache_dir, exist_ok=True)
+            tmp = f".tmp-{os.getpid()}"
+            faiss.write_index(self.index, index_path + tmp)
+            with open(meta_path + tmp, "w", encoding="utf-8") as f:
+                json.dump({"stamp": stamp, "index_type": self.index_type,
+                           "index_params": self.index_params, "metadata": self.metadata}, f)
+            os.replace(index_path + tmp, index_path)
+            os.replace(meta_path + tmp, meta_path)
+            print(f"[INDEX] Cached FAISS index at {index_path}")
+        except Exception as e:
+            print(f"[WARNING] Could not cache FAISS index: {e}")
+    
+    def set_search_params(self, nprobe: Optional[int] = None, ef_search: Optional[int] = None):
+        """Tune recall vs latency at query time (nprobe for IVF, ef_search for HNSW)."""
+        self.nprobe = nprobe if nprobe is not None else self.nprobe
+        self.ef_search = ef_search if ef_search is not None else self.ef_search
+        set_search_params(self.index, self.nprobe, self.ef_search)
+    
+    def recall_report(self, queries: Optional[List[str]] = None, k: int = 10,
+                      configs: Optional[List[Dict]] = None, num_queries: int = 100) -> List[Dict]:
+        """
+        Compare index configs against the flat baseline on this collection.
+        
+        Args:
+            queries: Query strings to embed; if None, a random sample of stored vectors is used
+            k: Recall@k
+            configs: See benchmark_indexes (default: a sweep over hnsw / ivf_flat / ivf_pq)
+            num_queries: Sample size when queries is None
+        
+        Returns:
+            List of dicts (config, recall, ms_per_query, build_s, memory_bytes); also printed as a table
+        """
+        if self.embeddings is None:  # index was loaded from cache
+            self.embeddings = self._read_embeddings()[:len(self.metadata)]
+        if queries:
+            query_vectors = self.model.encode(queries, convert_to_numpy=True).astype(np.float32)
+        else:
+            rng = np.random.default_rng(0)
+            sample = rng.choice(len(self.embeddings), size=min(num_queries, len(self.embeddings)), replace=False)
+            query_vectors = self.embeddings[sample]
+        report = benchmark_indexes(self.embeddings, query_vectors, k=k, configs=configs)
+        print(f"{'config':<45} {'recall@' + str(k):>9} {'ms/query':>9} {'MB':>8}")
+        for row in report:
+            print(f"{str(row['config']):<45} {row['recall']:>9.3f} {row['ms_per_query']:>9.3f} {row['memory_bytes'] / 1e6:>8.2f}")
+        return report
+    
+    def _format_results(self, distances: np.ndarray, indices: np.ndarray) -> str:
+        """Turn one query's FAISS row (distances, indices) into the results XML."""
+        # Convert L2 distances to similarity scores (0-1 range)
+        # Using: similarity = 1 / (1 + distance)
+        scores = 1 / (1 + distances)
+        
+        # Approximate indexes return -1 when fewer than n neighbours were found
+        found = indices >= 0
+        indices, scores = indices[found], scores[found]
+        
+        # Build XML results
+        results_elem = ET.Element("results", num=str(len(indices)))
+        
+        for idx, score in zip(indices, scores):
+            result_elem = ET.SubElement(results_elem, "result")
+            result_elem.set("id", self.metadata[idx]["id"])
+            result_elem.set("score", f"{score:.3f}")
+            
+            # Parse and preserve original XML tags
+            doc = self.metadata[idx]["document"]
+            try:
+                # Try to parse as XML and append child elements
+                doc_elem = ET.fromstring(f"<root>{doc}</root>")
+                for child in doc_elem:
+                    result_elem.append(child)
+            except ET.ParseError:
+                # If not valid XML, just set as text
+                result_elem.text = doc
+        
+        # Convert to string with proper formatting
+        return ET.tostring(results_elem, encoding="unicode")
     
     def search(self, query: str, n: int = 3) -> str:
         """
@@ -214,32 +645,8 @@ class FAISSSemanticSearch:
             # Search FAISS
             distances, indices = self.index.search(query_embedding, min(n, len(self.metadata)))
             
-            # Convert L2 distances to similarity scores (0-1 range)
-            # Using: similarity = 1 / (1 + distance)
-            scores = 1 / (1 + distances[0])
-            
-            # Build XML results
-            results_elem = ET.Element("results", num=str(len(indices[0])))
-            
-            for idx, score in zip(indices[0], scores):
-                result_elem = ET.SubElement(results_elem, "result")
-                result_elem.set("id", self.metadata[idx]["id"])
-                result_elem.set("score", f"{score:.3f}")
-                
-                # Parse and preserve original XML tags
-                doc = self.metadata[idx]["document"]
-                try:
-                    # Try to parse as XML and append child elements
-                    doc_elem = ET.fromstring(f"<root>{doc}</root>")
-                    for child in doc_elem:
-                        result_elem.append(child)
-                except ET.ParseError:
-                    # If not valid XML, just set as text
-                    result_elem.text = doc
-            
-            # Convert to string with proper formatting
-            xml_string = ET.tostring(results_elem, encoding="unicode")
-            print(f"[SEARCH] Returned {len(indices[0])} results")
+            xml_string = self._format_results(distances[0], indices[0])
+            print(f"[SEARCH] Returned {int((indices[0] >= 0).sum())} results")
             return xml_string
         
         except Exception as e:
@@ -247,6 +654,93 @@ class FAISSSemanticSearch:
             import traceback
             traceback.print_exc()
             raise RuntimeError(f"Semantic search failed: {str(e)}")
+    
+    def search_batch(self, queries: List[str], n: int = 3) -> List[str]:
+        """
+        Semantic search for many queries at once: one SentenceTransformer batch
+        and one FAISS search call.
+        
+        Args:
+            queries: Search query strings
+            n: Number of results to return per query
+        
+        Returns:
+            One XML results string per query, in the same order
+        """
+        if self.index is None:
+            raise RuntimeError("FAISS index not initialized!")
+        if not queries:
+            return []
+        
+        try:
+            print(f"[SEARCH] Embedding {len(queries)} queries in one batch")
+            query_embeddings = self._embed_texts(queries)
+            distances, indices = self.index.search(query_embeddings, min(n, len(self.metadata)))
+            return [self._format_results(d, i) for d, i in zip(distances, indices)]
+        
+        except Exception as e:
+            print(f"[ERROR] Batch search failed: {e}")
+            import traceback
+            traceback.print_exc()
+            raise RuntimeError(f"Semantic search failed: {str(e)}")
+
+
+# ---------- shared searchers ----------
+# Building a searcher (Chroma connection, SQLite read, SentenceTransformer, FAISS index) costs seconds,
+# so tool code and RAGSystem share one per process and configuration instead of constructing their own.
+_SEARCHERS: Dict[str, FAISSSemanticSearch] = {}
+_BUILD_LOCKS: Dict[str, threading.Lock] = {}
+_SEARCHERS_LOCK = threading.Lock()
+
+
+def _reset_searchers():
+    # a forked child must not reuse the parent's Chroma/torch handles or locks held at fork time
+    global _SEARCHERS_LOCK
+    _SEARCHERS.clear()
+    _BUILD_LOCKS.clear()
+    _SEARCHERS_LOCK = threading.Lock()
+
+
+if hasattr(os, "register_at_fork"):
+    os.register_at_fork(after_in_child=_reset_searchers)
+
+
+def _searcher_key(kwargs: Dict) -> str:
+    # bind against the constructor so get_searcher() and get_searcher(chroma_path="./eunomia_db") match
+    bound = inspect.signature(FAISSSemanticSearch).bind(**kwargs)
+    bound.apply_defaults()
+    return json.dumps(bound.arguments, sort_keys=True, default=repr)
+
+
+def get_searcher(**kwargs) -> FAISSSemanticSearch:
+    """
+    The shared FAISSSemanticSearch of this process for the given constructor arguments, built on first use.
+
+    Thread-safe: concurrent first callers wait for a single build. A failed build raises and is
+    retried on the next call. Each process (including forked workers) builds its own.
+    """
+    key = _searcher_key(kwargs)
+    searcher = _SEARCHERS.get(key)
+    if searcher is not None:
+        return searcher
+    with _SEARCHERS_LOCK:
+        build_lock = _BUILD_LOCKS.setdefault(key, threading.Lock())
+    with build_lock:
+        if key not in _SEARCHERS:
+            _SEARCHERS[key] = FAISSSemanticSearch(**kwargs)
+        return _SEARCHERS[key]
+
+
+def warmup(query: str = "warmup", **kwargs) -> FAISSSemanticSearch:
+    """
+    Build the shared searcher now and run one query through it (the first encode pays for lazy model initialization),
+    so the first real tool call does not pay for it. Call once at startup, before rollouts or requests.
+    """
+    start = time.perf_counter()
+    searcher = get_searcher(**kwargs)
+    searcher.search(query, 1)
+    print(f"✓ Semantic search warmed up in {time.perf_counter() - start:.1f}s")
+    return searcher
 
 
 # Example usage
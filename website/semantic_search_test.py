@@ -0,0 +1,306 @@
+import os
+import sqlite3
+import struct
+import subprocess
+import sys
+import types
+import zlib
+
+import numpy as np
+import pytest
+
+faiss = pytest.importorskip("faiss")
+import semantic_search
+from semantic_search import (INDEX_TYPES, EmbeddingCache, FAISSSemanticSearch, benchmark_indexes, build_faiss_index,
+                             index_factory_string, index_memory_bytes, set_search_params)
+
+DIM = 32
+MIN_RECALL = {"flat": 1.0, "hnsw": 0.9, "ivf_flat": 0.9, "ivf_pq": 0.3}  # recall@5 on synthetic_vectors()
+
+
+def synthetic_vectors(n=2000, dim=DIM, clusters=20, seed=0):
+    """Clustered float32 vectors, like sentence embeddings of a few topics"""
+    rng = np.random.default_rng(seed)
+    centers = rng.normal(size=(clusters, dim)).astype(np.float32) * 4
+    return (centers[rng.integers(clusters, size=n)] + rng.normal(size=(n, dim))).astype(np.float32)
+
+
+class FakeModel:
+    """Deterministic stand-in for SentenceTransformer: a fixed random vector per text"""
+    def __init__(self, model_name="fake", dim=DIM):
+        self.dim = dim
+        self.calls = []
+
+    def get_sentence_embedding_dimension(self):
+        return self.dim
+
+    def encode(self, texts, convert_to_numpy=True):
+        self.calls.append(texts)
+        single = isinstance(texts, str)
+        vectors = [np.random.default_rng(zlib.crc32(t.encode())).normal(size=self.dim) for t in ([texts] if single else texts)]
+        return np.asarray(vectors[0] if single else vectors, dtype=np.float32)
+
+
+def searcher_from_vectors(vectors, index_type="flat", **index_params):
+    """FAISSSemanticSearch over in-memory vectors, without Chroma or a real embedding model"""
+    searcher = FAISSSemanticSearch.__new__(FAISSSemanticSearch)
+    searcher.model_name = "fake"
+    searcher.model = FakeModel(dim=vectors.shape[1])
+    searcher.embedding_cache = EmbeddingCache()
+    searcher.index_type, searcher.index_params = index_type, index_params
+    searcher.nprobe = searcher.ef_search = None
+    searcher.embeddings = vectors
+    searcher.metadata = [{"id": f"part{i}", "document": f"<p>text {i}</p>", "meta": {}} for i in range(len(vectors))]
+    searcher.index = build_faiss_index(vectors, index_type, **index_params)
+    return searcher
+
+
+def write_chroma(path, vectors):
+    """A chroma.sqlite3 with just the embeddings_queue columns the searcher reads"""
+    path.mkdir(exist_ok=True)
+    conn = sqlite3.connect(path / "chroma.sqlite3")
+    conn.execute("CREATE TABLE IF NOT EXISTS embeddings_queue (seq_id INTEGER PRIMARY KEY, vector BLOB, encoding TEXT)")
+    conn.executemany("INSERT INTO embeddings_queue (vector, encoding) VALUES (?, 'FLOAT32')",
+                     [(v.astype("<f4").tobytes(),) for v in vectors])
+    conn.commit()
+    conn.close()
+    return str(path)
+
+
+class FakeCollection:
+    """Chroma collection answering get() with one document per queued vector"""
+    def __init__(self, path):
+        self.path = path
+
+    def get(self):
+        conn = sqlite3.connect(os.path.join(self.path, "chroma.sqlite3"))
+        seq_ids = [row[0] for row in conn.execute("SELECT rowid FROM embeddings_queue ORDER BY rowid")]
+        conn.close()
+        return {"ids": [f"part{i}" for i in seq_ids], "documents": [f"<p>text {i}</p>" for i in seq_ids],
+                "metadatas": [{} for _ in seq_ids]}
+
+
+@pytest.fixture
+def fake_backends(monkeypatch):
+    """chromadb / sentence_transformers replaced by the fakes above, for FAISSSemanticSearch(...)"""
+    client = lambda path: types.SimpleNamespace(get_or_create_collection=lambda name: FakeCollection(path))
+    monkeypatch.setitem(sys.modules, "chromadb", types.SimpleNamespace(PersistentClient=client))
+    monkeypatch.setitem(sys.modules, "sentence_transformers", types.SimpleNamespace(SentenceTransformer=FakeModel))
+
+
+def test_index_factory_strings():
+    assert index_factory_string(DIM, 2000, "flat") == "Flat"
+    assert index_factory_string(DIM, 2000, "hnsw", hnsw_m=16) == "HNSW16"
+    assert index_factory_string(DIM, 2000, "ivf_flat", nlist=64) == "IVF64,Flat"
+    # 51 lists (>= 39 training points each), 4 sub-quantizers of 8 dims, 5 bits (>= 39 points per centroid)
+    assert index_factory_string(DIM, 2000, "ivf_pq") == "IVF51,PQ4x5"
+    assert index_factory_string(384, 10**6, "ivf_pq") == "IVF4000,PQ48x8"
+    with pytest.raises(ValueError):
+        index_factory_string(DIM, 2000, "lsh")
+
+
+@pytest.mark.parametrize("index_type", INDEX_TYPES)
+def test_every_index_type_builds_and_finds_neighbours(index_type):
+    vectors = synthetic_vectors()
+    index = build_faiss_index(vectors, index_type)
+    assert index.is_trained and index.ntotal == len(vectors)
+    set_search_params(index, nprobe=16, ef_search=64)
+    _, found = index.search(vectors[:50], 5)
+    _, truth = build_faiss_index(vectors, "flat").search(vectors[:50], 5)
+    recall = np.mean([len(set(f) & set(t)) / 5 for f, t in zip(found, truth)])
+    assert recall >= MIN_RECALL[index_type]
+
+
+def test_search_params_only_apply_to_their_index_type():
+    vectors = synthetic_vectors()
+    ivf = build_faiss_index(vectors, "ivf_flat", nlist=32)
+    hnsw = build_faiss_index(vectors, "hnsw")
+    flat = build_faiss_index(vectors, "flat")
+    for index in (ivf, hnsw, flat):
+        set_search_params(index, nprobe=7, ef_search=99)
+    assert faiss.extract_index_ivf(ivf).nprobe == 7
+    assert hnsw.hnsw.efSearch == 99
+    assert flat.ntotal == len(vectors)  # nothing to set, and no error
+
+
+def test_benchmark_recall_against_flat():
+    vectors = synthetic_vectors()
+    queries = synthetic_vectors(n=40, seed=1)
+    report = benchmark_indexes(vectors, queries, k=10, configs=[
+        {"index_type": "ivf_flat", "nlist": 32, "nprobe": 32},  # every list visited: exact
+        {"index_type": "ivf_flat", "nlist": 32, "nprobe": 1},
+        {"index_type": "hnsw", "ef_search": 128},
+        {"index_type": "ivf_pq", "nprobe": 8},
+    ])
+    flat, exhaustive, one_list, hnsw, pq = report
+    assert flat["config"] == {"index_type": "flat"} and flat["recall"] == 1.0
+    assert exhaustive["recall"] == 1.0
+    assert one_list["recall"] <= exhaustive["recall"]
+    assert hnsw["recall"] >= 0.9
+    assert 0 < pq["recall"] < 1.0
+    assert pq["memory_bytes"] < flat["memory_bytes"] == index_memory_bytes(build_faiss_index(vectors, "flat"))
+    assert all(row["ms_per_query"] >= 0 and row["build_s"] >= 0 for row in report)
+
+
+def test_recall_report_samples_stored_vectors(capsys):
+    vectors = synthetic_vectors()
+    searcher = searcher_from_vectors(vectors)
+    configs = [{"index_type": "ivf_flat", "nlist": 32, "nprobe": 4}]
+    report = searcher.recall_report(k=5, configs=configs, num_queries=30)
+    sample = vectors[np.random.default_rng(0).choice(len(vectors), size=30, replace=False)]
+    expected = benchmark_indexes(vectors, sample, k=5, configs=configs)
+    assert [(r["config"], r["recall"]) for r in report] == [(r["config"], r["recall"]) for r in expected]
+    assert "recall@5" in capsys.readouterr().out
+    searcher.recall_report(queries=["assault", "notice"], k=5, configs=configs)
+    assert searcher.model.calls[-1] == ["assault", "notice"]
+
+
+def test_module_loads_without_chroma_or_sentence_transformers():
+    # None in sys.modules makes the import fail, as if the package were not installed
+    code = ("import sys; sys.modules['chromadb'] = sys.modules['sentence_transformers'] = None; "
+            "import semantic_search; print(semantic_search.index_factory_string(8, 100, 'hnsw'))")
+    result = subprocess.run([sys.executable, "-c", code], capture_output=True, text=True,
+                            cwd=os.path.dirname(os.path.abspath(semantic_search.__file__)))
+    assert result.returncode == 0, result.stderr
+    assert result.stdout.strip().endswith("HNSW32")
+
+
+
+def test_index_cache_reused_until_chroma_changes(tmp_path, fake_backends, monkeypatch):
+    chroma = write_chroma(tmp_path / "db", synthetic_vectors(n=500))
+    built = FAISSSemanticSearch(chroma_path=chroma, index_type="hnsw")
+    assert os.listdir(os.path.join(chroma, "faiss_cache"))
+
+    # same stamp: loaded from the cache, nothing read from SQLite
+    read = FAISSSemanticSearch._read_embeddings
+    monkeypatch.setattr(FAISSSemanticSearch, "_read_embeddings", lambda self: pytest.fail("cache hit expected"))
+    cached = FAISSSemanticSearch(chroma_path=chroma, index_type="hnsw")
+    assert cached.index_version == built.index_version
+    assert cached.search("assault", 4) == built.search("assault", 4)
+
+    # a new row in the embeddings queue changes the stamp: rebuilt
+    monkeypatch.setattr(FAISSSemanticSearch, "_read_embeddings", read)
+    write_chroma(tmp_path / "db", synthetic_vectors(n=1, seed=3))
+    rebuilt = FAISSSemanticSearch(chroma_path=chroma, index_type="hnsw")
+    assert rebuilt.index_version != built.index_version
+    assert rebuilt.index.ntotal == 501
+
+
+def test_unreadable_cache_or_stamp_falls_back_to_a_rebuild(tmp_path, fake_backends):
+    chroma = write_chroma(tmp_path / "db", synthetic_vectors(n=200))
+    first = FAISSSemanticSearch(chroma_path=chroma)
+    index_path, meta_path = first._cache_paths()
+
+    with open(index_path, "wb") as f:
+        f.write(b"not a faiss index")
+    assert FAISSSemanticSearch(chroma_path=chroma).index.ntotal == 200  # corrupt index file: rebuilt
+
+    # an older Chroma schema without seq_id: no stamp, so no cache, but still a working index
+    conn = sqlite3.connect(os.path.join(chroma, "chroma.sqlite3"))
+    conn.executescript("ALTER TABLE embeddings_queue RENAME TO q; "
+                       "CREATE TABLE embeddings_queue (id INTEGER PRIMARY KEY, vector BLOB, encoding TEXT); "
+                       "INSERT INTO embeddings_queue SELECT * FROM q; DROP TABLE q;")
+    conn.close()
+    searcher = FAISSSemanticSearch(chroma_path=chroma)
+    assert searcher._chroma_stamp() is None and searcher._load_cached_index() is False
+    assert searcher.index.ntotal == 200 and searcher.index_version.startswith("built-")
+
+
+
+def legacy_decode(chroma_path):
+    """The per-row struct.unpack decode _read_embeddings replaced, kept as the reference"""
+    conn = sqlite3.connect(os.path.join(chroma_path, "chroma.sqlite3"))
+    rows = conn.execute("SELECT vector, encoding FROM embeddings_queue WHERE vector IS NOT NULL").fetchall()
+    conn.close()
+    return np.array([list(struct.unpack(f"{len(blob) // 4}f", blob)) for blob, encoding in rows
+                     if encoding == "FLOAT32"], dtype=np.float32)
+
+
+def embeddings_reader(chroma_path, dim=DIM):
+    searcher = FAISSSemanticSearch.__new__(FAISSSemanticSearch)
+    searcher.chroma_path, searcher.embedding_dim = chroma_path, dim
+    return searcher
+
+
+def test_bulk_decode_matches_legacy_decode(tmp_path):
+    vectors = synthetic_vectors(n=50)
+    chroma = write_chroma(tmp_path / "db", vectors)
+    conn = sqlite3.connect(os.path.join(chroma, "chroma.sqlite3"))
+    conn.executemany("INSERT INTO embeddings_queue (vector, encoding) VALUES (?, ?)",
+                     [(None, "FLOAT32"), (b"\x00" * 7, "INT8")])  # skipped by both
+    conn.commit()
+    conn.close()
+    reader = embeddings_reader(chroma)
+    for batch_size in (7, 50, 4096):  # batches that do and do not divide the row count
+        decoded = reader._read_embeddings(batch_size=batch_size)
+        assert decoded.dtype == np.float32 and decoded.shape == (50, DIM)
+        np.testing.assert_array_equal(decoded, legacy_decode(chroma))
+    np.testing.assert_array_equal(decoded, vectors)
+
+
+@pytest.mark.parametrize("bad_rows", [
+    [np.zeros(DIM - 1, dtype="<f4").tobytes()],  # wrong dimension
+    [np.zeros(DIM, dtype="<f8").tobytes()],  # float64, not float32
+    [b"\x00" * (DIM * 4 - 4), b"\x00" * (DIM * 4 + 4)],  # right total size, wrong rows
+    ["x" * DIM * 4],  # TEXT in the vector column
+])
+def test_malformed_blobs_are_rejected(tmp_path, bad_rows):
+    chroma = write_chroma(tmp_path / "db", synthetic_vectors(n=3))
+    conn = sqlite3.connect(os.path.join(chroma, "chroma.sqlite3"))
+    conn.executemany("INSERT INTO embeddings_queue (vector, encoding) VALUES (?, 'FLOAT32')", [(r,) for r in bad_rows])
+    conn.commit()
+    conn.close()
+    with pytest.raises(ValueError, match=f"not all {DIM}-dimensional"):
+        embeddings_reader(chroma)._read_embeddings(batch_size=8)
+
+
+
+@pytest.mark.parametrize("index_type", INDEX_TYPES)
+def test_search_batch_matches_search(index_type):
+    searcher = searcher_from_vectors(synthetic_vectors(), index_type)
+    searcher.set_search_params(nprobe=8, ef_search=64)
+    queries = ["assault and battery", "notice of hearing", "assault and battery", "  notice of   hearing"]
+    batched = searcher.search_batch(queries, n=5)
+    assert batched == [searcher.search(q, n=5) for q in queries]
+    assert searcher.model.calls[0] == ["assault and battery", "notice of hearing"]  # one encode, duplicates once
+    assert len(searcher.model.calls) == 1  # search() answered from the embedding cache
+    assert searcher.search_batch([], n=5) == []
+
+
+
+def test_embedding_cache_evicts_least_recently_used():
+    cache = EmbeddingCache(max_entries=2)
+    cache.put("m", "a", np.ones(4))
+    cache.put("m", "b", np.full(4, 2.0))
+    assert cache.get("m", "a") is not None  # a is now more recent than b
+    cache.put("m", "c", np.full(4, 3.0))
+    assert cache.get("m", "b") is None
+    np.testing.assert_array_equal(cache.get("m", "a"), np.ones(4, dtype=np.float32))
+    assert cache.get("m", "c") is not None
+    assert cache.stats() == {"hits": 3, "misses": 1, "entries": 2, "hit_rate": 0.75}
+
+
+def test_embedding_cache_normalizes_and_keys_on_model():
+    cache = EmbeddingCache()
+    cache.put("model-a", "Marbury v  Madison facts ", np.ones(4))
+    assert cache.get("model-a", "Marbury v Madison facts") is not None  # whitespace collapsed
+    assert cache.get("model-a", "marbury v madison facts") is None  # case kept
+    assert cache.get("model-b", "Marbury v Madison facts") is None  # other model, other vectors
+    vector = cache.get("model-a", "Marbury v Madison facts")
+    assert vector.dtype == np.float32 and not vector.flags.writeable
+
+
+def test_embedding_cache_persists_across_instances(tmp_path):
+    db = str(tmp_path / "embeddings.sqlite3")
+    vector = np.random.default_rng(0).normal(size=DIM).astype(np.float32)
+    EmbeddingCache(db_path=db).put("m", "notice of hearing", vector)
+    other = EmbeddingCache(max_entries=1, db_path=db)  # e.g. another Streamlit worker
+    np.testing.assert_array_equal(other.get("m", "notice of hearing"), vector)
+    assert other.get("other-model", "notice of hearing") is None
+    other.clear()  # clears memory only
+    np.testing.assert_array_equal(other.get("m", "notice of hearing"), vector)
+    assert other.stats()["hits"] == 1
+
+
+if __name__ == "__main__":
+    pytest.main([__file__, "-q"])
@@ -0,0 +1,72 @@
+import json
+import sys
+
+import ToolCache
+from ToolCache import ToolResultCache
+
+ARGS = {"query": "assault", "n": 3}
+
+
+def test_ttl_expiry(monkeypatch):
+    now = [1000.0]
+    monkeypatch.setattr(ToolCache.time, "monotonic", lambda: now[0])
+    cache = ToolResultCache(ttl_seconds=60)
+    cache.put("keyword_search", ARGS, "v1", "<results/>")
+    now[0] += 59
+    assert cache.get("keyword_search", ARGS, "v1") == "<results/>"
+    now[0] += 2
+    assert cache.get("keyword_search", ARGS, "v1") is None
+    assert cache.stats()["entries"] == 0 and cache.bytes == 0
+
+
+def test_entry_count_eviction_is_lru():
+    cache = ToolResultCache(max_entries=2, ttl_seconds=None)
+    for part in ("a", "b"):
+        cache.put("read_document_part", {"part_id": part}, "v1", part)
+    cache.get("read_document_part", {"part_id": "a"}, "v1")  # a is now most recently used
+    cache.put("read_document_part", {"part_id": "c"}, "v1", "c")
+    assert cache.get("read_document_part", {"part_id": "b"}, "v1") is None
+    assert cache.get("read_document_part", {"part_id": "a"}, "v1") == "a"
+    assert cache.stats()["entries"] == 2
+
+
+def test_byte_eviction():
+    result = "x" * 1000
+    entry = sys.getsizeof(ToolResultCache.make_key("keyword_search", {"query": "q0", "n": 3}, "v1")) + sys.getsizeof(result)
+    cache = ToolResultCache(max_bytes=3 * entry, ttl_seconds=None)
+    for i in range(5):
+        cache.put("keyword_search", {"query": f"q{i}", "n": 3}, "v1", result)
+        assert cache.bytes <= cache.max_bytes
+    assert cache.stats()["entries"] == 3
+    assert cache.get("keyword_search", {"query": "q0", "n": 3}, "v1") is None
+    cache.put("keyword_search", ARGS, "v1", "y" * (4 * entry))  # larger than the whole budget: not cached
+    assert cache.get("keyword_search", ARGS, "v1") is None and cache.stats()["entries"] == 3
+
+
+def test_errors_are_not_cached():
+    cache = ToolResultCache()
+    calls = []
+
+    def failing():
+        calls.append(1)
+        return json.dumps({"error": "index not ready"})
+
+    assert "error" in cache.get_or_compute("keyword_search", ARGS, "v1", failing)
+    assert "error" in cache.get_or_compute("keyword_search", ARGS, "v1", failing)
+    assert len(calls) == 2 and cache.stats()["entries"] == 0
+
+
+def test_version_change_invalidates():
+    cache = ToolResultCache()
+    assert cache.get_or_compute("keyword_search", ARGS, "v1", lambda: "old") == "old"
+    assert cache.get_or_compute("keyword_search", ARGS, "v1", lambda: "new") == "old"
+    assert cache.get_or_compute("keyword_search", ARGS, "v2", lambda: "new") == "new"
+    assert cache.stats()["hits"] == 1 and cache.stats()["misses"] == 2
+
+
+if __name__ == "__main__":
+    test_entry_count_eviction_is_lru()
+    test_byte_eviction()
+    test_errors_are_not_cached()
+    test_version_change_invalidates()
+    print("ok")